@@ -0,0 +1,28 @@
+"""Add token_version to users table
+
+Revision ID: 010
+Revises: cd218597577c
+Create Date: 2026-03-02
+
+"""
+
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "010"
+down_revision: Union[str, None] = "cd218597577c"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "users",
+        sa.Column("token_version", sa.Integer(), nullable=False, server_default="0"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("users", "token_version")
@@ -0,0 +1,41 @@
+"""Add unique constraint on attendance (employee_id, date)
+
+Revision ID: 011
+Revises: 010
+Create Date: 2026-03-04
+
+"""
+
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "011"
+down_revision: Union[str, None] = "010"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Keep one row per employee and day: prefer a real check-in over a
+    # not_marked placeholder, then the oldest row.
+    op.execute(
+        """
+        DELETE FROM attendance a
+        USING attendance b
+        WHERE a.employee_id = b.employee_id
+          AND a.date = b.date
+          AND (
+            (a.status = 'not_marked' AND b.status <> 'not_marked')
+            OR ((a.status = 'not_marked') = (b.status = 'not_marked') AND a.id > b.id)
+          )
+        """
+    )
+    op.create_unique_constraint(
+        "uq_attendance_employee_date", "attendance", ["employee_id", "date"]
+    )
+
+
+def downgrade() -> None:
+    op.drop_constraint("uq_attendance_employee_date", "attendance", type_="unique")
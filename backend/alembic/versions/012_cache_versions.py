@@ -0,0 +1,31 @@
+"""Create cache_versions table
+
+Revision ID: 012
+Revises: 011
+Create Date: 2026-03-05
+
+"""
+
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "012"
+down_revision: Union[str, None] = "011"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "cache_versions",
+        sa.Column("name", sa.String(length=50), nullable=False),
+        sa.Column("version", sa.BigInteger(), nullable=False, server_default="0"),
+        sa.PrimaryKeyConstraint("name"),
+    )
+    op.execute("INSERT INTO cache_versions (name, version) VALUES ('reference', 0)")
+
+
+def downgrade() -> None:
+    op.drop_table("cache_versions")
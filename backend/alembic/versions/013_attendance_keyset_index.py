@@ -0,0 +1,35 @@
+"""Add keyset pagination index on attendance
+
+Revision ID: 013
+Revises: 012
+Create Date: 2026-03-06
+
+"""
+
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "013"
+down_revision: Union[str, None] = "012"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Matches the ORDER BY of /attendance/all so keyset pages are index scans
+    op.create_index(
+        "ix_attendance_date_check_in_id",
+        "attendance",
+        [
+            sa.text("date DESC"),
+            sa.text("COALESCE(check_in_time, 'infinity'::timestamptz) DESC"),
+            sa.text("id DESC"),
+        ],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_attendance_date_check_in_id", table_name="attendance")
@@ -0,0 +1,63 @@
+"""Create attendance_daily_rollup table
+
+Revision ID: 014
+Revises: 013
+Create Date: 2026-03-08
+
+"""
+
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "014"
+down_revision: Union[str, None] = "013"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "attendance_daily_rollup",
+        sa.Column("date", sa.Date(), nullable=False),
+        sa.Column("location_id", sa.Integer(), nullable=False),
+        sa.Column("department_id", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("headcount", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("present", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("late", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("checked_out", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("not_marked", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("late_minutes", sa.BigInteger(), nullable=False, server_default="0"),
+        sa.ForeignKeyConstraint(["location_id"], ["locations.id"]),
+        sa.PrimaryKeyConstraint("date", "location_id", "department_id"),
+    )
+
+    # Backfill from existing attendance
+    op.execute(
+        """
+        INSERT INTO attendance_daily_rollup (
+            date, location_id, department_id, headcount, present, late,
+            checked_out, not_marked, late_minutes
+        )
+        SELECT
+            a.date,
+            a.location_id,
+            COALESCE(u.department_id, 0),
+            COUNT(*),
+            COUNT(*) FILTER (WHERE a.status IN ('present', 'checked_out')),
+            COUNT(*) FILTER (
+                WHERE a.status IN ('present', 'checked_out') AND a.is_late
+            ),
+            COUNT(*) FILTER (WHERE a.status = 'checked_out'),
+            COUNT(*) FILTER (WHERE a.status = 'not_marked'),
+            COALESCE(SUM(a.late_by_minutes) FILTER (WHERE a.is_late), 0)
+        FROM attendance a
+        JOIN users u ON u.id = a.employee_id
+        GROUP BY a.date, a.location_id, COALESCE(u.department_id, 0)
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("attendance_daily_rollup")
@@ -0,0 +1,30 @@
+"""Add outside_geofence flag to attendance
+
+Revision ID: 015
+Revises: 014
+Create Date: 2026-03-10
+
+"""
+
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "015"
+down_revision: Union[str, None] = "014"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "attendance",
+        sa.Column(
+            "outside_geofence", sa.Boolean(), nullable=False, server_default="false"
+        ),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("attendance", "outside_geofence")
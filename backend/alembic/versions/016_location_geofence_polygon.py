@@ -0,0 +1,25 @@
+"""Add geofence_polygon to locations
+
+Revision ID: 016
+Revises: 015
+Create Date: 2026-03-12
+
+"""
+
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "016"
+down_revision: Union[str, None] = "015"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("locations", sa.Column("geofence_polygon", sa.Text(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("locations", "geofence_polygon")
@@ -0,0 +1,38 @@
+"""Create attendance_sync_events table
+
+Revision ID: 017
+Revises: 016
+Create Date: 2026-03-14
+
+"""
+
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "017"
+down_revision: Union[str, None] = "016"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "attendance_sync_events",
+        sa.Column("employee_id", sa.Integer(), nullable=False),
+        sa.Column("idempotency_key", sa.String(length=64), nullable=False),
+        sa.Column("event_type", sa.String(length=20), nullable=False),
+        sa.Column("event_time", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("status", sa.String(length=20), nullable=False),
+        sa.Column("detail", sa.String(length=255), nullable=True),
+        sa.Column("attendance_id", sa.Integer(), nullable=True),
+        sa.Column("created_at", sa.DateTime(timezone=True), nullable=True),
+        sa.ForeignKeyConstraint(["employee_id"], ["users.id"]),
+        sa.ForeignKeyConstraint(["attendance_id"], ["attendance.id"]),
+        sa.PrimaryKeyConstraint("employee_id", "idempotency_key"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("attendance_sync_events")
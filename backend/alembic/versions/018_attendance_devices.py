@@ -0,0 +1,100 @@
+"""Enroll offline sync devices and record punch receive times
+
+Revision ID: 018
+Revises: 017
+Create Date: 2026-03-16
+
+"""
+
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "018"
+down_revision: Union[str, None] = "017"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "attendance_devices",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("employee_id", sa.Integer(), nullable=False),
+        sa.Column("device_id", sa.String(length=64), nullable=False),
+        sa.Column("name", sa.String(length=100), nullable=True),
+        sa.Column("key_version", sa.Integer(), nullable=False),
+        sa.Column("status", sa.String(length=20), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("rotated_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("revoked_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("revoked_by", sa.Integer(), nullable=True),
+        sa.Column("last_sync_at", sa.DateTime(timezone=True), nullable=True),
+        sa.ForeignKeyConstraint(["employee_id"], ["users.id"]),
+        sa.ForeignKeyConstraint(["revoked_by"], ["users.id"]),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("employee_id", "device_id", name="uq_attendance_device"),
+    )
+    op.create_index(
+        op.f("ix_attendance_devices_id"), "attendance_devices", ["id"], unique=False
+    )
+    op.create_index(
+        op.f("ix_attendance_devices_employee_id"),
+        "attendance_devices",
+        ["employee_id"],
+        unique=False,
+    )
+
+    op.add_column(
+        "attendance_sync_events",
+        sa.Column("received_at", sa.DateTime(timezone=True), nullable=True),
+    )
+    op.add_column(
+        "attendance_sync_events",
+        sa.Column("device_id", sa.String(length=64), nullable=True),
+    )
+    op.add_column(
+        "attendance_sync_events",
+        sa.Column("review_status", sa.String(length=20), nullable=True),
+    )
+    op.add_column(
+        "attendance_sync_events",
+        sa.Column("reviewed_by", sa.Integer(), nullable=True),
+    )
+    op.add_column(
+        "attendance_sync_events",
+        sa.Column("reviewed_at", sa.DateTime(timezone=True), nullable=True),
+    )
+    op.create_foreign_key(
+        "fk_attendance_sync_events_reviewed_by",
+        "attendance_sync_events",
+        "users",
+        ["reviewed_by"],
+        ["id"],
+    )
+    op.create_index(
+        "ix_attendance_sync_events_pending_review",
+        "attendance_sync_events",
+        ["attendance_id"],
+        postgresql_where=sa.text("review_status = 'pending'"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(
+        "ix_attendance_sync_events_pending_review",
+        table_name="attendance_sync_events",
+    )
+    op.drop_constraint(
+        "fk_attendance_sync_events_reviewed_by",
+        "attendance_sync_events",
+        type_="foreignkey",
+    )
+    for column in ("reviewed_at", "reviewed_by", "review_status", "device_id", "received_at"):
+        op.drop_column("attendance_sync_events", column)
+    op.drop_index(
+        op.f("ix_attendance_devices_employee_id"), table_name="attendance_devices"
+    )
+    op.drop_index(op.f("ix_attendance_devices_id"), table_name="attendance_devices")
+    op.drop_table("attendance_devices")
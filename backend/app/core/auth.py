@@ -1,9 +1,9 @@
 from datetime import datetime, timedelta, timezone
 from typing import Optional
-import bcrypt
 from jose import jwt, JWTError
 
 from app.core.config import settings
+from app.core.hashing import password_hasher
 from app.models.user import User
 
 SECRET_KEY = settings.JWT_SECRET_KEY
@@ -12,16 +12,28 @@ ACCESS_TOKEN_EXPIRE_MINUTES = settings.JWT_ACCESS_TOKEN_EXPIRE_MINUTES
 
 
 def hash_password(password: str) -> str:
-    """Hash a password using bcrypt."""
-    salt = bcrypt.gensalt()
-    return bcrypt.hashpw(password.encode("utf-8"), salt).decode("utf-8")
+    """Hash a password using bcrypt on the hashing pool."""
+    return password_hasher.hash(password)
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Verify a password against a hash."""
-    return bcrypt.checkpw(
-        plain_password.encode("utf-8"), hashed_password.encode("utf-8")
-    )
+    """Verify a password against a hash on the hashing pool."""
+    return password_hasher.verify(plain_password, hashed_password)
+
+
+async def hash_password_async(password: str) -> str:
+    """Hash a password on the hashing pool without holding a request thread."""
+    return await password_hasher.hash_async(password)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """Verify a password on the hashing pool without holding a request thread."""
+    return await password_hasher.verify_async(plain_password, hashed_password)
+
+
+def password_needs_rehash(hashed_password: str) -> bool:
+    """Check whether a hash was made with an outdated work factor."""
+    return password_hasher.needs_rehash(hashed_password)
 
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
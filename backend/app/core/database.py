@@ -1,10 +1,73 @@
-from sqlalchemy import create_engine
+import logging
+from typing import AsyncIterator, Optional
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Query, Session, sessionmaker
 
 from app.core.config import settings
+from app.core.query_stats import instrument
+from app.core.pool_metrics import (
+    AsyncPool,
+    SyncPool,
+    async_pool_metrics,
+    sync_pool_metrics,
+)
+
+
+def pool_options() -> dict:
+    """Pool arguments shared by the sync and async engines."""
+    return {
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT_SECONDS,
+        "pool_recycle": settings.DB_POOL_RECYCLE_SECONDS,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+    }
+
+
+logger = logging.getLogger(__name__)
+
+
+def sync_connection_demand() -> int:
+    """
+    Most sync engine connections one worker can have checked out at once.
+
+    Every sync route thread may hold one; a dashboard request also borrows
+    up to ``DASHBOARD_WORKERS`` more for its widget sessions, and analytics
+    cache refreshes run on their own threads outside the threadpool.
+    """
+    return (
+        settings.THREADPOOL_WORKERS
+        + settings.DASHBOARD_WORKERS
+        + settings.ANALYTICS_CACHE_REFRESH_WORKERS
+    )
+
 
-engine = create_engine(settings.DATABASE_URL, pool_pre_ping=True)
+def check_pool_capacity() -> None:
+    """Warn when the sync pool is smaller than its worst-case demand."""
+    capacity = settings.DB_POOL_SIZE + settings.DB_MAX_OVERFLOW
+    demand = sync_connection_demand()
+    if demand > capacity:
+        logger.warning(
+            "Sync pool allows %d connections but up to %d can be requested "
+            "(THREADPOOL_WORKERS + DASHBOARD_WORKERS + "
+            "ANALYTICS_CACHE_REFRESH_WORKERS); raise DB_MAX_OVERFLOW or those "
+            "callers will wait on pool checkout",
+            capacity,
+            demand,
+        )
+
+
+engine = create_engine(settings.DATABASE_URL, poolclass=SyncPool, **pool_options())
+sync_pool_metrics.attach(engine.pool)
+instrument(engine)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
@@ -18,3 +81,93 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+# Created on first use so scripts and Alembic never need asyncpg
+_async_engine: Optional[AsyncEngine] = None
+_async_sessionmaker: Optional[async_sessionmaker] = None
+
+
+def get_async_engine() -> AsyncEngine:
+    """The shared asyncpg engine used by async routes."""
+    global _async_engine, _async_sessionmaker
+    if _async_engine is None:
+        _async_engine = create_async_engine(
+            settings.async_database_url, poolclass=AsyncPool, **pool_options()
+        )
+        async_pool_metrics.attach(_async_engine.sync_engine.pool)
+        instrument(_async_engine.sync_engine)
+        _async_sessionmaker = async_sessionmaker(
+            _async_engine, autoflush=False, expire_on_commit=False
+        )
+    return _async_engine
+
+
+def AsyncSessionLocal() -> AsyncSession:
+    get_async_engine()
+    return _async_sessionmaker()
+
+
+async def get_async_db() -> AsyncIterator[AsyncSession]:
+    """Dependency for getting an async database session.
+
+    Shared service code written against a sync Session runs on the same
+    connection through ``await db.run_sync(...)``.
+    """
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+def pool_stats() -> dict:
+    """Live pool occupancy and checkout metrics for both engines."""
+    stats = {
+        "sync": {
+            **sync_pool_metrics.stats(engine.pool),
+            "demand": sync_connection_demand(),
+        }
+    }
+    if _async_engine is not None:
+        stats["async"] = async_pool_metrics.stats(_async_engine.sync_engine.pool)
+    return stats
+
+
+async def dispose_async_engine() -> None:
+    if _async_engine is not None:
+        await _async_engine.dispose()
+
+
+def estimate_row_count(db: Session, query: Query) -> int:
+    """
+    Estimate how many rows a query returns from planner statistics.
+
+    Parameters are rendered inline, since EXPLAIN is handed to the driver
+    as-is and expanding parameters (IN lists) only exist in the compiler.
+    """
+    compiled = query.statement.compile(
+        dialect=db.get_bind().dialect, compile_kwargs={"literal_binds": True}
+    )
+    plan = (
+        db.connection()
+        .exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compiled}")
+        .scalar()
+    )
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+def begin_snapshot(db: Session) -> str:
+    """
+    Start a REPEATABLE READ transaction and export its snapshot.
+
+    The returned id lets other sessions read exactly the same data while
+    this transaction stays open.
+    """
+    db.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+    return db.execute(text("SELECT pg_export_snapshot()")).scalar()
+
+
+def join_snapshot(db: Session, snapshot_id: str) -> None:
+    """Make a fresh session read from a snapshot exported by begin_snapshot."""
+    db.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+    db.execute(
+        text("SET TRANSACTION SNAPSHOT :snapshot_id"), {"snapshot_id": snapshot_id}
+    )
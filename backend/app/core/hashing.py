@@ -0,0 +1,146 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, TypeVar
+
+import bcrypt
+
+from app.core.config import settings
+
+T = TypeVar("T")
+
+
+class HashingPoolBusy(Exception):
+    """Raised when the password hashing queue is full."""
+
+
+class PasswordHasher:
+    """Runs bcrypt on a dedicated, bounded worker pool.
+
+    bcrypt releases the GIL, so a sized thread pool gives real parallelism
+    while keeping hashing off the shared request threadpool's CPU budget.
+    Once ``workers + max_pending`` jobs are in flight, new jobs are rejected
+    immediately instead of queueing behind a login storm.
+
+    Routes use the ``*_async`` methods, which await the pool's future on the
+    event loop so no request thread is held while bcrypt runs. The blocking
+    methods are for scripts such as the seeder.
+    """
+
+    def __init__(self, workers: int, max_pending: int, rounds: int):
+        self.rounds = rounds
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="bcrypt"
+        )
+        self._slots = threading.BoundedSemaphore(workers + max_pending)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._completed = 0
+        self._rejected = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+        self._total_hash = 0.0
+        self._max_hash = 0.0
+
+    def hash(self, password: str) -> str:
+        return self._submit(self._hash, password)
+
+    def verify(self, password: str, hashed: str) -> bool:
+        return self._submit(self._verify, password, hashed)
+
+    async def hash_async(self, password: str) -> str:
+        return await self._submit_async(self._hash, password)
+
+    async def verify_async(self, password: str, hashed: str) -> bool:
+        return await self._submit_async(self._verify, password, hashed)
+
+    def needs_rehash(self, hashed: str) -> bool:
+        """Whether a stored hash was produced with a different work factor."""
+        try:
+            return int(hashed.split("$")[2]) != self.rounds
+        except (IndexError, ValueError):
+            return True
+
+    def stats(self) -> dict:
+        with self._lock:
+            done = self._completed
+            return {
+                "rounds": self.rounds,
+                "in_flight": self._in_flight,
+                "completed": done,
+                "rejected": self._rejected,
+                "avg_queue_wait_ms": round(self._total_wait / done * 1000, 2)
+                if done
+                else 0.0,
+                "max_queue_wait_ms": round(self._max_wait * 1000, 2),
+                "avg_hash_ms": round(self._total_hash / done * 1000, 2)
+                if done
+                else 0.0,
+                "max_hash_ms": round(self._max_hash * 1000, 2),
+            }
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=True)
+
+    def _hash(self, password: str) -> str:
+        salt = bcrypt.gensalt(rounds=self.rounds)
+        return bcrypt.hashpw(password.encode("utf-8"), salt).decode("utf-8")
+
+    @staticmethod
+    def _verify(password: str, hashed: str) -> bool:
+        return bcrypt.checkpw(password.encode("utf-8"), hashed.encode("utf-8"))
+
+    def _submit(self, fn: Callable[..., T], *args) -> T:
+        self._acquire()
+        try:
+            future = self._executor.submit(self._timed, time.perf_counter(), fn, *args)
+            return future.result()
+        finally:
+            self._release()
+
+    async def _submit_async(self, fn: Callable[..., T], *args) -> T:
+        self._acquire()
+        try:
+            future = self._executor.submit(self._timed, time.perf_counter(), fn, *args)
+        except BaseException:
+            self._release()
+            raise
+        # Free the slot when the job finishes, not when the awaiting request
+        # goes away, so a disconnected client cannot overfill the pool
+        future.add_done_callback(lambda _: self._release())
+        return await asyncio.wrap_future(future)
+
+    def _acquire(self) -> None:
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._rejected += 1
+            raise HashingPoolBusy()
+        with self._lock:
+            self._in_flight += 1
+
+    def _release(self) -> None:
+        with self._lock:
+            self._in_flight -= 1
+        self._slots.release()
+
+    def _timed(self, submitted_at: float, fn: Callable[..., T], *args) -> T:
+        started_at = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            elapsed = time.perf_counter() - started_at
+            waited = started_at - submitted_at
+            with self._lock:
+                self._completed += 1
+                self._total_wait += waited
+                self._max_wait = max(self._max_wait, waited)
+                self._total_hash += elapsed
+                self._max_hash = max(self._max_hash, elapsed)
+
+
+password_hasher = PasswordHasher(
+    workers=settings.PASSWORD_HASH_WORKERS,
+    max_pending=settings.PASSWORD_HASH_MAX_PENDING,
+    rounds=settings.BCRYPT_ROUNDS,
+)
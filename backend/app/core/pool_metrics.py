@@ -0,0 +1,114 @@
+import threading
+import time
+
+from sqlalchemy import event, exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool, Pool, QueuePool
+
+
+class PoolMetrics:
+    """Connection pool counters gathered from SQLAlchemy pool events.
+
+    Checkout, checkin, connect and invalidate come from the pool's event
+    hooks. Pool events fire only once a connection has been handed out, so
+    the time spent waiting for one (and waits that end in a timeout) is
+    measured by the instrumented pool classes below.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.checkins = 0
+        self.connects = 0
+        self.invalidations = 0
+        self.timeouts = 0
+        self.waits = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def attach(self, pool: Pool) -> None:
+        event.listen(pool, "checkout", self._on_checkout)
+        event.listen(pool, "checkin", self._on_checkin)
+        event.listen(pool, "connect", self._on_connect)
+        event.listen(pool, "invalidate", self._on_invalidate)
+
+    def record_wait(self, seconds: float, timed_out: bool) -> None:
+        with self._lock:
+            self.waits += 1
+            self.total_wait += seconds
+            self.max_wait = max(self.max_wait, seconds)
+            if timed_out:
+                self.timeouts += 1
+
+    def stats(self, pool: Pool) -> dict:
+        with self._lock:
+            counters = {
+                "checkouts": self.checkouts,
+                "checkins": self.checkins,
+                "connects": self.connects,
+                "invalidations": self.invalidations,
+                "timeouts": self.timeouts,
+                "avg_checkout_wait_ms": round(self.total_wait / self.waits * 1000, 2)
+                if self.waits
+                else 0.0,
+                "max_checkout_wait_ms": round(self.max_wait * 1000, 2),
+            }
+        if isinstance(pool, QueuePool):
+            counters.update(
+                {
+                    "size": pool.size(),
+                    "checked_in": pool.checkedin(),
+                    "checked_out": pool.checkedout(),
+                    "overflow": max(pool.overflow(), 0),
+                    "max_overflow": pool._max_overflow,
+                    "timeout_seconds": pool.timeout(),
+                }
+            )
+        return counters
+
+    def _on_checkout(self, dbapi_connection, connection_record, connection_proxy):
+        with self._lock:
+            self.checkouts += 1
+
+    def _on_checkin(self, dbapi_connection, connection_record):
+        with self._lock:
+            self.checkins += 1
+
+    def _on_connect(self, dbapi_connection, connection_record):
+        with self._lock:
+            self.connects += 1
+
+    def _on_invalidate(self, dbapi_connection, connection_record, exception):
+        with self._lock:
+            self.invalidations += 1
+
+
+class _TimedCheckout:
+    """Times how long each checkout waits on the pool."""
+
+    metrics: PoolMetrics
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            self.metrics.record_wait(time.perf_counter() - started, timed_out=True)
+            raise
+        self.metrics.record_wait(time.perf_counter() - started, timed_out=False)
+        return connection
+
+
+def instrumented_pool_class(base: type, metrics: PoolMetrics) -> type:
+    """A subclass of a queue pool class that reports waits to metrics."""
+    return type(
+        f"Instrumented{base.__name__}",
+        (_TimedCheckout, base),
+        {"metrics": metrics},
+    )
+
+
+sync_pool_metrics = PoolMetrics()
+async_pool_metrics = PoolMetrics()
+
+SyncPool = instrumented_pool_class(QueuePool, sync_pool_metrics)
+AsyncPool = instrumented_pool_class(AsyncAdaptedQueuePool, async_pool_metrics)
@@ -0,0 +1,155 @@
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Optional
+
+from sqlalchemy.orm import Session
+
+from app.core.auth import decode_token
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.models.user import User
+
+# User columns carried in access-token claims. Changing any of them must bump
+# users.token_version so outstanding tokens stop authorizing.
+CLAIM_FIELDS = ("role", "status", "location_id", "department_id", "supervisor_id")
+
+
+@dataclass(frozen=True)
+class Principal:
+    """Snapshot of the fields authorization checks need from a User row."""
+
+    id: int
+    name: str
+    email: str
+    role: str
+    status: str
+    location_id: Optional[int]
+    department_id: Optional[int]
+    supervisor_id: Optional[int]
+    token_version: int = 0
+
+    @classmethod
+    def from_user(cls, user: User) -> "Principal":
+        role = user.role if isinstance(user.role, str) else user.role.value
+        return cls(
+            id=user.id,
+            name=user.name,
+            email=user.email,
+            role=role,
+            status=user.status,
+            location_id=user.location_id,
+            department_id=user.department_id,
+            supervisor_id=user.supervisor_id,
+            token_version=user.token_version or 0,
+        )
+
+    @classmethod
+    def from_claims(cls, payload: dict) -> "Principal":
+        return cls(
+            id=int(payload["sub"]),
+            name=payload.get("name", ""),
+            email=payload.get("email", ""),
+            role=payload["role"],
+            status="Active",
+            location_id=payload.get("location_id"),
+            department_id=payload.get("department_id"),
+            supervisor_id=payload.get("supervisor_id"),
+            token_version=payload["ver"],
+        )
+
+
+def user_claims(user: User) -> dict:
+    """Build the signed claims embedded in a user's access token."""
+    role = user.role if isinstance(user.role, str) else user.role.value
+    return {
+        "sub": str(user.id),
+        "role": role,
+        "name": user.name,
+        "email": user.email,
+        "location_id": user.location_id,
+        "department_id": user.department_id,
+        "supervisor_id": user.supervisor_id,
+        "ver": user.token_version or 0,
+    }
+
+
+token_cache = TTLCache(
+    maxsize=settings.PRINCIPAL_CACHE_SIZE,
+    ttl_seconds=settings.PRINCIPAL_CACHE_TTL_SECONDS,
+)
+principal_cache = TTLCache(
+    maxsize=settings.PRINCIPAL_CACHE_SIZE,
+    ttl_seconds=settings.PRINCIPAL_CACHE_TTL_SECONDS,
+)
+
+token_versions = TTLCache(
+    maxsize=settings.PRINCIPAL_CACHE_SIZE,
+    ttl_seconds=settings.PRINCIPAL_CACHE_TTL_SECONDS,
+)
+
+
+def decode_token_cached(token: str) -> Optional[dict]:
+    """Decode a JWT, reusing the verified payload for repeat presentations."""
+    payload = token_cache.get(token)
+    if payload is not None:
+        return payload
+
+    payload = decode_token(token)
+    if payload is None:
+        return None
+
+    ttl = settings.PRINCIPAL_CACHE_TTL_SECONDS
+    exp = payload.get("exp")
+    if isinstance(exp, (int, float)):
+        ttl = min(ttl, exp - datetime.now(timezone.utc).timestamp())
+    token_cache.set(token, payload, ttl_seconds=ttl)
+    return payload
+
+
+def get_cached_principal(user_id: int) -> Optional[Principal]:
+    """Return the cached principal for a user id, if any."""
+    return principal_cache.get(user_id)
+
+
+def cache_principal(user: User) -> Principal:
+    """Snapshot a freshly loaded user into the principal cache."""
+    principal = Principal.from_user(user)
+    principal_cache.set(user.id, principal)
+    return principal
+
+
+def current_token_version(user_id: int, db: Session) -> Optional[int]:
+    """Return a user's live token version, or None if they cannot sign in.
+
+    Served from the in-memory version map; a miss costs one narrow query.
+    """
+    version = token_versions.get(user_id)
+    if version is not None:
+        return version
+
+    row = db.query(User.token_version, User.status).filter(User.id == user_id).first()
+    if row is None or row.status == "Inactive":
+        return None
+    token_versions.set(user_id, row.token_version)
+    return row.token_version
+
+
+def invalidate_user(user_id: int) -> None:
+    """Drop one user's snapshot and token version after their row changes."""
+    principal_cache.pop(user_id)
+    token_versions.pop(user_id)
+
+
+def invalidate_all() -> None:
+    """Drop every snapshot after a bulk reassignment of users."""
+    principal_cache.clear()
+    token_versions.clear()
+
+
+def cache_stats() -> dict:
+    """Hit/miss counters for the token and principal caches."""
+    return {
+        "tokens": token_cache.stats(),
+        "principals": principal_cache.stats(),
+        "token_versions": token_versions.stats(),
+    }
@@ -0,0 +1,144 @@
+"""
+Per-request SQL instrumentation.
+
+Cursor execute hooks on both engines add every statement to the stats of
+the request being served (tracked in a context variable, which follows the
+request into the threadpool and into ``run_sync``). The HTTP middleware in
+``app.main`` reports the totals in a ``Server-Timing`` header and the log,
+warns when one statement fingerprint repeats enough to look like an N+1,
+and in strict mode fails requests that exceed their route's query budget.
+Statements over the slow query threshold are also handed to
+``app.core.slow_queries``.
+"""
+
+import re
+import time
+from collections import Counter
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.core.config import settings
+from app.core.slow_queries import slow_query_log
+
+_NUMBER = re.compile(r"\b\d+(\.\d+)?\b")
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_IN_LIST = re.compile(r"\bIN \((?:[^()]*)\)", re.IGNORECASE)
+_WHITESPACE = re.compile(r"\s+")
+
+
+def fingerprint(statement: str) -> str:
+    """Normalize a SQL statement so repeats with different values match."""
+    statement = _STRING.sub("?", statement)
+    statement = _NUMBER.sub("?", statement)
+    statement = _IN_LIST.sub("IN (...)", statement)
+    return _WHITESPACE.sub(" ", statement).strip()
+
+
+@dataclass
+class RequestQueryStats:
+    count: int = 0
+    total_seconds: float = 0.0
+    budget: Optional[int] = None
+    fingerprints: Counter = field(default_factory=Counter)
+    scope: Optional[dict] = field(default=None, repr=False)
+
+    def record(self, statement: str, seconds: float) -> None:
+        self.count += 1
+        self.total_seconds += seconds
+        self.fingerprints[fingerprint(statement)] += 1
+
+    @property
+    def route(self) -> Optional[str]:
+        """Method and route template, once routing has matched the request."""
+        if self.scope is None:
+            return None
+        route: Any = self.scope.get("route")
+        path = getattr(route, "path", None) or self.scope.get("path")
+        return f"{self.scope.get('method')} {path}"
+
+    def repeated(self, threshold: int) -> List[Tuple[str, int]]:
+        """Fingerprints executed at least threshold times, most frequent first."""
+        return [
+            (statement, count)
+            for statement, count in self.fingerprints.most_common()
+            if count >= threshold
+        ]
+
+    @property
+    def effective_budget(self) -> int:
+        return self.budget if self.budget is not None else settings.QUERY_BUDGET_DEFAULT
+
+    def server_timing(self) -> str:
+        return (
+            f'db;dur={self.total_seconds * 1000:.1f};desc="{self.count} queries"'
+        )
+
+
+_current: ContextVar[Optional[RequestQueryStats]] = ContextVar(
+    "request_query_stats", default=None
+)
+
+
+def start_request(scope: Optional[dict] = None) -> RequestQueryStats:
+    stats = RequestQueryStats(scope=scope)
+    _current.set(stats)
+    return stats
+
+
+def current_stats() -> Optional[RequestQueryStats]:
+    return _current.get()
+
+
+def query_budget(limit: int):
+    """
+    Route dependency declaring how many queries the route may issue.
+
+    Usage: ``@router.get(..., dependencies=[Depends(query_budget(3))])``
+    """
+
+    def set_budget() -> None:
+        stats = _current.get()
+        if stats is not None:
+            stats.budget = limit
+
+    return set_budget
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start"].pop()
+    stats = _current.get()
+    if stats is not None:
+        stats.record(statement, elapsed)
+    if elapsed * 1000 >= slow_query_log.threshold_ms > 0:
+        slow_query_log.maybe_record(
+            conn,
+            statement,
+            parameters,
+            elapsed,
+            fingerprint(statement),
+            stats.route if stats is not None else None,
+            executemany,
+        )
+
+
+def _handle_error(context) -> None:
+    # after_cursor_execute does not run for failed statements
+    if context.connection is not None and context.cursor is not None:
+        starts = context.connection.info.get("query_start")
+        if starts:
+            starts.pop()
+
+
+def instrument(engine: Engine) -> None:
+    """Attach the cursor hooks to a (sync) engine."""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
@@ -0,0 +1,144 @@
+"""
+Slow query log.
+
+Statements slower than ``SLOW_QUERY_THRESHOLD_MS`` are kept in a bounded
+ring buffer together with their fingerprint, the shape (not the values) of
+their parameters, the route that issued them and an ``EXPLAIN (ANALYZE off,
+FORMAT JSON)`` plan. The plan is taken without ANALYZE, so nothing is executed
+twice, and at most once per fingerprint per
+``SLOW_QUERY_EXPLAIN_INTERVAL_SECONDS`` to bound the overhead.
+"""
+
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from app.core.config import settings
+
+EXPLAINABLE = ("SELECT", "WITH", "INSERT", "UPDATE", "DELETE")
+
+
+def parameter_shapes(parameters: Any) -> Any:
+    """Describe bound parameters by type (and size) without their values."""
+
+    def shape(value: Any) -> str:
+        if isinstance(value, (list, tuple, set)):
+            return f"{type(value).__name__}[{len(value)}]"
+        return type(value).__name__
+
+    if isinstance(parameters, dict):
+        return {name: shape(value) for name, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [shape(value) for value in parameters]
+    return None
+
+
+class SlowQueryLog:
+    """Thread-safe ring buffer of slow statements."""
+
+    def __init__(self, threshold_ms: float, size: int, explain_interval: float):
+        self.threshold_ms = threshold_ms
+        self.explain_interval = explain_interval
+        self._entries: deque = deque(maxlen=size)
+        self._explained_at: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self.recorded = 0
+
+    def maybe_record(
+        self,
+        conn,
+        statement: str,
+        parameters: Any,
+        seconds: float,
+        fingerprint: str,
+        route: Optional[str],
+        executemany: bool,
+    ) -> None:
+        duration_ms = seconds * 1000
+        if self.threshold_ms <= 0 or duration_ms < self.threshold_ms:
+            return
+
+        plan, explain_error = None, None
+        if not executemany and self._should_explain(statement, fingerprint):
+            try:
+                plan = self._explain(conn, statement, parameters)
+            except Exception as exc:
+                explain_error = str(exc)
+
+        entry = {
+            "recorded_at": datetime.now(timezone.utc).isoformat(),
+            "duration_ms": round(duration_ms, 1),
+            "route": route,
+            "fingerprint": fingerprint,
+            "parameters": parameter_shapes(parameters),
+            "executemany": executemany,
+            "plan": plan,
+            "explain_error": explain_error,
+        }
+        with self._lock:
+            self._entries.append(entry)
+            self.recorded += 1
+
+    def entries(self, limit: int) -> List[dict]:
+        """Most recent entries first."""
+        with self._lock:
+            return list(reversed(self._entries))[:limit]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._explained_at.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "threshold_ms": self.threshold_ms,
+                "buffered": len(self._entries),
+                "capacity": self._entries.maxlen,
+                "recorded": self.recorded,
+            }
+
+    def _should_explain(self, statement: str, fingerprint: str) -> bool:
+        if not settings.SLOW_QUERY_EXPLAIN:
+            return False
+        if not statement.lstrip().upper().startswith(EXPLAINABLE):
+            return False
+        now = time.monotonic()
+        with self._lock:
+            last = self._explained_at.get(fingerprint)
+            if last is not None and now - last < self.explain_interval:
+                return False
+            self._explained_at[fingerprint] = now
+            return True
+
+    @staticmethod
+    def _explain(conn, statement: str, parameters: Any) -> Any:
+        # A separate DBAPI cursor: the original may still hold unread rows,
+        # and going below SQLAlchemy keeps the hooks from seeing the EXPLAIN.
+        # The savepoint keeps a failed EXPLAIN from aborting the caller's
+        # transaction.
+        cursor = conn.connection.dbapi_connection.cursor()
+        try:
+            cursor.execute("SAVEPOINT slow_query_explain")
+            try:
+                cursor.execute(
+                    f"EXPLAIN (ANALYZE off, FORMAT JSON) {statement}", parameters
+                )
+                plan = cursor.fetchone()[0]
+            except Exception:
+                cursor.execute("ROLLBACK TO SAVEPOINT slow_query_explain")
+                raise
+            finally:
+                cursor.execute("RELEASE SAVEPOINT slow_query_explain")
+        finally:
+            cursor.close()
+        return plan
+
+
+slow_query_log = SlowQueryLog(
+    threshold_ms=settings.SLOW_QUERY_THRESHOLD_MS,
+    size=settings.SLOW_QUERY_BUFFER_SIZE,
+    explain_interval=settings.SLOW_QUERY_EXPLAIN_INTERVAL_SECONDS,
+)
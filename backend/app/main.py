@@ -1,9 +1,24 @@
-from contextlib import asynccontextmanager
-from fastapi import FastAPI
+import asyncio
+import logging
+from contextlib import asynccontextmanager, suppress
+
+from anyio import to_thread
+from fastapi import FastAPI, Request, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
 
 from app.core.config import settings
+from app.core.database import check_pool_capacity, dispose_async_engine
+from app.core.hashing import HashingPoolBusy, password_hasher
+from app.core.query_stats import start_request
 from app.core.seed import seed_admin, seed_dummy_data
+from app.services import dashboard as dashboard_service
+from app.services.analytics_cache import analytics_cache
+from app.services.check_in_batcher import check_in_batcher
+from app.services.columnar import columnar_store, load_columnar_store
+from app.services.export_jobs import export_jobs, run_export_cleanup
+from app.services.materializer import run_daily_materializer
 from app.routers import (
     waitlist,
     users,
@@ -12,16 +27,52 @@ from app.routers import (
     attendance,
     shifts,
     analytics,
+    internal,
 )
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    """Application lifespan - seeds data on startup."""
+    """Application lifespan - seeds data and starts background jobs."""
+    to_thread.current_default_thread_limiter().total_tokens = (
+        settings.THREADPOOL_WORKERS
+    )
+    check_pool_capacity()
     seed_admin()
     seed_dummy_data()
+
+    materializer = None
+    if settings.ATTENDANCE_MATERIALIZER_ENABLED:
+        materializer = asyncio.create_task(run_daily_materializer())
+
+    if settings.CHECK_IN_GROUP_COMMIT:
+        check_in_batcher.start()
+
+    export_cleanup = asyncio.create_task(run_export_cleanup())
+
+    columnar_loader = None
+    if columnar_store.available:
+        # Analytics use SQL until the load finishes
+        columnar_loader = asyncio.create_task(run_in_threadpool(load_columnar_store))
+
     yield
 
+    if columnar_loader is not None:
+        columnar_loader.cancel()
+    export_cleanup.cancel()
+    if materializer is not None:
+        materializer.cancel()
+        with suppress(asyncio.CancelledError):
+            await materializer
+    # Queued check-ins are written before the engines go away
+    await check_in_batcher.stop()
+    export_jobs.shutdown()
+    analytics_cache.shutdown()
+    columnar_store.shutdown()
+    dashboard_service.shutdown()
+    password_hasher.shutdown()
+    await dispose_async_engine()
+
 
 app = FastAPI(
     title=settings.APP_NAME,
@@ -38,6 +89,72 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+
+logger = logging.getLogger("app.queries")
+
+
+@app.middleware("http")
+async def record_query_stats(request: Request, call_next):
+    """Report per-request SQL count and time; enforce route query budgets."""
+    if not settings.QUERY_STATS_ENABLED:
+        return await call_next(request)
+
+    stats = start_request(request.scope)
+    response = await call_next(request)
+
+    route = request.scope.get("route")
+    path = route.path if route is not None else request.url.path
+    response.headers["Server-Timing"] = stats.server_timing()
+
+    repeated = stats.repeated(settings.QUERY_REPEAT_WARN_THRESHOLD)
+    if repeated:
+        statement, count = repeated[0]
+        logger.warning(
+            "%s %s ran the same statement %d times (possible N+1): %s",
+            request.method,
+            path,
+            count,
+            statement[:200],
+        )
+    logger.debug(
+        "%s %s: %d queries in %.1f ms",
+        request.method,
+        path,
+        stats.count,
+        stats.total_seconds * 1000,
+    )
+
+    if stats.count > stats.effective_budget:
+        logger.warning(
+            "%s %s exceeded its query budget: %d > %d",
+            request.method,
+            path,
+            stats.count,
+            stats.effective_budget,
+        )
+        if settings.QUERY_BUDGET_STRICT:
+            return JSONResponse(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                content={
+                    "detail": f"Query budget exceeded: {stats.count} > "
+                    f"{stats.effective_budget}"
+                },
+                headers={"Server-Timing": stats.server_timing()},
+            )
+
+    return response
+
+
+@app.exception_handler(HashingPoolBusy)
+async def hashing_pool_busy_handler(request: Request, exc: HashingPoolBusy):
+    """Shed load when the password hashing queue is full."""
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": "Server is busy, please retry shortly"},
+        headers={"Retry-After": "1"},
+    )
+
+
 app.include_router(waitlist.router)
 app.include_router(users.router, prefix=settings.API_V1_PREFIX)
 app.include_router(users.users_router, prefix=settings.API_V1_PREFIX)
@@ -46,6 +163,7 @@ app.include_router(departments.router, prefix=settings.API_V1_PREFIX)
 app.include_router(attendance.router, prefix=settings.API_V1_PREFIX)
 app.include_router(shifts.router, prefix=settings.API_V1_PREFIX)
 app.include_router(analytics.router, prefix=settings.API_V1_PREFIX)
+app.include_router(internal.router, prefix=settings.API_V1_PREFIX)
 
 
 @app.get("/health")
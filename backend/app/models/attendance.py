@@ -8,6 +8,7 @@ from sqlalchemy import (
     Float,
     ForeignKey,
     Boolean,
+    UniqueConstraint,
 )
 from sqlalchemy.orm import relationship
 
@@ -20,6 +21,9 @@ def utc_now():
 
 class Attendance(Base):
     __tablename__ = "attendance"
+    __table_args__ = (
+        UniqueConstraint("employee_id", "date", name="uq_attendance_employee_date"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     employee_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
@@ -29,6 +33,11 @@ class Attendance(Base):
     check_in_latitude = Column(Float, nullable=False)
     check_in_longitude = Column(Float, nullable=False)
     distance_from_location_meters = Column(Float, nullable=True)
+    # Set by the geofence audit when a location's fence no longer contains
+    # the check-in fix
+    outside_geofence = Column(
+        Boolean, nullable=False, default=False, server_default="false"
+    )
     is_late = Column(Boolean, default=False, nullable=False)
     late_by_minutes = Column(Integer, default=0, nullable=False)
     status = Column(String(20), default="present", nullable=False)
@@ -0,0 +1,18 @@
+from sqlalchemy import BigInteger, Column, Date, ForeignKey, Integer
+
+from app.core.database import Base
+
+
+class AttendanceDailyRollup(Base):
+    __tablename__ = "attendance_daily_rollup"
+
+    date = Column(Date, primary_key=True)
+    location_id = Column(Integer, ForeignKey("locations.id"), primary_key=True)
+    # 0 when the employee has no department, so it can be part of the key
+    department_id = Column(Integer, primary_key=True, default=0)
+    headcount = Column(Integer, nullable=False, default=0)
+    present = Column(Integer, nullable=False, default=0)
+    late = Column(Integer, nullable=False, default=0)
+    checked_out = Column(Integer, nullable=False, default=0)
+    not_marked = Column(Integer, nullable=False, default=0)
+    late_minutes = Column(BigInteger, nullable=False, default=0)
@@ -0,0 +1,72 @@
+from datetime import datetime, timezone
+from sqlalchemy import (
+    Column,
+    DateTime,
+    ForeignKey,
+    Index,
+    Integer,
+    String,
+    UniqueConstraint,
+    text,
+)
+
+from app.core.database import Base
+
+
+def utc_now():
+    return datetime.now(timezone.utc)
+
+
+class AttendanceDevice(Base):
+    """A device enrolled to sign an employee's offline punches.
+
+    The signing key is derived from the server secret, the device and
+    ``key_version``; rotating bumps the version and revoking stops the
+    device from syncing at all.
+    """
+
+    __tablename__ = "attendance_devices"
+    __table_args__ = (
+        UniqueConstraint("employee_id", "device_id", name="uq_attendance_device"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    employee_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    device_id = Column(String(64), nullable=False)
+    name = Column(String(100), nullable=True)
+    key_version = Column(Integer, nullable=False, default=1)
+    status = Column(String(20), nullable=False, default="active")
+    created_at = Column(DateTime(timezone=True), default=utc_now)
+    rotated_at = Column(DateTime(timezone=True), nullable=True)
+    revoked_at = Column(DateTime(timezone=True), nullable=True)
+    revoked_by = Column(Integer, ForeignKey("users.id"), nullable=True)
+    last_sync_at = Column(DateTime(timezone=True), nullable=True)
+
+
+class AttendanceSyncEvent(Base):
+    """Outcome of an offline punch, keyed by the device's idempotency key."""
+
+    __tablename__ = "attendance_sync_events"
+    __table_args__ = (
+        Index(
+            "ix_attendance_sync_events_pending_review",
+            "attendance_id",
+            postgresql_where=text("review_status = 'pending'"),
+        ),
+    )
+
+    employee_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    idempotency_key = Column(String(64), primary_key=True)
+    event_type = Column(String(20), nullable=False)
+    # Time claimed by the device, and when the server received the punch
+    event_time = Column(DateTime(timezone=True), nullable=False)
+    received_at = Column(DateTime(timezone=True), nullable=True)
+    device_id = Column(String(64), nullable=True)
+    status = Column(String(20), nullable=False)
+    detail = Column(String(255), nullable=True)
+    attendance_id = Column(Integer, ForeignKey("attendance.id"), nullable=True)
+    # "pending" for back-dated check-ins, then "approved" or "rejected"
+    review_status = Column(String(20), nullable=True)
+    reviewed_by = Column(Integer, ForeignKey("users.id"), nullable=True)
+    reviewed_at = Column(DateTime(timezone=True), nullable=True)
+    created_at = Column(DateTime(timezone=True), default=utc_now)
@@ -0,0 +1,10 @@
+from sqlalchemy import Column, BigInteger, String
+
+from app.core.database import Base
+
+
+class CacheVersion(Base):
+    __tablename__ = "cache_versions"
+
+    name = Column(String(50), primary_key=True)
+    version = Column(BigInteger, nullable=False, default=0)
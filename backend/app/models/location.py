@@ -1,5 +1,5 @@
 from datetime import datetime, timezone
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Float
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Float, Text
 from sqlalchemy.orm import relationship
 
 from app.core.database import Base
@@ -19,6 +19,8 @@ class Location(Base):
     latitude = Column(Float, nullable=True)
     longitude = Column(Float, nullable=True)
     allowed_radius_meters = Column(Integer, default=150, nullable=False)
+    # Optional polygon fence as an encoded polyline (see services.geofence)
+    geofence_polygon = Column(Text, nullable=True)
     is_active = Column(Boolean, default=True, nullable=False)
     created_at = Column(DateTime(timezone=True), default=utc_now)
 
@@ -33,6 +33,7 @@ class User(Base):
     department_id = Column(Integer, ForeignKey("departments.id"), nullable=True)
     supervisor_id = Column(Integer, ForeignKey("users.id"), nullable=True)
     status = Column(String(50), nullable=False, default=UserStatus.ACTIVE.value)
+    token_version = Column(Integer, nullable=False, default=0, server_default="0")
     created_at = Column(DateTime(timezone=True), default=utc_now)
     updated_at = Column(DateTime(timezone=True), default=utc_now, onupdate=utc_now)
 
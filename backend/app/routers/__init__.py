@@ -7,4 +7,5 @@ from app.routers import (
     attendance,
     shifts,
     analytics,
+    internal,
 )
@@ -1,83 +1,117 @@
+import json
 from typing import Optional
 from datetime import datetime, date, timedelta, timezone
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from sqlalchemy import func, case
 
-from app.core.database import get_db
-from app.routers.users import require_admin, require_supervisor_or_admin
+from app.core.config import settings
+from app.core.database import get_async_db
+from app.core.principals import Principal
+from app.routers.users import (
+    require_supervisor_or_admin_claims,
+    require_supervisor_or_admin_claims_async,
+)
 from app.models.user import User
 from app.models.attendance import Attendance
 from app.models.location import Location
 from app.models.department import Department
-from app.services import attendance as attendance_service
+from app.schemas.analytics import AnalyticsQueryRequest, DashboardRequest
+from app.services import dashboard as dashboard_service
+from app.services.analytics_engine import (
+    MEASURES,
+    AggregationQuery,
+    AnalyticsQueryError,
+    run_aggregation,
+    run_trends,
+)
+from app.services.analytics_cache import cached_response_async
+from app.services.columnar import columnar_store
+from app.services.live import live_events
+from app.services.reference_data import reference_data
+from app.services.rollup import read_rollup
 
 router = APIRouter(prefix="/attendance/analytics", tags=["Attendance Analytics"])
 
 
-@router.get("/summary")
-def get_attendance_summary(
-    date: Optional[date] = Query(None),
-    location_id: Optional[int] = Query(None),
-    current_user: User = Depends(require_supervisor_or_admin),
-    db: Session = Depends(get_db),
-):
-    """Get attendance summary stats."""
-    today = datetime.now(timezone.utc).date()
+def _latest_date_with_data(db: Session) -> date:
+    """Most recent day with any check-ins, falling back to today."""
+    latest_date_with_data = (
+        db.query(func.max(Attendance.date))
+        .filter(Attendance.status.in_(["present", "checked_out"]))
+        .scalar()
+    )
+    return latest_date_with_data or datetime.now(timezone.utc).date()
+
+
+def _supervisor_scope(current_user: Principal) -> Optional[int]:
+    """Location a supervisor's analytics are restricted to, if any."""
+    if current_user.role == "Supervisor" and current_user.location_id:
+        return current_user.location_id
+    return None
+
+
+def _breakdown_row(row: Optional[dict]) -> dict:
+    total_employees = row["headcount"] if row else 0
+    present = row["present"] if row else 0
+    return {
+        "total_employees": total_employees,
+        "present": present,
+        "absent": total_employees - present,
+        "late": row["late"] if row else 0,
+        "attendance_rate": round(present / total_employees * 100, 1)
+        if total_employees > 0
+        else 0,
+    }
 
-    if not date:
-        latest_date_with_data = (
-            db.query(func.max(Attendance.date))
-            .filter(Attendance.status.in_(["present", "checked_out"]))
-            .scalar()
-        )
-        if latest_date_with_data:
-            date = latest_date_with_data
-        else:
-            date = today
 
-    attendance_service.ensure_daily_attendance(db)
+def _day_counters(
+    db: Session,
+    on_date: date,
+    group_by: Optional[str] = None,
+    location_id: Optional[int] = None,
+    in_memory: bool = True,
+) -> dict:
+    """Daily counters from the columnar store when enabled, else the rollup."""
+    if in_memory and columnar_store.serves(db, on_date):
+        return columnar_store.day_counters(on_date, group_by, location_id)
+    return read_rollup(db, on_date, group_by=group_by, location_id=location_id)
+
+
+def compute_summary(
+    db: Session,
+    on_date: Optional[date],
+    location_id: Optional[int],
+    scope: Optional[int],
+    in_memory: bool = True,
+) -> dict:
+    if not on_date:
+        on_date = _latest_date_with_data(db)
 
     employees_query = db.query(User).filter(
         User.role == "Employee", User.status == "Active"
     )
-    if current_user.role == "Supervisor" and current_user.location_id:
-        employees_query = employees_query.filter(
-            User.location_id == current_user.location_id
-        )
+    if scope is not None:
+        employees_query = employees_query.filter(User.location_id == scope)
     total_employees = employees_query.count()
 
-    attendance_query = db.query(Attendance).filter(
-        Attendance.date == date, Attendance.status.in_(["present", "checked_out"])
-    )
-    if current_user.role == "Supervisor" and current_user.location_id:
-        attendance_query = attendance_query.filter(
-            Attendance.location_id == current_user.location_id
-        )
-    if location_id:
-        attendance_query = attendance_query.filter(
-            Attendance.location_id == location_id
-        )
+    counters = _day_counters(
+        db, on_date, location_id=scope or location_id, in_memory=in_memory
+    )[None]
+    present_count = counters["present"]
+    late_count = counters["late"]
+    checked_out_count = counters["checked_out"]
+    not_marked_count = counters["not_marked"]
 
-    today_records = attendance_query.all()
-    present_count = len(today_records)
-    late_count = len([r for r in today_records if r.is_late])
-    checked_out_count = len([r for r in today_records if r.status == "checked_out"])
-
-    not_marked_count = (
-        db.query(Attendance)
-        .filter(Attendance.date == date, Attendance.status == "not_marked")
-        .count()
-    )
     absent_count = total_employees - present_count - not_marked_count
     if absent_count < 0:
         absent_count = 0
 
     supervisors_query = db.query(User).filter(User.role == "Supervisor")
-    if current_user.role == "Supervisor" and current_user.location_id:
-        supervisors_query = supervisors_query.filter(
-            User.location_id == current_user.location_id
-        )
+    if scope is not None:
+        supervisors_query = supervisors_query.filter(User.location_id == scope)
     total_supervisors = supervisors_query.count()
 
     locations_count = db.query(Location).filter(Location.is_active == True).count()
@@ -94,21 +128,23 @@ def get_attendance_summary(
     }
 
 
-@router.get("/late-frequency")
-def get_late_frequency(
-    start_date: Optional[date] = Query(None),
-    end_date: Optional[date] = Query(None),
-    location_id: Optional[int] = Query(None),
-    current_user: User = Depends(require_supervisor_or_admin),
-    db: Session = Depends(get_db),
-):
-    """Get late arrival frequency per employee."""
+def compute_late_frequency(
+    db: Session,
+    start_date: Optional[date],
+    end_date: Optional[date],
+    location_id: Optional[int],
+    scope: Optional[int],
+    in_memory: bool = True,
+) -> list:
     if not end_date:
         end_date = datetime.now(timezone.utc).date()
     if not start_date:
         start_date = end_date - timedelta(days=30)
 
-    attendance_service.ensure_daily_attendance(db)
+    if in_memory and columnar_store.serves(db, start_date, end_date):
+        return columnar_store.late_frequency(
+            db, start_date, end_date, location_id=scope or location_id
+        )
 
     query = (
         db.query(
@@ -125,8 +161,8 @@ def get_late_frequency(
         )
     )
 
-    if current_user.role == "Supervisor" and current_user.location_id:
-        query = query.filter(Attendance.location_id == current_user.location_id)
+    if scope is not None:
+        query = query.filter(Attendance.location_id == scope)
     elif location_id:
         query = query.filter(Attendance.location_id == location_id)
 
@@ -146,245 +182,320 @@ def get_late_frequency(
     ]
 
 
-@router.get("/absent-trends")
-def get_absent_trends(
-    days: int = Query(7, ge=1, le=30),
-    location_id: Optional[int] = Query(None),
-    current_user: User = Depends(require_supervisor_or_admin),
-    db: Session = Depends(get_db),
-):
-    """Get absent trends over last N days."""
+def compute_absent_trends(
+    db: Session,
+    days: int,
+    bucket: str,
+    location_id: Optional[int],
+    scope: Optional[int],
+    in_memory: bool = True,
+) -> list:
+    end_date = _latest_date_with_data(db)
+    start_date = end_date - timedelta(days=days - 1)
     today = datetime.now(timezone.utc).date()
 
-    latest_date_with_data = (
-        db.query(func.max(Attendance.date))
-        .filter(Attendance.status.in_(["present", "checked_out"]))
-        .scalar()
+    if in_memory and columnar_store.serves(db, start_date, end_date):
+        return columnar_store.trends(
+            db, start_date, end_date, today, bucket, location_id=scope or location_id
+        )
+
+    return run_trends(
+        db,
+        start_date,
+        end_date,
+        today=today,
+        bucket=bucket,
+        location_id=scope or location_id,
     )
 
-    if latest_date_with_data:
-        end_date = latest_date_with_data
+
+def compute_by_location(
+    db: Session, on_date: Optional[date], scope: Optional[int], in_memory: bool = True
+) -> list:
+    if not on_date:
+        on_date = _latest_date_with_data(db)
+
+    by_location = _day_counters(
+        db, on_date, group_by="location", location_id=scope, in_memory=in_memory
+    )
+
+    if in_memory:
+        locations = reference_data.active_locations(db)
     else:
-        end_date = today
+        locations = db.query(Location).filter(Location.is_active == True).all()
+    if scope is not None:
+        locations = [loc for loc in locations if loc.id == scope]
 
-    start_date = end_date - timedelta(days=days - 1)
+    return [
+        {
+            "location_id": location.id,
+            "location_name": location.name,
+            **_breakdown_row(by_location.get(location.id)),
+        }
+        for location in sorted(locations, key=lambda loc: loc.id)
+    ]
 
-    attendance_service.ensure_daily_attendance(db)
 
-    employees_query = db.query(User).filter(
-        User.role == "Employee", User.status == "Active"
+def compute_by_department(
+    db: Session, on_date: Optional[date], scope: Optional[int], in_memory: bool = True
+) -> list:
+    if not on_date:
+        on_date = _latest_date_with_data(db)
+
+    by_department = _day_counters(
+        db, on_date, group_by="department", location_id=scope, in_memory=in_memory
     )
-    if current_user.role == "Supervisor" and current_user.location_id:
-        employees_query = employees_query.filter(
-            User.location_id == current_user.location_id
-        )
-    total_employees = employees_query.count()
 
-    trends = []
-    for i in range(days):
-        current_date = start_date + timedelta(days=i)
+    departments = db.query(Department).filter(Department.is_active == True).all()
+    if scope is not None:
+        departments = [dept for dept in departments if dept.id in by_department]
 
-        base_filter = [
-            Attendance.date == current_date,
-            Attendance.status.in_(["present", "checked_out"]),
-        ]
+    return [
+        {
+            "department_id": dept.id,
+            "department_name": dept.name,
+            **_breakdown_row(by_department.get(dept.id)),
+        }
+        for dept in departments
+    ]
 
-        if current_user.role == "Supervisor" and current_user.location_id:
-            base_filter.append(Attendance.location_id == current_user.location_id)
-        elif location_id:
-            base_filter.append(Attendance.location_id == location_id)
 
-        present_count = db.query(Attendance).filter(*base_filter).count()
+@router.get("/summary")
+async def get_attendance_summary(
+    date: Optional[date] = Query(None),
+    location_id: Optional[int] = Query(None),
+    current_user: Principal = Depends(require_supervisor_or_admin_claims_async),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Get attendance summary stats."""
+    scope = _supervisor_scope(current_user)
+    return await cached_response_async(
+        db,
+        "summary",
+        {"date": date, "location_id": location_id},
+        scope,
+        lambda session: compute_summary(session, date, location_id, scope),
+    )
 
-        if current_date == today:
-            not_marked_count = (
-                db.query(Attendance)
-                .filter(
-                    Attendance.date == current_date, Attendance.status == "not_marked"
-                )
-                .count()
-            )
-            absent_count = total_employees - present_count - not_marked_count
-            if absent_count < 0:
-                absent_count = 0
-        else:
-            absent_count = total_employees - present_count
-
-        trends.append(
-            {
-                "date": current_date.isoformat(),
-                "present": present_count,
-                "absent": absent_count,
-            }
-        )
 
-    return trends
+@router.get("/late-frequency")
+async def get_late_frequency(
+    start_date: Optional[date] = Query(None),
+    end_date: Optional[date] = Query(None),
+    location_id: Optional[int] = Query(None),
+    current_user: Principal = Depends(require_supervisor_or_admin_claims_async),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Get late arrival frequency per employee."""
+    scope = _supervisor_scope(current_user)
+    return await cached_response_async(
+        db,
+        "late-frequency",
+        {"start_date": start_date, "end_date": end_date, "location_id": location_id},
+        scope,
+        lambda session: compute_late_frequency(
+            session, start_date, end_date, location_id, scope
+        ),
+    )
+
+
+@router.get("/absent-trends")
+async def get_absent_trends(
+    days: int = Query(7, ge=1, le=365),
+    bucket: str = Query("day", enum=["day", "week", "month"]),
+    location_id: Optional[int] = Query(None),
+    current_user: Principal = Depends(require_supervisor_or_admin_claims_async),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Get present/absent/late trends over the last N days, in one query."""
+    scope = _supervisor_scope(current_user)
+    return await cached_response_async(
+        db,
+        "absent-trends",
+        {"days": days, "bucket": bucket, "location_id": location_id},
+        scope,
+        lambda session: compute_absent_trends(
+            session, days, bucket, location_id, scope
+        ),
+    )
 
 
 @router.get("/by-location")
-def get_attendance_by_location(
+async def get_attendance_by_location(
     date: Optional[date] = Query(None),
-    current_user: User = Depends(require_supervisor_or_admin),
-    db: Session = Depends(get_db),
+    current_user: Principal = Depends(require_supervisor_or_admin_claims_async),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """Get attendance breakdown by location."""
-    today = datetime.now(timezone.utc).date()
-
-    if not date:
-        latest_date_with_data = (
-            db.query(func.max(Attendance.date))
-            .filter(Attendance.status.in_(["present", "checked_out"]))
-            .scalar()
-        )
-        if latest_date_with_data:
-            date = latest_date_with_data
-        else:
-            date = today
+    scope = _supervisor_scope(current_user)
+    return await cached_response_async(
+        db,
+        "by-location",
+        {"date": date},
+        scope,
+        lambda session: compute_by_location(session, date, scope),
+    )
 
-    attendance_service.ensure_daily_attendance(db)
 
-    if current_user.role == "Supervisor" and current_user.location_id:
-        locations = (
-            db.query(Location)
-            .filter(Location.id == current_user.location_id, Location.is_active == True)
-            .all()
-        )
-    else:
-        locations = db.query(Location).filter(Location.is_active == True).all()
+@router.get("/by-department")
+async def get_attendance_by_department(
+    date: Optional[date] = Query(None),
+    current_user: Principal = Depends(require_supervisor_or_admin_claims_async),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Get attendance breakdown by department."""
+    scope = _supervisor_scope(current_user)
+    return await cached_response_async(
+        db,
+        "by-department",
+        {"date": date},
+        scope,
+        lambda session: compute_by_department(session, date, scope),
+    )
 
-    results = []
 
-    for location in locations:
-        total_employees = (
-            db.query(User)
-            .filter(
-                User.role == "Employee",
-                User.status == "Active",
-                User.location_id == location.id,
-            )
-            .count()
+def _widget_fn(widget, scope: Optional[int]):
+    # In-memory state (columnar store, reference data cache) is not part of
+    # the snapshot, so widgets read everything through their session
+    if widget.widget == "summary":
+        return lambda db: compute_summary(
+            db, widget.on_date, widget.location_id, scope, in_memory=False
         )
-
-        present = (
-            db.query(Attendance)
-            .filter(
-                Attendance.date == date,
-                Attendance.location_id == location.id,
-                Attendance.status.in_(["present", "checked_out"]),
-            )
-            .count()
+    if widget.widget == "late-frequency":
+        return lambda db: compute_late_frequency(
+            db,
+            widget.start_date,
+            widget.end_date,
+            widget.location_id,
+            scope,
+            in_memory=False,
         )
-
-        late = (
-            db.query(Attendance)
-            .filter(
-                Attendance.date == date,
-                Attendance.location_id == location.id,
-                Attendance.is_late == True,
-            )
-            .count()
+    if widget.widget == "absent-trends":
+        return lambda db: compute_absent_trends(
+            db, widget.days, widget.bucket, widget.location_id, scope, in_memory=False
         )
-
-        results.append(
-            {
-                "location_id": location.id,
-                "location_name": location.name,
-                "total_employees": total_employees,
-                "present": present,
-                "absent": total_employees - present,
-                "late": late,
-                "attendance_rate": round(present / total_employees * 100, 1)
-                if total_employees > 0
-                else 0,
-            }
+    if widget.widget == "by-location":
+        return lambda db: compute_by_location(
+            db, widget.on_date, scope, in_memory=False
         )
+    return lambda db: compute_by_department(db, widget.on_date, scope, in_memory=False)
 
-    return results
 
-
-@router.get("/by-department")
-def get_attendance_by_department(
-    date: Optional[date] = Query(None),
-    current_user: User = Depends(require_supervisor_or_admin),
-    db: Session = Depends(get_db),
+@router.post("/dashboard")
+def get_dashboard(
+    dashboard_data: DashboardRequest,
+    current_user: Principal = Depends(require_supervisor_or_admin_claims),
 ):
-    """Get attendance breakdown by department."""
-    today = datetime.now(timezone.utc).date()
+    """
+    Evaluate several analytics widgets in one request.
+
+    Widgets run concurrently against a single REPEATABLE READ snapshot, so
+    their numbers are mutually consistent; they bypass the in-memory
+    columnar store and caches to stay inside it. Results are keyed by each
+    widget's ``key`` (or its name).
+    """
+    scope = _supervisor_scope(current_user)
+    widgets = {}
+    for widget in dashboard_data.widgets:
+        key = widget.key or widget.widget
+        if key in widgets:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Duplicate widget key: {key}",
+            )
+        widgets[key] = _widget_fn(widget, scope)
 
-    if not date:
-        latest_date_with_data = (
-            db.query(func.max(Attendance.date))
-            .filter(Attendance.status.in_(["present", "checked_out"]))
-            .scalar()
-        )
-        if latest_date_with_data:
-            date = latest_date_with_data
-        else:
-            date = today
+    return dashboard_service.evaluate_widgets(widgets)
 
-    attendance_service.ensure_daily_attendance(db)
 
-    if current_user.role == "Supervisor" and current_user.location_id:
-        departments = (
-            db.query(Department)
-            .join(User)
-            .filter(
-                Department.is_active == True,
-                User.location_id == current_user.location_id,
-            )
-            .distinct()
-            .all()
-        )
-    else:
-        departments = db.query(Department).filter(Department.is_active == True).all()
+@router.get("/stream")
+async def stream_attendance_events(
+    request: Request,
+    location_id: Optional[int] = Query(None),
+    current_user: Principal = Depends(require_supervisor_or_admin_claims_async),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    Server-Sent Events stream of live attendance changes.
+
+    Emits ``check_in`` and ``check_out`` events and coalesced ``counters``
+    deltas (present, late, checked_out, not_marked) per location.
+    Supervisors only receive their own location. A ``resync`` event means
+    events were dropped for a slow client and the dashboard should re-fetch.
+    """
+    # Hand the auth check's connection back to the pool for the stream's life
+    await db.close()
+
+    scope = _supervisor_scope(current_user) or location_id
+    subscription = live_events.subscribe(scope)
+
+    async def events():
+        try:
+            yield "retry: 5000\n\n"
+            while not await request.is_disconnected():
+                batch = await subscription.next_batch(
+                    settings.LIVE_EVENTS_KEEPALIVE_SECONDS
+                )
+                if not batch:
+                    yield ": keepalive\n\n"
+                for event in batch:
+                    yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+        finally:
+            live_events.unsubscribe(subscription)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
-    results = []
 
-    for dept in departments:
-        total_employees = (
-            db.query(User)
-            .filter(
-                User.role == "Employee",
-                User.status == "Active",
-                User.department_id == dept.id,
-            )
-            .count()
-        )
+@router.post("/query")
+async def query_analytics(
+    query_data: AnalyticsQueryRequest,
+    current_user: Principal = Depends(require_supervisor_or_admin_claims_async),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    Run a grouped attendance aggregation.
+
+    Dimensions: location, department, city, supervisor, date.
+    Measures: headcount, present, late, checked_out, not_marked,
+    avg_late_minutes. ``grouping_sets`` computes several groupings (and
+    ``[]`` for a grand total) in the same statement.
+    """
+    if query_data.on_date:
+        start_date = end_date = query_data.on_date
+    else:
+        end_date = query_data.end_date or await db.run_sync(_latest_date_with_data)
+        start_date = query_data.start_date or end_date
 
-        present = (
-            db.query(Attendance)
-            .join(User)
-            .filter(
-                Attendance.date == date,
-                User.department_id == dept.id,
-                Attendance.status.in_(["present", "checked_out"]),
-            )
-            .count()
+    if (end_date - start_date).days > 366:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Date range cannot exceed 366 days",
         )
 
-        late = (
-            db.query(Attendance)
-            .join(User)
-            .filter(
-                Attendance.date == date,
-                User.department_id == dept.id,
-                Attendance.is_late == True,
-            )
-            .count()
+    aggregation = AggregationQuery(
+        start_date=start_date,
+        end_date=end_date,
+        dimensions=query_data.dimensions,
+        measures=query_data.measures or MEASURES,
+        grouping_sets=query_data.grouping_sets,
+        location_id=query_data.location_id,
+        department_id=query_data.department_id,
+        scope_location_id=_supervisor_scope(current_user),
+    )
+    try:
+        return await cached_response_async(
+            db,
+            "query",
+            vars(aggregation),
+            aggregation.scope_location_id,
+            lambda session: run_aggregation(session, aggregation),
         )
-
-        results.append(
-            {
-                "department_id": dept.id,
-                "department_name": dept.name,
-                "total_employees": total_employees,
-                "present": present,
-                "absent": total_employees - present,
-                "late": late,
-                "attendance_rate": round(present / total_employees * 100, 1)
-                if total_employees > 0
-                else 0,
-            }
+    except AnalyticsQueryError as exc:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(exc),
         )
-
-    return results
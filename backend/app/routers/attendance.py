@@ -1,33 +1,56 @@
+import base64
+import json
+from io import BytesIO
 from typing import List, Optional
 from datetime import datetime, date, timedelta, timezone
 from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi.responses import FileResponse, StreamingResponse
+from sqlalchemy import DateTime, func, literal_column, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session, joinedload
 
-from app.core.database import get_db
+from app.core.config import settings
+from app.core.database import estimate_row_count, get_async_db, get_db
+from app.core.principals import Principal
 from app.routers.users import (
+    get_claims_user_async,
     get_current_user,
+    get_current_user_async,
     require_admin,
     require_supervisor_or_admin,
 )
 from app.models.user import User
-from app.models.location import Location
 from app.models.attendance import Attendance
+from app.models.attendance_sync import AttendanceDevice, AttendanceSyncEvent
 from app.schemas.attendance import (
     CheckInRequest,
     CheckInResponse,
     CheckOutResponse,
     AttendanceResponse,
     AttendanceListResponse,
+    DeviceEnrollRequest,
+    DeviceKeyResponse,
+    DeviceResponse,
+    ExportJobRequest,
+    ExportJobResponse,
+    SyncEventResult,
+    SyncRequest,
+    SyncResponse,
+    SyncReviewRequest,
+    SyncReviewResponse,
 )
 from app.services import attendance as attendance_service
+from app.services import attendance_sync
+from app.services.check_in_batcher import check_in_batcher
+from app.services import export as export_service
+from app.services.export import ExportFilters, iter_export_rows
+from app.services.export_jobs import ExportJobStatus, export_jobs
+from app.services.live import live_events
 
 router = APIRouter(prefix="/attendance", tags=["Attendance"])
 
 
-def get_current_employee(
-    current_user: User = Depends(get_current_user),
-) -> User:
-    """Ensure current user is an employee (not restricted to Employee role, but any authenticated user)."""
+def _require_employee(current_user: Principal) -> Principal:
     if current_user.role == "Admin":
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -36,11 +59,25 @@ def get_current_employee(
     return current_user
 
 
+async def get_current_employee(
+    current_user: Principal = Depends(get_current_user_async),
+) -> Principal:
+    """Ensure current user is an employee (not restricted to Employee role, but any authenticated user)."""
+    return _require_employee(current_user)
+
+
+async def get_claims_employee(
+    current_user: Principal = Depends(get_claims_user_async),
+) -> Principal:
+    """Same as get_current_employee, authorized from token claims."""
+    return _require_employee(current_user)
+
+
 @router.post("/checkin", response_model=CheckInResponse)
-def check_in(
+async def check_in(
     check_in_data: CheckInRequest,
-    current_user: User = Depends(get_current_employee),
-    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_employee),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """Employee check-in with GPS validation."""
     if not current_user.location_id:
@@ -49,16 +86,10 @@ def check_in(
             detail="You are not assigned to any work location. Please contact your administrator.",
         )
 
-    today = datetime.now(timezone.utc).date()
-
-    if attendance_service.check_already_checked_in(current_user.id, today, db):
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Already checked in today",
+    location = await db.run_sync(
+        lambda session: attendance_service.get_location_config(
+            current_user.location_id, session
         )
-
-    location = (
-        db.query(Location).filter(Location.id == current_user.location_id).first()
     )
     if not location:
         raise HTTPException(
@@ -70,17 +101,32 @@ def check_in(
         check_in_data.latitude,
         check_in_data.longitude,
         location,
-        db,
     )
 
+    if not is_valid and settings.CHECK_IN_ANY_SITE:
+        site = await db.run_sync(
+            lambda session: attendance_service.resolve_site(
+                check_in_data.latitude, check_in_data.longitude, session
+            )
+        )
+        if site is not None:
+            location, distance = site
+            is_valid = True
+
     if not is_valid:
+        if location.polygon is not None:
+            detail = f"You are not at your assigned work location. You are {int(distance)}m outside its boundary."
+        else:
+            detail = f"You are not at your assigned work location. You are {int(distance)}m away. Must be within {location.allowed_radius_meters}m."
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"You are not at your assigned work location. You are {int(distance)}m away. Must be within {location.allowed_radius_meters}m.",
+            detail=detail,
         )
 
     now = datetime.now(timezone.utc)
-    shift_config = attendance_service.get_shift_config(location.id, db)
+    shift_config = await db.run_sync(
+        lambda session: attendance_service.get_shift_config(location.id, session)
+    )
 
     is_late = False
     late_by_minutes = 0
@@ -91,21 +137,53 @@ def check_in(
             shift_config.grace_period_minutes,
         )
 
-    attendance = Attendance(
+    check_in = dict(
         employee_id=current_user.id,
         location_id=location.id,
+        department_id=current_user.department_id,
+        attendance_date=now.date(),
         check_in_time=now,
-        check_in_latitude=check_in_data.latitude,
-        check_in_longitude=check_in_data.longitude,
-        distance_from_location_meters=distance,
+        latitude=check_in_data.latitude,
+        longitude=check_in_data.longitude,
+        distance_meters=distance,
         is_late=is_late,
         late_by_minutes=late_by_minutes,
-        status="present",
-        date=today,
+        placeholder_location_id=current_user.location_id,
+    )
+    if check_in_batcher.running:
+        attendance = await check_in_batcher.submit(**check_in)
+    else:
+        attendance = await db.run_sync(
+            lambda session: attendance_service.record_check_in(session, **check_in)
+        )
+    if attendance is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Already checked in today",
+        )
+
+    moved = (
+        not attendance.created and attendance.location_id != current_user.location_id
     )
-    db.add(attendance)
-    db.commit()
-    db.refresh(attendance)
+    live_events.publish(
+        attendance.location_id,
+        {
+            "type": "check_in",
+            "attendance_id": attendance.id,
+            "employee_id": attendance.employee_id,
+            "employee_name": current_user.name,
+            "location_id": attendance.location_id,
+            "check_in_time": attendance.check_in_time.isoformat(),
+            "is_late": attendance.is_late,
+            "late_by_minutes": attendance.late_by_minutes,
+        },
+        present=1,
+        late=1 if attendance.is_late else 0,
+        not_marked=0 if attendance.created or moved else -1,
+    )
+    if moved:
+        # The placeholder was counted at the assigned location
+        live_events.publish(current_user.location_id, not_marked=-1)
 
     if is_late:
         message = f"Checked in late by {late_by_minutes} minutes"
@@ -130,33 +208,56 @@ def check_in(
 
 
 @router.post("/checkout", response_model=CheckOutResponse)
-def check_out(
-    current_user: User = Depends(get_current_employee),
-    db: Session = Depends(get_db),
+async def check_out(
+    current_user: Principal = Depends(get_current_employee),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """Employee check-out."""
-    today = datetime.now(timezone.utc).date()
-
-    attendance = attendance_service.get_todays_attendance(current_user.id, db)
-    if not attendance:
+    attendance = await db.run_sync(
+        lambda session: attendance_service.get_todays_attendance(
+            current_user.id, session
+        )
+    )
+    if not attendance or attendance.status == "not_marked":
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="You have not checked in yet",
         )
 
-    if attendance.status == "checked_out":
+    # The update only matches a present row, so a repeated or concurrent
+    # check-out comes back empty instead of counting twice
+    attendance_id = attendance.id
+    attendance = await db.run_sync(
+        lambda session: attendance_service.record_check_out(
+            session,
+            attendance_id,
+            department_id=current_user.department_id,
+            check_out_time=datetime.now(timezone.utc),
+        )
+    )
+    if attendance is None:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Already checked out",
         )
+    live_events.publish(
+        attendance.location_id,
+        {
+            "type": "check_out",
+            "attendance_id": attendance.id,
+            "employee_id": attendance.employee_id,
+            "employee_name": current_user.name,
+            "location_id": attendance.location_id,
+            "check_out_time": attendance.check_out_time.isoformat(),
+        },
+        checked_out=1,
+    )
 
-    now = datetime.now(timezone.utc)
-    attendance.check_out_time = now
-    attendance.status = "checked_out"
-    db.commit()
-    db.refresh(attendance)
-
-    location = db.query(Location).filter(Location.id == attendance.location_id).first()
+    location = await db.run_sync(
+        lambda session: attendance_service.get_location_config(
+            attendance.location_id, session
+        )
+    )
 
     return CheckOutResponse(
         id=attendance.id,
@@ -174,19 +275,241 @@ def check_out(
     )
 
 
-@router.get("/today", response_model=Optional[AttendanceResponse])
-def get_today_attendance(
-    current_user: User = Depends(get_current_employee),
+def _sync_enabled() -> None:
+    if not attendance_sync.sync_enabled():
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Offline sync is not configured",
+        )
+
+
+def _can_manage_employee(current_user: Principal, employee: Optional[User]) -> bool:
+    if employee is None:
+        return False
+    if current_user.role == "Admin":
+        return True
+    if current_user.role == "Supervisor":
+        return employee.location_id == current_user.location_id
+    return employee.id == current_user.id
+
+
+@router.post("/devices", response_model=DeviceKeyResponse)
+def enroll_device(
+    device_data: DeviceEnrollRequest,
+    current_user: Principal = Depends(get_current_employee),
     db: Session = Depends(get_db),
 ):
-    """Get today's attendance for current employee."""
-    attendance_service.ensure_daily_attendance(db)
+    """Enroll a device for offline sync, or rotate its key if already enrolled."""
+    _sync_enabled()
+    device, error = attendance_sync.enroll_device(
+        db, current_user.id, device_data.device_id, device_data.name
+    )
+    if error:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=error)
+    return DeviceKeyResponse(
+        device_id=device.device_id,
+        key_version=device.key_version,
+        device_key=attendance_sync.device_key(device),
+    )
+
+
+@router.get("/devices", response_model=List[DeviceResponse])
+def list_devices(
+    employee_id: Optional[int] = None,
+    current_user: Principal = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """List enrolled devices: your own, or an employee's for supervisors/admins."""
+    employee = db.get(User, employee_id or current_user.id)
+    if not _can_manage_employee(current_user, employee):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not authorized to view this employee's devices",
+        )
+    return (
+        db.query(AttendanceDevice)
+        .filter(AttendanceDevice.employee_id == employee.id)
+        .order_by(AttendanceDevice.id)
+        .all()
+    )
+
+
+@router.post("/devices/{device_pk}/revoke", response_model=DeviceResponse)
+def revoke_device(
+    device_pk: int,
+    current_user: Principal = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """Revoke a device so it can no longer sync (owner, supervisor or admin)."""
+    device = db.get(AttendanceDevice, device_pk)
+    if device is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Device not found"
+        )
+    if not _can_manage_employee(current_user, db.get(User, device.employee_id)):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not authorized to revoke this device",
+        )
+    attendance_sync.revoke_device(db, device, current_user.id)
+    return device
+
+
+@router.post("/sync", response_model=SyncResponse)
+async def sync_punches(
+    sync_data: SyncRequest,
+    current_user: Principal = Depends(get_current_employee),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Apply a batch of check-ins/check-outs queued while the device was offline."""
+    _sync_enabled()
+    if len(sync_data.events) > settings.ATTENDANCE_SYNC_MAX_EVENTS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {settings.ATTENDANCE_SYNC_MAX_EVENTS} events per sync",
+        )
 
-    attendance = attendance_service.get_todays_attendance(current_user.id, db)
+    device, error = await db.run_sync(
+        lambda session: attendance_sync.get_active_device(
+            session, current_user.id, sync_data.device_id
+        )
+    )
+    if error:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=error)
+
+    outcomes, written = await db.run_sync(
+        lambda session: attendance_sync.sync_punches(
+            session,
+            device=device,
+            location_id=current_user.location_id,
+            department_id=current_user.department_id,
+            events=sync_data.events,
+        )
+    )
+
+    # Dashboards only stream today's activity
+    today = datetime.now(timezone.utc).date()
+    for kind, row in written:
+        if row.date != today:
+            continue
+        if kind == "check_in":
+            moved = not row.created and row.location_id != current_user.location_id
+            live_events.publish(
+                row.location_id,
+                {
+                    "type": "check_in",
+                    "attendance_id": row.id,
+                    "employee_id": row.employee_id,
+                    "employee_name": current_user.name,
+                    "location_id": row.location_id,
+                    "check_in_time": row.check_in_time.isoformat(),
+                    "is_late": row.is_late,
+                    "late_by_minutes": row.late_by_minutes,
+                },
+                present=1,
+                late=1 if row.is_late else 0,
+                not_marked=0 if row.created or moved else -1,
+            )
+            if moved:
+                live_events.publish(current_user.location_id, not_marked=-1)
+        else:
+            live_events.publish(
+                row.location_id,
+                {
+                    "type": "check_out",
+                    "attendance_id": row.id,
+                    "employee_id": row.employee_id,
+                    "employee_name": current_user.name,
+                    "location_id": row.location_id,
+                    "check_out_time": row.check_out_time.isoformat(),
+                },
+                checked_out=1,
+            )
+
+    results = [
+        SyncEventResult(
+            idempotency_key=outcome.idempotency_key,
+            status=outcome.status,
+            detail=outcome.detail,
+            replayed=outcome.replayed,
+            attendance_id=outcome.attendance_id,
+            review_status=outcome.review_status,
+        )
+        for outcome in outcomes
+    ]
+    applied = sum(1 for result in results if result.status == "applied")
+    return SyncResponse(
+        results=results, applied=applied, rejected=len(results) - applied
+    )
+
+
+@router.get("/sync/reviews", response_model=List[SyncReviewResponse])
+def list_sync_reviews(
+    current_user: Principal = Depends(require_supervisor_or_admin),
+    db: Session = Depends(get_db),
+):
+    """Back-dated offline check-ins awaiting review (Supervisor/Admin)."""
+    query = (
+        db.query(AttendanceSyncEvent)
+        .join(Attendance, Attendance.id == AttendanceSyncEvent.attendance_id)
+        .filter(AttendanceSyncEvent.review_status == "pending")
+    )
+    if current_user.role == "Supervisor":
+        query = query.filter(Attendance.location_id == current_user.location_id)
+    return query.order_by(AttendanceSyncEvent.received_at).all()
+
+
+@router.post(
+    "/sync/reviews/{employee_id}/{idempotency_key}",
+    response_model=SyncReviewResponse,
+)
+def review_sync_check_in(
+    employee_id: int,
+    idempotency_key: str,
+    review: SyncReviewRequest,
+    current_user: Principal = Depends(require_supervisor_or_admin),
+    db: Session = Depends(get_db),
+):
+    """Approve (re-judge lateness at the claimed time) or reject a back-dated check-in."""
+    event = db.get(AttendanceSyncEvent, (employee_id, idempotency_key))
+    if event is None or event.review_status is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Review not found"
+        )
+    if not _can_manage_employee(current_user, db.get(User, employee_id)):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not authorized to review this employee's attendance",
+        )
+    if event.review_status != "pending":
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Already {event.review_status}",
+        )
+    attendance_sync.review_check_in(db, event, review.approve, current_user.id)
+    return event
+
+
+@router.get("/today", response_model=Optional[AttendanceResponse])
+async def get_today_attendance(
+    current_user: Principal = Depends(get_claims_employee),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Get today's attendance for current employee."""
+    today = datetime.now(timezone.utc).date()
+    attendance = await db.scalar(
+        select(Attendance).where(
+            Attendance.employee_id == current_user.id, Attendance.date == today
+        )
+    )
     if not attendance:
         return None
 
-    location = db.query(Location).filter(Location.id == attendance.location_id).first()
+    location = await db.run_sync(
+        lambda session: attendance_service.get_location_config(
+            attendance.location_id, session
+        )
+    )
 
     return AttendanceResponse(
         id=attendance.id,
@@ -205,30 +528,28 @@ def get_today_attendance(
 
 
 @router.get("/history", response_model=List[AttendanceResponse])
-def get_attendance_history(
+async def get_attendance_history(
     start_date: Optional[date] = Query(None),
     end_date: Optional[date] = Query(None),
-    current_user: User = Depends(get_current_employee),
-    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_claims_employee),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """Get attendance history for current employee."""
-    attendance_service.ensure_daily_attendance(db)
 
     if not end_date:
         end_date = datetime.now(timezone.utc).date()
     if not start_date:
         start_date = end_date - timedelta(days=30)
 
-    records = (
-        db.query(Attendance)
+    records = await db.scalars(
+        select(Attendance)
         .options(joinedload(Attendance.employee), joinedload(Attendance.location))
-        .filter(
+        .where(
             Attendance.employee_id == current_user.id,
             Attendance.date >= start_date,
             Attendance.date <= end_date,
         )
         .order_by(Attendance.date.desc())
-        .all()
     )
 
     result = []
@@ -251,12 +572,47 @@ def get_attendance_history(
                 status=attendance.status,
                 date=attendance.date,
                 distance_from_location_meters=attendance.distance_from_location_meters,
+                outside_geofence=attendance.outside_geofence,
             )
         )
 
     return result
 
 
+# Rows without a check-in (not_marked) sort first within a day, as with
+# PostgreSQL's default NULLS FIRST for descending order. Rendered inline rather
+# than bound so the expression matches ix_attendance_date_check_in_id.
+CHECK_IN_SORT_NULL = literal_column(
+    "'infinity'::timestamptz", DateTime(timezone=True)
+)
+
+
+def _encode_cursor(attendance: Attendance) -> str:
+    """Build an opaque keyset cursor pointing just after this row."""
+    check_in = (
+        attendance.check_in_time.isoformat() if attendance.check_in_time else None
+    )
+    raw = json.dumps([attendance.date.isoformat(), check_in, attendance.id])
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def _decode_cursor(cursor: str) -> tuple:
+    """Parse a cursor back into (date, check_in sort key, id)."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode("ascii"))
+        cursor_date, check_in, cursor_id = json.loads(raw)
+        return (
+            date.fromisoformat(cursor_date),
+            datetime.fromisoformat(check_in) if check_in else CHECK_IN_SORT_NULL,
+            int(cursor_id),
+        )
+    except (ValueError, TypeError, UnicodeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor",
+        )
+
+
 @router.get("/all", response_model=AttendanceListResponse)
 def get_all_attendance(
     date: Optional[date] = Query(None),
@@ -267,15 +623,26 @@ def get_all_attendance(
     employee_id: Optional[int] = Query(None),
     page: int = Query(1, ge=1),
     page_size: int = Query(20, ge=1, le=1000),
-    current_user: User = Depends(require_supervisor_or_admin),
+    cursor: Optional[str] = Query(None),
+    pagination: str = Query("page", enum=["page", "cursor"]),
+    total_mode: Optional[str] = Query(None, enum=["exact", "estimated", "none"]),
+    current_user: Principal = Depends(require_supervisor_or_admin),
     db: Session = Depends(get_db),
 ):
-    """Get all attendance records (Admin/Supervisor only)."""
-    attendance_service.ensure_daily_attendance(db)
+    """
+    Get all attendance records (Admin/Supervisor only).
 
-    query = db.query(Attendance).options(
-        joinedload(Attendance.employee), joinedload(Attendance.location)
-    )
+    ``pagination=page`` keeps the page/page_size interface. ``pagination=cursor``
+    (or passing ``cursor``) uses keyset pagination on (date, check_in_time, id)
+    and returns an opaque ``next_cursor``. ``total_mode`` picks an exact count,
+    a planner estimate, or no total at all; it defaults to ``exact`` for page
+    mode and ``none`` for cursor mode, which exists to avoid full scans.
+    """
+    use_cursor = pagination == "cursor" or cursor is not None
+    if total_mode is None:
+        total_mode = "none" if use_cursor else "exact"
+
+    query = db.query(Attendance)
 
     if current_user.role == "Supervisor":
         if not current_user.location_id:
@@ -302,13 +669,30 @@ def get_all_attendance(
     if department_id:
         query = query.join(User).filter(User.department_id == department_id)
 
-    total = query.count()
-    records = (
-        query.order_by(Attendance.date.desc(), Attendance.check_in_time.desc())
-        .offset((page - 1) * page_size)
-        .limit(page_size)
-        .all()
-    )
+    total = None
+    if total_mode == "exact":
+        total = query.count()
+    elif total_mode == "estimated":
+        total = estimate_row_count(db, query)
+
+    check_in_sort = func.coalesce(Attendance.check_in_time, CHECK_IN_SORT_NULL)
+    query = query.options(
+        joinedload(Attendance.employee), joinedload(Attendance.location)
+    ).order_by(Attendance.date.desc(), check_in_sort.desc(), Attendance.id.desc())
+
+    next_cursor = None
+    if use_cursor:
+        if cursor:
+            query = query.filter(
+                tuple_(Attendance.date, check_in_sort, Attendance.id)
+                < tuple_(*_decode_cursor(cursor))
+            )
+        records = query.limit(page_size + 1).all()
+        if len(records) > page_size:
+            records = records[:page_size]
+            next_cursor = _encode_cursor(records[-1])
+    else:
+        records = query.offset((page - 1) * page_size).limit(page_size).all()
 
     items = []
     for attendance in records:
@@ -330,192 +714,161 @@ def get_all_attendance(
                 status=attendance.status,
                 date=attendance.date,
                 distance_from_location_meters=attendance.distance_from_location_meters,
+                outside_geofence=attendance.outside_geofence,
             )
         )
 
     return AttendanceListResponse(
-        items=items, total=total, page=page, page_size=page_size
+        items=items,
+        total=total,
+        total_is_estimate=total_mode == "estimated",
+        page=page,
+        page_size=page_size,
+        next_cursor=next_cursor,
     )
 
 
+EXPORT_MEDIA_TYPES = {
+    "excel": (
+        "xlsx",
+        "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    ),
+    "csv": ("csv", "text/csv"),
+    "ndjson": ("ndjson", "application/x-ndjson"),
+    "pdf": ("pdf", "application/pdf"),
+}
+
+
 @router.get("/export")
 def export_attendance(
-    format: str = Query("excel", enum=["excel", "pdf"]),
+    format: str = Query("excel", enum=["excel", "csv", "ndjson", "pdf"]),
     start_date: Optional[date] = Query(None),
     end_date: Optional[date] = Query(None),
     location_id: Optional[int] = Query(None),
     department_id: Optional[int] = Query(None),
-    current_user: User = Depends(require_admin),
-    db: Session = Depends(get_db),
+    current_user: Principal = Depends(require_admin),
 ):
-    """Export attendance records to Excel or PDF."""
+    """
+    Export attendance records to Excel, CSV, NDJSON or PDF.
+
+    Excel, CSV and NDJSON are streamed from a server-side cursor, so memory
+    use does not grow with the date range.
+    """
     if not end_date:
         end_date = datetime.now(timezone.utc).date()
     if not start_date:
         start_date = end_date - timedelta(days=30)
 
-    query = db.query(Attendance).options(
-        joinedload(Attendance.employee), joinedload(Attendance.location)
+    filters = ExportFilters(
+        start_date=start_date,
+        end_date=end_date,
+        location_id=location_id,
+        department_id=department_id,
     )
 
-    if location_id:
-        query = query.filter(Attendance.location_id == location_id)
-    if department_id:
-        query = query.join(User).filter(User.department_id == department_id)
-
-    records = (
-        query.filter(
-            Attendance.date >= start_date,
-            Attendance.date <= end_date,
+    if format == "pdf":
+        buffer = BytesIO()
+        export_service.write_pdf(
+            iter_export_rows(filters, time_format="%H:%M", empty="-"),
+            start_date,
+            end_date,
+            buffer,
+        )
+        buffer.seek(0)
+        return StreamingResponse(
+            buffer,
+            media_type="application/pdf",
+            headers={
+                "Content-Disposition": f"attachment; filename=attendance_{start_date}_{end_date}.pdf"
+            },
         )
-        .order_by(Attendance.date.desc(), Attendance.check_in_time.desc())
-        .all()
-    )
 
-    if format == "excel":
-        return export_to_excel(records, start_date, end_date)
-    else:
-        return export_to_pdf(records, start_date, end_date)
+    streams = {
+        "excel": export_service.stream_excel,
+        "csv": export_service.stream_csv,
+        "ndjson": export_service.stream_ndjson,
+    }
+    extension, media_type = EXPORT_MEDIA_TYPES[format]
+    return StreamingResponse(
+        streams[format](iter_export_rows(filters)),
+        media_type=media_type,
+        headers={
+            "Content-Disposition": f"attachment; filename=attendance_{start_date}_{end_date}.{extension}"
+        },
+    )
 
 
-def export_to_excel(records: List[Attendance], start_date: date, end_date: date):
-    try:
-        import xlsxwriter
-        from io import BytesIO
-        from fastapi.responses import StreamingResponse
-
-        output = BytesIO()
-        workbook = xlsxwriter.Workbook(output, {"in_memory": True})
-        worksheet = workbook.add_worksheet()
-
-        headers = [
-            "Date",
-            "Employee",
-            "Location",
-            "Check In",
-            "Check Out",
-            "Status",
-            "Late (mins)",
-        ]
-        for col, header in enumerate(headers):
-            worksheet.write(0, col, header)
-
-        for row, record in enumerate(records, start=1):
-            worksheet.write(row, 0, str(record.date))
-            worksheet.write(
-                row, 1, record.employee.name if record.employee else "Unknown"
-            )
-            worksheet.write(
-                row, 2, record.location.name if record.location else "Unknown"
-            )
-            worksheet.write(
-                row,
-                3,
-                record.check_in_time.strftime("%H:%M:%S")
-                if record.check_in_time
-                else "",
-            )
-            worksheet.write(
-                row,
-                4,
-                record.check_out_time.strftime("%H:%M:%S")
-                if record.check_out_time
-                else "",
-            )
-            worksheet.write(row, 5, record.status)
-            worksheet.write(row, 6, record.late_by_minutes if record.is_late else 0)
+def _export_job_response(job: ExportJobStatus) -> ExportJobResponse:
+    return ExportJobResponse(
+        job_id=job.job_id,
+        format=job.format,
+        status=job.status,
+        progress=job.progress,
+        rows_written=job.rows_written,
+        total_rows=job.total_rows,
+        error=job.error,
+    )
 
-        workbook.close()
-        output.seek(0)
 
-        return StreamingResponse(
-            output,
-            media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            headers={
-                "Content-Disposition": f"attachment; filename=attendance_{start_date}_{end_date}.xlsx"
-            },
-        )
-    except ImportError:
+def _get_export_job(job_id: str) -> ExportJobStatus:
+    job = export_jobs.get(job_id)
+    if job is None:
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="xlsxwriter not installed. Run: pip install xlsxwriter",
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Export job not found",
         )
+    return job
 
 
-def export_to_pdf(records: List[Attendance], start_date: date, end_date: date):
-    try:
-        from io import BytesIO
-        from fastapi.responses import StreamingResponse
-        from reportlab.lib import colors
-        from reportlab.lib.pagesizes import letter, landscape
-        from reportlab.lib.styles import getSampleStyleSheet
-        from reportlab.platypus import SimpleDocTemplate, Table, TableStyle
+@router.post(
+    "/exports",
+    response_model=ExportJobResponse,
+    status_code=status.HTTP_202_ACCEPTED,
+)
+def submit_export_job(
+    job_data: ExportJobRequest,
+    current_user: Principal = Depends(require_admin),
+    db: Session = Depends(get_db),
+):
+    """Queue a background export (Admin only). Identical exports reuse the result."""
+    end_date = job_data.end_date or datetime.now(timezone.utc).date()
+    start_date = job_data.start_date or end_date - timedelta(days=30)
+
+    filters = ExportFilters(
+        start_date=start_date,
+        end_date=end_date,
+        location_id=job_data.location_id,
+        department_id=job_data.department_id,
+    )
+    job = export_jobs.submit(job_data.format, filters, db)
+    return _export_job_response(job)
 
-        buffer = BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=landscape(letter))
-        elements = []
-        styles = getSampleStyleSheet()
-
-        elements.append(
-            styles["Title"].__call__(f"Attendance Report: {start_date} to {end_date}")
-        )
-
-        data = [
-            [
-                "Date",
-                "Employee",
-                "Location",
-                "Check In",
-                "Check Out",
-                "Status",
-                "Late (mins)",
-            ]
-        ]
-        for record in records:
-            data.append(
-                [
-                    str(record.date),
-                    record.employee.name if record.employee else "Unknown",
-                    record.location.name if record.location else "Unknown",
-                    record.check_in_time.strftime("%H:%M")
-                    if record.check_in_time
-                    else "-",
-                    record.check_out_time.strftime("%H:%M")
-                    if record.check_out_time
-                    else "-",
-                    record.status,
-                    str(record.late_by_minutes) if record.is_late else "0",
-                ]
-            )
 
-        table = Table(data)
-        table.setStyle(
-            TableStyle(
-                [
-                    ("BACKGROUND", (0, 0), (-1, 0), colors.grey),
-                    ("TEXTCOLOR", (0, 0), (-1, 0), colors.whitesmoke),
-                    ("ALIGN", (0, 0), (-1, -1), "CENTER"),
-                    ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
-                    ("FONTSIZE", (0, 0), (-1, 0), 10),
-                    ("BOTTOMPADDING", (0, 0), (-1, 0), 12),
-                    ("BACKGROUND", (0, 1), (-1, -1), colors.beige),
-                    ("GRID", (0, 0), (-1, -1), 1, colors.black),
-                ]
-            )
-        )
-        elements.append(table)
-        doc.build(elements)
-        buffer.seek(0)
+@router.get("/exports/{job_id}", response_model=ExportJobResponse)
+def get_export_job(
+    job_id: str,
+    current_user: Principal = Depends(require_admin),
+):
+    """Get status and progress of an export job (Admin only)."""
+    return _export_job_response(_get_export_job(job_id))
 
-        return StreamingResponse(
-            buffer,
-            media_type="application/pdf",
-            headers={
-                "Content-Disposition": f"attachment; filename=attendance_{start_date}_{end_date}.pdf"
-            },
-        )
-    except ImportError:
+
+@router.get("/exports/{job_id}/download")
+def download_export_job(
+    job_id: str,
+    current_user: Principal = Depends(require_admin),
+):
+    """Download a finished export (Admin only)."""
+    job = _get_export_job(job_id)
+    if job.status != "completed":
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="reportlab not installed. Run: pip install reportlab",
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Export is {job.status}",
         )
+
+    path = export_jobs.artifact_path(job.job_id, job.format)
+    return FileResponse(
+        path,
+        media_type=EXPORT_MEDIA_TYPES[job.format][1],
+        filename=f"attendance_export_{job.job_id[:12]}{path.suffix}",
+    )
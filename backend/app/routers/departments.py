@@ -3,6 +3,7 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 
 from app.core.database import get_db
+from app.core.principals import Principal, invalidate_all
 from app.routers.users import require_admin
 from app.models.user import User
 from app.models.department import Department
@@ -18,7 +19,7 @@ router = APIRouter(prefix="/departments", tags=["Departments"])
 @router.get("", response_model=List[DepartmentResponse])
 def list_departments(
     db: Session = Depends(get_db),
-    current_user: User = Depends(require_admin),
+    current_user: Principal = Depends(require_admin),
 ):
     """List all departments (Admin only)."""
     return db.query(Department).filter(Department.is_active == True).all()
@@ -28,7 +29,7 @@ def list_departments(
 def get_department(
     department_id: int,
     db: Session = Depends(get_db),
-    current_user: User = Depends(require_admin),
+    current_user: Principal = Depends(require_admin),
 ):
     """Get a specific department by ID (Admin only)."""
     department = db.query(Department).filter(Department.id == department_id).first()
@@ -44,7 +45,7 @@ def get_department(
 def create_department(
     department_data: DepartmentCreate,
     db: Session = Depends(get_db),
-    current_user: User = Depends(require_admin),
+    current_user: Principal = Depends(require_admin),
 ):
     """Create a new department (Admin only)."""
     existing = (
@@ -71,7 +72,7 @@ def update_department(
     department_id: int,
     department_data: DepartmentUpdate,
     db: Session = Depends(get_db),
-    current_user: User = Depends(require_admin),
+    current_user: Principal = Depends(require_admin),
 ):
     """Update a department (Admin only)."""
     department = db.query(Department).filter(Department.id == department_id).first()
@@ -104,7 +105,7 @@ def update_department(
 def deactivate_department(
     department_id: int,
     db: Session = Depends(get_db),
-    current_user: User = Depends(require_admin),
+    current_user: Principal = Depends(require_admin),
 ):
     """Deactivate a department (Admin only). Reassigns employees to another active department."""
     department = db.query(Department).filter(Department.id == department_id).first()
@@ -125,9 +126,13 @@ def deactivate_department(
         # Reassign employees to the new department
         db.query(User).filter(
             User.department_id == department_id, User.role == "Employee"
-        ).update({"department_id": new_department.id})
+        ).update(
+            {"department_id": new_department.id, "token_version": User.token_version + 1},
+            synchronize_session=False,
+        )
 
     # Deactivate the department
     department.is_active = False
     db.commit()
+    invalidate_all()
     return None
@@ -0,0 +1,73 @@
+from anyio import to_thread
+from fastapi import APIRouter, Depends, Query, status
+
+from app.core.database import pool_stats
+from app.core.hashing import password_hasher
+from app.core.principals import Principal, cache_stats
+from app.core.slow_queries import slow_query_log
+from app.routers.users import require_admin
+from app.services.analytics_cache import analytics_cache
+from app.services.check_in_batcher import check_in_batcher
+from app.services.columnar import columnar_store
+from app.services.live import live_events
+from app.services.reference_data import reference_data
+
+router = APIRouter(prefix="/internal", tags=["Internal"])
+
+
+@router.get("/cache")
+def get_cache_stats(current_user: Principal = Depends(require_admin)):
+    """In-process cache hit/miss counters (Admin only)."""
+    return {
+        "auth": cache_stats(),
+        "reference_data": reference_data.stats(),
+        "analytics": analytics_cache.stats(),
+        "columnar": columnar_store.stats(),
+    }
+
+
+@router.get("/hashing")
+def get_hashing_stats(current_user: Principal = Depends(require_admin)):
+    """Password hashing pool latency and queue metrics (Admin only)."""
+    return password_hasher.stats()
+
+
+@router.get("/live")
+def get_live_stats(current_user: Principal = Depends(require_admin)):
+    """Live dashboard stream subscriber counts (Admin only)."""
+    return live_events.stats()
+
+
+@router.get("/check-ins")
+def get_check_in_stats(current_user: Principal = Depends(require_admin)):
+    """Check-in group commit queue and batch metrics (Admin only)."""
+    return check_in_batcher.stats()
+
+
+@router.get("/pool")
+async def get_pool_stats(current_user: Principal = Depends(require_admin)):
+    """Database pool and worker threadpool metrics (Admin only)."""
+    limiter = to_thread.current_default_thread_limiter()
+    return {
+        "pools": pool_stats(),
+        "threadpool": {
+            "total": limiter.total_tokens,
+            "in_use": limiter.borrowed_tokens,
+            "waiting": limiter.statistics().tasks_waiting,
+        },
+    }
+
+
+@router.get("/slow-queries")
+def get_slow_queries(
+    limit: int = Query(50, ge=1, le=1000),
+    current_user: Principal = Depends(require_admin),
+):
+    """Most recent slow statements with their plans (Admin only)."""
+    return {**slow_query_log.stats(), "entries": slow_query_log.entries(limit)}
+
+
+@router.delete("/slow-queries", status_code=status.HTTP_204_NO_CONTENT)
+def clear_slow_queries(current_user: Principal = Depends(require_admin)):
+    """Empty the slow query log (Admin only)."""
+    slow_query_log.clear()
@@ -1,12 +1,20 @@
 from typing import List
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy.orm import Session
 
 from app.core.database import get_db
-from app.routers.users import require_admin
+from app.core.principals import Principal, invalidate_all
+from app.routers.users import get_claims_user, require_admin
 from app.models.user import User
 from app.models.location import Location
-from app.schemas.location import LocationCreate, LocationUpdate, LocationResponse
+from app.services.geofence import check_geofence, encode_polygon
+from app.services.reference_data import reference_data
+from app.schemas.location import (
+    LocationCreate,
+    LocationUpdate,
+    LocationResponse,
+    NearbyLocation,
+)
 
 router = APIRouter(prefix="/locations", tags=["Locations"])
 
@@ -14,17 +22,43 @@ router = APIRouter(prefix="/locations", tags=["Locations"])
 @router.get("", response_model=List[LocationResponse])
 def list_locations(
     db: Session = Depends(get_db),
-    current_user: User = Depends(require_admin),
+    current_user: Principal = Depends(require_admin),
 ):
     """List all locations (Admin only)."""
     return db.query(Location).filter(Location.is_active == True).all()
 
 
+@router.get("/nearby", response_model=List[NearbyLocation])
+def nearby_locations(
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+    k: int = Query(5, ge=1, le=50),
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_claims_user),
+):
+    """The k active locations closest to a GPS fix."""
+    nearest = reference_data.site_index(db).nearest(lat, lon, k)
+    return [
+        NearbyLocation(
+            id=site.id,
+            name=site.name,
+            city=site.city,
+            latitude=site.latitude,
+            longitude=site.longitude,
+            allowed_radius_meters=site.allowed_radius_meters,
+            has_polygon=site.polygon is not None,
+            distance_meters=round(distance, 1),
+            inside_geofence=check_geofence(lat, lon, site)[0],
+        )
+        for site, distance in nearest
+    ]
+
+
 @router.get("/{location_id}", response_model=LocationResponse)
 def get_location(
     location_id: int,
     db: Session = Depends(get_db),
-    current_user: User = Depends(require_admin),
+    current_user: Principal = Depends(require_admin),
 ):
     """Get a specific location by ID (Admin only)."""
     location = db.query(Location).filter(Location.id == location_id).first()
@@ -40,7 +74,7 @@ def get_location(
 def create_location(
     location_data: LocationCreate,
     db: Session = Depends(get_db),
-    current_user: User = Depends(require_admin),
+    current_user: Principal = Depends(require_admin),
 ):
     """Create a new location (Admin only)."""
     existing = db.query(Location).filter(Location.name == location_data.name).first()
@@ -57,8 +91,12 @@ def create_location(
         latitude=location_data.latitude,
         longitude=location_data.longitude,
         allowed_radius_meters=location_data.allowed_radius_meters,
+        geofence_polygon=encode_polygon(location_data.polygon)
+        if location_data.polygon
+        else None,
     )
     db.add(location)
+    reference_data.mark_changed(db)
     db.commit()
     db.refresh(location)
     return location
@@ -69,7 +107,7 @@ def update_location(
     location_id: int,
     location_data: LocationUpdate,
     db: Session = Depends(get_db),
-    current_user: User = Depends(require_admin),
+    current_user: Principal = Depends(require_admin),
 ):
     """Update a location (Admin only)."""
     location = db.query(Location).filter(Location.id == location_id).first()
@@ -90,9 +128,13 @@ def update_location(
             )
 
     update_data = location_data.model_dump(exclude_unset=True)
+    if "polygon" in update_data:
+        polygon = update_data.pop("polygon")
+        location.geofence_polygon = encode_polygon(polygon) if polygon else None
     for field, value in update_data.items():
         setattr(location, field, value)
 
+    reference_data.mark_changed(db)
     db.commit()
     db.refresh(location)
     return location
@@ -102,7 +144,7 @@ def update_location(
 def deactivate_location(
     location_id: int,
     db: Session = Depends(get_db),
-    current_user: User = Depends(require_admin),
+    current_user: Principal = Depends(require_admin),
 ):
     """Deactivate a location (Admin only). Reassigns employees to another active location."""
     location = db.query(Location).filter(Location.id == location_id).first()
@@ -123,14 +165,22 @@ def deactivate_location(
         # Reassign employees to the new location
         db.query(User).filter(
             User.location_id == location_id, User.role == "Employee"
-        ).update({"location_id": new_location.id})
+        ).update(
+            {"location_id": new_location.id, "token_version": User.token_version + 1},
+            synchronize_session=False,
+        )
 
         # Also reassign supervisors at this location
         db.query(User).filter(
             User.location_id == location_id, User.role == "Supervisor"
-        ).update({"location_id": new_location.id})
+        ).update(
+            {"location_id": new_location.id, "token_version": User.token_version + 1},
+            synchronize_session=False,
+        )
 
     # Deactivate the location
     location.is_active = False
+    reference_data.mark_changed(db)
     db.commit()
+    invalidate_all()
     return None
@@ -1,28 +1,34 @@
 from typing import List
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, joinedload
 
 from app.core.database import get_db
+from app.core.query_stats import query_budget
+from app.core.principals import Principal
 from app.routers.users import require_admin, require_supervisor_or_admin
-from app.models.user import User
 from app.models.location import Location
 from app.models.shift import ShiftConfig
+from app.services.reference_data import reference_data
 from app.schemas.shift import ShiftConfigCreate, ShiftConfigUpdate, ShiftConfigResponse
 
 router = APIRouter(prefix="/shifts", tags=["Shifts"])
 
 
-@router.get("", response_model=List[ShiftConfigResponse])
+@router.get(
+    "",
+    response_model=List[ShiftConfigResponse],
+    dependencies=[Depends(query_budget(3))],
+)
 def list_shifts(
     db: Session = Depends(get_db),
-    current_user: User = Depends(require_supervisor_or_admin),
+    current_user: Principal = Depends(require_supervisor_or_admin),
 ):
     """List all shift configurations (Admin/Supervisor)."""
-    shifts = db.query(ShiftConfig).all()
+    shifts = db.query(ShiftConfig).options(joinedload(ShiftConfig.location)).all()
 
     result = []
     for shift in shifts:
-        location = db.query(Location).filter(Location.id == shift.location_id).first()
+        location = shift.location
         result.append(
             ShiftConfigResponse(
                 id=shift.id,
@@ -43,7 +49,7 @@ def list_shifts(
 def get_shift(
     shift_id: int,
     db: Session = Depends(get_db),
-    current_user: User = Depends(require_supervisor_or_admin),
+    current_user: Principal = Depends(require_supervisor_or_admin),
 ):
     """Get a specific shift configuration (Admin/Supervisor)."""
     shift = db.query(ShiftConfig).filter(ShiftConfig.id == shift_id).first()
@@ -73,7 +79,7 @@ def get_shift(
 def create_shift(
     shift_data: ShiftConfigCreate,
     db: Session = Depends(get_db),
-    current_user: User = Depends(require_admin),
+    current_user: Principal = Depends(require_admin),
 ):
     """Create a new shift configuration (Admin only)."""
     location = db.query(Location).filter(Location.id == shift_data.location_id).first()
@@ -102,6 +108,7 @@ def create_shift(
         grace_period_minutes=shift_data.grace_period_minutes,
     )
     db.add(shift)
+    reference_data.mark_changed(db)
     db.commit()
     db.refresh(shift)
 
@@ -122,7 +129,7 @@ def update_shift(
     shift_id: int,
     shift_data: ShiftConfigUpdate,
     db: Session = Depends(get_db),
-    current_user: User = Depends(require_admin),
+    current_user: Principal = Depends(require_admin),
 ):
     """Update a shift configuration (Admin only)."""
     shift = db.query(ShiftConfig).filter(ShiftConfig.id == shift_id).first()
@@ -136,6 +143,7 @@ def update_shift(
     for field, value in update_data.items():
         setattr(shift, field, value)
 
+    reference_data.mark_changed(db)
     db.commit()
     db.refresh(shift)
 
@@ -157,7 +165,7 @@ def update_shift(
 def delete_shift(
     shift_id: int,
     db: Session = Depends(get_db),
-    current_user: User = Depends(require_admin),
+    current_user: Principal = Depends(require_admin),
 ):
     """Delete a shift configuration (Admin only)."""
     shift = db.query(ShiftConfig).filter(ShiftConfig.id == shift_id).first()
@@ -168,5 +176,6 @@ def delete_shift(
         )
 
     db.delete(shift)
+    reference_data.mark_changed(db)
     db.commit()
     return None
@@ -1,14 +1,29 @@
 import logging
-from typing import List, Optional
+from typing import List, Optional, Tuple
 from fastapi import APIRouter, Depends, HTTPException, status, Header
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, joinedload
 
-from app.core.database import get_db
+from app.core.config import settings
+from app.core.database import get_async_db, get_db
+from app.core.query_stats import query_budget
 from app.core.auth import (
-    verify_password,
+    verify_password_async,
     create_access_token,
-    get_token_payload,
-    hash_password,
+    hash_password_async,
+    password_needs_rehash,
+)
+from app.core.principals import (
+    CLAIM_FIELDS,
+    Principal,
+    cache_principal,
+    current_token_version,
+    decode_token_cached,
+    get_cached_principal,
+    invalidate_all,
+    invalidate_user,
+    user_claims,
 )
 from app.models.user import User, UserRole, UserStatus
 from app.schemas.user import (
@@ -18,54 +33,146 @@ from app.schemas.user import (
     UserLogin,
     TokenResponse,
 )
+from app.services.analytics_cache import bump_users_version
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/auth", tags=["Authentication"])
 
 
-def get_current_user(
-    authorization: Optional[str] = Header(None),
-    db: Session = Depends(get_db),
-) -> User:
-    """Get the current authenticated user from the JWT token."""
-    credentials_exception = HTTPException(
+def _credentials_exception() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
 
+
+def _inactive_exception() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_403_FORBIDDEN,
+        detail="User account is inactive",
+    )
+
+
+def _decode_bearer(authorization: Optional[str]) -> Tuple[int, dict]:
+    """Verify the bearer token and return (user_id, payload)."""
     if not authorization or not authorization.startswith("Bearer "):
-        raise credentials_exception
+        raise _credentials_exception()
 
     token = authorization.replace("Bearer ", "")
-    payload = get_token_payload(token)
+    payload = decode_token_cached(token)
 
     if payload is None:
-        raise credentials_exception
+        raise _credentials_exception()
 
     user_id_str = payload.get("sub")
     if user_id_str is None:
-        raise credentials_exception
+        raise _credentials_exception()
 
     try:
         user_id = int(user_id_str)
     except (ValueError, TypeError):
-        raise credentials_exception
+        raise _credentials_exception()
 
-    user = db.query(User).filter(User.id == user_id).first()
-    if user is None:
-        raise credentials_exception
+    return user_id, payload
 
-    if user.status == "Inactive":
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="User account is inactive",
-        )
 
-    return user
+def get_current_user(
+    authorization: Optional[str] = Header(None),
+    db: Session = Depends(get_db),
+) -> Principal:
+    """Get the current authenticated user from the JWT token.
+
+    Verified token payloads and user snapshots are served from an in-process
+    cache, so repeat callers do not hit the users table.
+    """
+    user_id, payload = _decode_bearer(authorization)
+
+    principal = get_cached_principal(user_id)
+    if principal is None:
+        user = db.query(User).filter(User.id == user_id).first()
+        if user is None:
+            raise _credentials_exception()
+        principal = cache_principal(user)
 
+    if principal.status == "Inactive":
+        raise _inactive_exception()
 
-def require_admin(current_user: User = Depends(get_current_user)) -> User:
+    if "ver" in payload and payload["ver"] != principal.token_version:
+        raise _credentials_exception()
+
+    return principal
+
+
+def get_claims_user(
+    authorization: Optional[str] = Header(None),
+    db: Session = Depends(get_db),
+) -> Principal:
+    """Get the current user from signed token claims alone.
+
+    Only the user's token version is checked (against the in-memory version
+    map), so read-mostly endpoints can authorize without loading the user row.
+    Tokens issued before claims were added fall back to get_current_user.
+    """
+    user_id, payload = _decode_bearer(authorization)
+
+    if not settings.JWT_CLAIMS_AUTH or "ver" not in payload:
+        return get_current_user(authorization, db)
+
+    version = current_token_version(user_id, db)
+    if version is None:
+        raise _inactive_exception()
+    if payload["ver"] != version:
+        raise _credentials_exception()
+
+    return Principal.from_claims(payload)
+
+
+async def get_current_user_async(
+    authorization: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_async_db),
+) -> Principal:
+    """Async variant of get_current_user for routes on the asyncpg engine."""
+    user_id, payload = _decode_bearer(authorization)
+
+    principal = get_cached_principal(user_id)
+    if principal is None:
+        user = await db.get(User, user_id)
+        if user is None:
+            raise _credentials_exception()
+        principal = cache_principal(user)
+
+    if principal.status == "Inactive":
+        raise _inactive_exception()
+
+    if "ver" in payload and payload["ver"] != principal.token_version:
+        raise _credentials_exception()
+
+    return principal
+
+
+async def get_claims_user_async(
+    authorization: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_async_db),
+) -> Principal:
+    """Async variant of get_claims_user."""
+    user_id, payload = _decode_bearer(authorization)
+
+    if not settings.JWT_CLAIMS_AUTH or "ver" not in payload:
+        return await get_current_user_async(authorization, db)
+
+    version = await db.run_sync(
+        lambda session: current_token_version(user_id, session)
+    )
+    if version is None:
+        raise _inactive_exception()
+    if payload["ver"] != version:
+        raise _credentials_exception()
+
+    return Principal.from_claims(payload)
+
+
+def require_admin(current_user: Principal = Depends(get_current_user)) -> Principal:
     """Require admin role."""
     if current_user.role != "Admin":
         raise HTTPException(
@@ -75,7 +182,9 @@ def require_admin(current_user: User = Depends(get_current_user)) -> User:
     return current_user
 
 
-def require_supervisor_or_admin(current_user: User = Depends(get_current_user)) -> User:
+def require_supervisor_or_admin(
+    current_user: Principal = Depends(get_current_user),
+) -> Principal:
     """Require supervisor or admin role."""
     if current_user.role not in ["Admin", "Supervisor"]:
         raise HTTPException(
@@ -85,7 +194,23 @@ def require_supervisor_or_admin(current_user: User = Depends(get_current_user))
     return current_user
 
 
-def require_supervisor(current_user: User = Depends(get_current_user)) -> User:
+def require_supervisor_or_admin_claims(
+    current_user: Principal = Depends(get_claims_user),
+) -> Principal:
+    """Require supervisor or admin role, authorized from token claims."""
+    return require_supervisor_or_admin(current_user)
+
+
+async def require_supervisor_or_admin_claims_async(
+    current_user: Principal = Depends(get_claims_user_async),
+) -> Principal:
+    """Async variant of require_supervisor_or_admin_claims."""
+    return require_supervisor_or_admin(current_user)
+
+
+def require_supervisor(
+    current_user: Principal = Depends(get_current_user),
+) -> Principal:
     """Require supervisor role."""
     if current_user.role != "Supervisor":
         raise HTTPException(
@@ -95,12 +220,28 @@ def require_supervisor(current_user: User = Depends(get_current_user)) -> User:
     return current_user
 
 
+async def _load_user(db: AsyncSession, user_id: int) -> Optional[User]:
+    """Load a user with the relations UserResponse serializes."""
+    return await db.scalar(
+        select(User)
+        .options(
+            joinedload(User.location),
+            joinedload(User.department),
+            joinedload(User.supervisor),
+        )
+        .where(User.id == user_id)
+        .execution_options(populate_existing=True)
+    )
+
+
 @router.post("/login", response_model=TokenResponse)
-def login(user_data: UserLogin, db: Session = Depends(get_db)):
+async def login(user_data: UserLogin, db: AsyncSession = Depends(get_async_db)):
     """Login endpoint - returns JWT token."""
-    user = db.query(User).filter(User.email == user_data.email).first()
+    user = await db.scalar(select(User).where(User.email == user_data.email))
 
-    if not user or not verify_password(user_data.password, user.password_hash):
+    if not user or not await verify_password_async(
+        user_data.password, user.password_hash
+    ):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid email or password",
@@ -113,8 +254,13 @@ def login(user_data: UserLogin, db: Session = Depends(get_db)):
             detail="User account is inactive",
         )
 
-    role_value = user.role if isinstance(user.role, str) else user.role.value
-    access_token = create_access_token(data={"sub": str(user.id), "role": role_value})
+    # Transparently upgrade hashes made with an older work factor
+    if password_needs_rehash(user.password_hash):
+        user.password_hash = await hash_password_async(user_data.password)
+        await db.commit()
+
+    user = await _load_user(db, user.id)
+    access_token = create_access_token(data=user_claims(user))
 
     return TokenResponse(
         access_token=access_token,
@@ -124,18 +270,31 @@ def login(user_data: UserLogin, db: Session = Depends(get_db)):
 
 
 @router.get("/me", response_model=UserResponse)
-def get_current_user_info(current_user: User = Depends(get_current_user)):
+async def get_current_user_info(
+    current_user: Principal = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db),
+):
     """Get current user information."""
-    return UserResponse.model_validate(current_user)
+    user = await _load_user(db, current_user.id)
+    if user is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="User not found",
+        )
+    return UserResponse.model_validate(user)
 
 
 users_router = APIRouter(prefix="/users", tags=["Users"])
 
 
-@users_router.get("", response_model=List[UserResponse])
+@users_router.get(
+    "",
+    response_model=List[UserResponse],
+    dependencies=[Depends(query_budget(3))],
+)
 def list_users(
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
 ):
     """
     List users based on role:
@@ -143,15 +302,20 @@ def list_users(
     - Supervisor: users in same location (required)
     - Employee: only own profile (handled by /me endpoint)
     """
+    query = db.query(User).options(
+        joinedload(User.location),
+        joinedload(User.department),
+        joinedload(User.supervisor),
+    )
     if current_user.role == "Admin":
-        return db.query(User).all()
+        return query.all()
     elif current_user.role == "Supervisor":
         if not current_user.location_id:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="Supervisor must have a location assigned",
             )
-        return db.query(User).filter(User.location_id == current_user.location_id).all()
+        return query.filter(User.location_id == current_user.location_id).all()
     else:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -159,30 +323,38 @@ def list_users(
         )
 
 
-@users_router.get("/supervisors", response_model=List[UserResponse])
+@users_router.get(
+    "/supervisors",
+    response_model=List[UserResponse],
+    dependencies=[Depends(query_budget(3))],
+)
 def list_supervisors(
     db: Session = Depends(get_db),
-    current_user: User = Depends(require_admin),
+    current_user: Principal = Depends(require_admin),
 ):
     """List all supervisors (Admin only)."""
-    from sqlalchemy.orm import joinedload
-
     return (
         db.query(User)
         .filter(User.role == "Supervisor")
-        .options(joinedload(User.location), joinedload(User.department))
+        .options(
+            joinedload(User.location),
+            joinedload(User.department),
+            joinedload(User.supervisor),
+        )
         .all()
     )
 
 
-@users_router.get("/employees", response_model=List[UserResponse])
+@users_router.get(
+    "/employees",
+    response_model=List[UserResponse],
+    dependencies=[Depends(query_budget(3))],
+)
 def list_employees(
     db: Session = Depends(get_db),
-    current_user: User = Depends(require_supervisor_or_admin),
+    current_user: Principal = Depends(require_supervisor_or_admin),
 ):
     """List employees based on role."""
-    from sqlalchemy.orm import joinedload
-
     if current_user.role == "Admin":
         return (
             db.query(User)
@@ -217,7 +389,7 @@ def list_employees(
 @users_router.get("/me/employees", response_model=List[UserResponse])
 def get_my_employees(
     db: Session = Depends(get_db),
-    current_user: User = Depends(require_supervisor),
+    current_user: Principal = Depends(require_supervisor),
 ):
     """Get employees under current supervisor."""
     return db.query(User).filter(User.supervisor_id == current_user.id).all()
@@ -227,7 +399,7 @@ def get_my_employees(
 def get_user(
     user_id: int,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
 ):
     """Get a specific user by ID."""
     user = db.query(User).filter(User.id == user_id).first()
@@ -260,13 +432,13 @@ def get_user(
 
 
 @users_router.post("", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
-def create_user(
+async def create_user(
     user_data: UserCreate,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_user_async),
 ):
     """Create a new user based on role permissions."""
-    existing_user = db.query(User).filter(User.email == user_data.email).first()
+    existing_user = await db.scalar(select(User).where(User.email == user_data.email))
     if existing_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -310,7 +482,7 @@ def create_user(
     user = User(
         name=user_data.name,
         email=user_data.email,
-        password_hash=hash_password(user_data.password),
+        password_hash=await hash_password_async(user_data.password),
         role=target_role,
         location_id=user_data.location_id,
         department_id=user_data.department_id,
@@ -319,21 +491,20 @@ def create_user(
     )
 
     db.add(user)
-    db.commit()
-    db.refresh(user)
+    await db.commit()
 
-    return UserResponse.model_validate(user)
+    return UserResponse.model_validate(await _load_user(db, user.id))
 
 
 @users_router.put("/{user_id}", response_model=UserResponse)
-def update_user(
+async def update_user(
     user_id: int,
     user_data: UserUpdate,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_user_async),
 ):
     """Update a user based on role permissions."""
-    user = db.query(User).filter(User.id == user_id).first()
+    user = await db.get(User, user_id)
 
     if not user:
         raise HTTPException(
@@ -360,7 +531,7 @@ def update_user(
             )
 
     if user_data.email and user_data.email != user.email:
-        existing = db.query(User).filter(User.email == user_data.email).first()
+        existing = await db.scalar(select(User).where(User.email == user_data.email))
         if existing:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -370,24 +541,35 @@ def update_user(
     update_data = user_data.model_dump(exclude_unset=True)
     password = update_data.pop("password", None)
     if password:
-        user.password_hash = hash_password(password)
+        user.password_hash = await hash_password_async(password)
 
+    claims_changed = False
+    data_changed = False
     for field, value in update_data.items():
-        if field == "role" and hasattr(value, "value"):
+        if hasattr(value, "value"):
             value = value.value
+        if getattr(user, field) != value:
+            data_changed = True
+            claims_changed = claims_changed or field in CLAIM_FIELDS
         setattr(user, field, value)
 
-    db.commit()
-    db.refresh(user)
+    if claims_changed:
+        user.token_version = (user.token_version or 0) + 1
+    if data_changed:
+        # Exports show names and filter by department
+        await db.run_sync(bump_users_version)
 
-    return UserResponse.model_validate(user)
+    await db.commit()
+    invalidate_user(user_id)
+
+    return UserResponse.model_validate(await _load_user(db, user_id))
 
 
 @users_router.delete("/{user_id}", status_code=status.HTTP_204_NO_CONTENT)
 def deactivate_user(
     user_id: int,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
 ):
     """Deactivate a user based on role permissions."""
     user = db.query(User).filter(User.id == user_id).first()
@@ -422,12 +604,22 @@ def deactivate_user(
         )
 
     # If deactivating a supervisor, set employees' supervisor_id to NULL
-    if user.role == "Supervisor":
+    was_supervisor = user.role == "Supervisor"
+    if was_supervisor:
         db.query(User).filter(
             User.supervisor_id == user_id, User.role == "Employee"
-        ).update({"supervisor_id": None})
+        ).update(
+            {"supervisor_id": None, "token_version": User.token_version + 1},
+            synchronize_session=False,
+        )
 
     user.status = "Inactive"
+    user.token_version = (user.token_version or 0) + 1
     db.commit()
 
+    if was_supervisor:
+        invalidate_all()
+    else:
+        invalidate_user(user_id)
+
     return None
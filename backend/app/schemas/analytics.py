@@ -0,0 +1,37 @@
+from typing import List, Literal, Optional
+from pydantic import BaseModel, ConfigDict, Field
+from datetime import date
+
+
+class AnalyticsQueryRequest(BaseModel):
+    model_config = ConfigDict(populate_by_name=True)
+
+    # Exposed as "date" like the other analytics endpoints
+    on_date: Optional[date] = Field(None, alias="date")
+    start_date: Optional[date] = None
+    end_date: Optional[date] = None
+    dimensions: List[str] = Field(default_factory=list)
+    measures: Optional[List[str]] = None
+    grouping_sets: Optional[List[List[str]]] = None
+    location_id: Optional[int] = None
+    department_id: Optional[int] = None
+
+
+class DashboardWidget(BaseModel):
+    model_config = ConfigDict(populate_by_name=True)
+
+    widget: Literal[
+        "summary", "late-frequency", "absent-trends", "by-location", "by-department"
+    ]
+    # Key of this widget in the response; defaults to the widget name
+    key: Optional[str] = None
+    on_date: Optional[date] = Field(None, alias="date")
+    start_date: Optional[date] = None
+    end_date: Optional[date] = None
+    days: int = Field(7, ge=1, le=365)
+    bucket: Literal["day", "week", "month"] = "day"
+    location_id: Optional[int] = None
+
+
+class DashboardRequest(BaseModel):
+    widgets: List[DashboardWidget] = Field(..., min_length=1, max_length=20)
@@ -1,4 +1,4 @@
-from typing import Optional
+from typing import Literal, Optional
 from pydantic import BaseModel, Field
 from datetime import datetime, date
 
@@ -21,6 +21,7 @@ class AttendanceResponse(BaseModel):
     status: str
     date: date
     distance_from_location_meters: Optional[float] = None
+    outside_geofence: bool = False
 
     class Config:
         from_attributes = True
@@ -37,6 +38,111 @@ class CheckOutResponse(AttendanceResponse):
 
 class AttendanceListResponse(BaseModel):
     items: list[AttendanceResponse]
-    total: int
+    total: Optional[int] = None
+    total_is_estimate: bool = False
     page: int
     page_size: int
+    next_cursor: Optional[str] = None
+
+
+class PunchEvent(BaseModel):
+    """
+    One queued check-in or check-out from an offline device.
+
+    ``signature`` is the hex HMAC-SHA256, keyed with the uploading device's
+    key, of ``"{idempotency_key}|{type}|{epoch_ms}|{latitude:.6f}|{longitude:.6f}"``
+    where epoch_ms is the timestamp in Unix milliseconds.
+    """
+
+    idempotency_key: str = Field(..., min_length=8, max_length=64)
+    type: Literal["check_in", "check_out"]
+    timestamp: datetime
+    latitude: float = Field(..., ge=-90, le=90)
+    longitude: float = Field(..., ge=-180, le=180)
+    signature: str = Field(..., min_length=64, max_length=64)
+
+
+class SyncRequest(BaseModel):
+    device_id: str = Field(..., min_length=1, max_length=64)
+    events: list[PunchEvent] = Field(..., min_length=1)
+
+
+class SyncEventResult(BaseModel):
+    idempotency_key: str
+    status: Literal["applied", "rejected"]
+    detail: Optional[str] = None
+    replayed: bool = False
+    attendance_id: Optional[int] = None
+    review_status: Optional[str] = None
+
+
+class SyncResponse(BaseModel):
+    results: list[SyncEventResult]
+    applied: int
+    rejected: int
+
+
+class DeviceEnrollRequest(BaseModel):
+    device_id: str = Field(..., min_length=1, max_length=64)
+    name: Optional[str] = Field(None, max_length=100)
+
+
+class DeviceKeyResponse(BaseModel):
+    """Returned once per enrollment or rotation; the previous key stops working."""
+
+    device_id: str
+    key_version: int
+    device_key: str
+
+
+class DeviceResponse(BaseModel):
+    id: int
+    employee_id: int
+    device_id: str
+    name: Optional[str] = None
+    key_version: int
+    status: str
+    created_at: Optional[datetime] = None
+    rotated_at: Optional[datetime] = None
+    revoked_at: Optional[datetime] = None
+    last_sync_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+
+class SyncReviewResponse(BaseModel):
+    """A back-dated check-in: claimed time next to the time it arrived."""
+
+    employee_id: int
+    idempotency_key: str
+    attendance_id: Optional[int] = None
+    device_id: Optional[str] = None
+    event_time: datetime
+    received_at: Optional[datetime] = None
+    review_status: Optional[str] = None
+
+    class Config:
+        from_attributes = True
+
+
+class SyncReviewRequest(BaseModel):
+    approve: bool
+
+
+class ExportJobRequest(BaseModel):
+    format: Literal["excel", "csv", "ndjson", "pdf"] = "excel"
+    start_date: Optional[date] = None
+    end_date: Optional[date] = None
+    location_id: Optional[int] = None
+    department_id: Optional[int] = None
+
+
+class ExportJobResponse(BaseModel):
+    job_id: str
+    format: str
+    status: str
+    progress: float
+    rows_written: int
+    total_rows: int
+    error: Optional[str] = None
@@ -1,7 +1,18 @@
-from typing import Optional
-from pydantic import BaseModel, Field
+from typing import List, Optional, Tuple
+from pydantic import BaseModel, Field, field_validator
 from datetime import datetime
 
+from app.services.geofence import PreparedPolygon, decode_polygon
+
+# (latitude, longitude) vertices of a polygon geofence
+PolygonPoints = List[Tuple[float, float]]
+
+
+def _check_polygon(points: Optional[PolygonPoints]) -> Optional[PolygonPoints]:
+    if points is not None:
+        PreparedPolygon(points)  # raises ValueError for degenerate shapes
+    return points
+
 
 class LocationBase(BaseModel):
     name: str = Field(..., min_length=1, max_length=255)
@@ -13,7 +24,9 @@ class LocationBase(BaseModel):
 
 
 class LocationCreate(LocationBase):
-    pass
+    polygon: Optional[PolygonPoints] = Field(None, max_length=1000)
+
+    _validate_polygon = field_validator("polygon")(_check_polygon)
 
 
 class LocationUpdate(BaseModel):
@@ -24,12 +37,36 @@ class LocationUpdate(BaseModel):
     longitude: Optional[float] = None
     allowed_radius_meters: Optional[int] = Field(None, ge=10, le=1000)
     is_active: Optional[bool] = None
+    # Send null to remove the polygon and fall back to the radius
+    polygon: Optional[PolygonPoints] = Field(None, max_length=1000)
+
+    _validate_polygon = field_validator("polygon")(_check_polygon)
 
 
 class LocationResponse(LocationBase):
     id: int
     is_active: bool
     created_at: datetime
+    polygon: Optional[PolygonPoints] = Field(
+        None, validation_alias="geofence_polygon"
+    )
+
+    @field_validator("polygon", mode="before")
+    @classmethod
+    def _decode_polygon(cls, value):
+        return decode_polygon(value) if isinstance(value, str) else value
 
     class Config:
         from_attributes = True
+
+
+class NearbyLocation(BaseModel):
+    id: int
+    name: str
+    city: Optional[str] = None
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+    allowed_radius_meters: int
+    has_polygon: bool = False
+    distance_meters: float
+    inside_geofence: bool
@@ -0,0 +1,419 @@
+"""
+Versioned response cache for the analytics endpoints.
+
+Entries are keyed by (endpoint, normalized params, supervisor scope) and
+tagged with the attendance data version they were computed from. Versions
+live in ``cache_versions`` as one ``attendance:<location_id>`` row per
+location, bumped in the same transaction as check-in, check-out and the
+daily materializer, so every worker sees the change. Writes also bump an
+``attendance_day:<date>`` version by the rows they changed, which the
+columnar store uses to find the days it must reload, and user edits bump
+a ``users`` version; exports use both to tell when their data changed.
+
+A lookup whose version moved (or whose entry outlived the TTL) returns the
+stale payload immediately and schedules one background recomputation per
+key; concurrent misses on the same key share a single computation.
+"""
+
+import asyncio
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import date
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+from sqlalchemy import String, cast, func, literal, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.cache_version import CacheVersion
+from app.models.location import Location
+
+logger = logging.getLogger(__name__)
+
+ATTENDANCE_VERSION_PREFIX = "attendance:"
+ATTENDANCE_DAY_VERSION_PREFIX = "attendance_day:"
+USERS_VERSION_NAME = "users"
+
+
+def _version_name(location_id: int) -> str:
+    return f"{ATTENDANCE_VERSION_PREFIX}{location_id}"
+
+
+def bump_attendance_version(db: Session, location_id: int) -> None:
+    """Bump one location's attendance version; call before committing."""
+    stmt = insert(CacheVersion).values(name=_version_name(location_id), version=1)
+    db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=["name"],
+            set_={"version": CacheVersion.version + 1},
+        )
+    )
+
+
+def bump_all_attendance_versions(db: Session) -> None:
+    """Bump the attendance version of every location; call before committing."""
+    stmt = insert(CacheVersion).from_select(
+        ["name", "version"],
+        select(
+            literal(ATTENDANCE_VERSION_PREFIX) + cast(Location.id, String),
+            literal(1),
+        ),
+    )
+    db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=["name"],
+            set_={"version": CacheVersion.version + 1},
+        )
+    )
+
+
+def attendance_version(db: Session, location_id: Optional[int] = None) -> int:
+    """
+    Current attendance version for one location, or for all of them.
+
+    Versions only ever increase, so the sum across locations changes
+    whenever any single location does.
+    """
+    query = db.query(func.coalesce(func.sum(CacheVersion.version), 0))
+    if location_id is not None:
+        query = query.filter(CacheVersion.name == _version_name(location_id))
+    else:
+        query = query.filter(CacheVersion.name.like(f"{ATTENDANCE_VERSION_PREFIX}%"))
+    return int(query.scalar())
+
+
+def attendance_day_version_name(attendance_date: date) -> str:
+    return f"{ATTENDANCE_DAY_VERSION_PREFIX}{attendance_date.isoformat()}"
+
+
+def bump_attendance_day_version(db: Session, attendance_date: date, rows: int) -> int:
+    """
+    Bump one day's attendance version by the number of rows a transaction
+    changed on that day; call before committing, after the location bumps.
+
+    Returns:
+        The day's new version, for the columnar store
+    """
+    stmt = insert(CacheVersion).values(
+        name=attendance_day_version_name(attendance_date), version=rows
+    )
+    return db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=["name"],
+            set_={"version": CacheVersion.version + stmt.excluded.version},
+        ).returning(CacheVersion.version)
+    ).scalar_one()
+
+
+def bump_users_version(db: Session) -> None:
+    """Bump the user data version; call before committing a user edit."""
+    stmt = insert(CacheVersion).values(name=USERS_VERSION_NAME, version=1)
+    db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=["name"],
+            set_={"version": CacheVersion.version + 1},
+        )
+    )
+
+
+def attendance_day_versions(db: Session, first_day: date) -> Dict[date, int]:
+    """Per-day attendance versions from first_day on."""
+    rows = db.query(CacheVersion.name, CacheVersion.version).filter(
+        CacheVersion.name.like(f"{ATTENDANCE_DAY_VERSION_PREFIX}%"),
+        # ISO dates sort chronologically
+        CacheVersion.name >= attendance_day_version_name(first_day),
+    )
+    return {
+        date.fromisoformat(name[len(ATTENDANCE_DAY_VERSION_PREFIX) :]): version
+        for name, version in rows
+    }
+
+
+def _normalize(value: Any) -> Any:
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, dict):
+        return tuple(sorted((k, _normalize(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_normalize(v) for v in value)
+    return value
+
+
+@dataclass
+class _Entry:
+    value: Any
+    version: int
+    computed_at: float
+    size: int
+
+
+class AnalyticsCache:
+    """Byte-capped LRU of analytics payloads with stale-while-revalidate."""
+
+    def __init__(
+        self,
+        max_bytes: int,
+        ttl_seconds: float,
+        max_stale_seconds: float,
+        refresh_workers: int,
+        session_factory: Callable[[], Session] = SessionLocal,
+    ):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.max_stale_seconds = max_stale_seconds
+        self.refresh_workers = refresh_workers
+        self._session_factory = session_factory
+        self._entries: "OrderedDict[Hashable, _Entry]" = OrderedDict()
+        self._inflight: Dict[Hashable, Future] = {}
+        self._refreshing: set = set()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.refresh_failures = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(endpoint: str, params: dict, scope: Optional[int]) -> Hashable:
+        return (endpoint, _normalize(params), scope)
+
+    def get_or_compute(
+        self,
+        key: Hashable,
+        version: int,
+        db: Session,
+        compute: Callable[[Session], Any],
+    ) -> Any:
+        """
+        Return the cached payload for key, computing it if needed.
+
+        Args:
+            key: From make_key
+            version: Current attendance version for the key's scope
+            db: Request session, used when the value is computed inline
+            compute: Builds the payload from a session
+        """
+        cached, value, owner, future = self._lookup(key, version, compute)
+        if cached:
+            return value
+        if not owner:
+            return future.result()
+
+        try:
+            value = compute(db)
+        except BaseException as exc:
+            future.set_exception(exc)
+            raise
+        else:
+            self._store(key, value, version)
+            future.set_result(value)
+            return value
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    async def get_or_compute_async(
+        self,
+        key: Hashable,
+        version: int,
+        db: AsyncSession,
+        compute: Callable[[Session], Any],
+    ) -> Any:
+        """
+        get_or_compute for async routes.
+
+        ``compute`` runs on the request's connection via ``run_sync``, and
+        callers waiting on another request's computation yield to the
+        event loop instead of blocking it.
+        """
+        cached, value, owner, future = self._lookup(key, version, compute)
+        if cached:
+            return value
+        if not owner:
+            return await asyncio.wrap_future(future)
+
+        try:
+            value = await db.run_sync(compute)
+        except BaseException as exc:
+            future.set_exception(exc)
+            raise
+        else:
+            self._store(key, value, version)
+            future.set_result(value)
+            return value
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def _lookup(
+        self, key: Hashable, version: int, compute: Callable[[Session], Any]
+    ) -> Tuple[bool, Any, bool, Optional[Future]]:
+        """
+        Resolve a key to (cached, value, owner, future).
+
+        On a miss, exactly one caller becomes the owner of the in-flight
+        future and must compute and resolve it.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                age = now - entry.computed_at
+                fresh = entry.version == version and age < self.ttl_seconds
+                if fresh or age < self.max_stale_seconds:
+                    self._entries.move_to_end(key)
+                    if fresh:
+                        self.hits += 1
+                    else:
+                        self.stale_hits += 1
+                        self._schedule_refresh(key, version, compute)
+                    return True, entry.value, False, None
+
+            self.misses += 1
+            future = self._inflight.get(key)
+            if future is not None:
+                return False, None, False, future
+            future = Future()
+            self._inflight[key] = future
+            return False, None, True, future
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.stale_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+                "refreshes": self.refreshes,
+                "refresh_failures": self.refresh_failures,
+                "evictions": self.evictions,
+                "hit_rate": round((self.hits + self.stale_hits) / lookups, 4)
+                if lookups
+                else 0.0,
+            }
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _schedule_refresh(
+        self, key: Hashable, version: int, compute: Callable[[Session], Any]
+    ) -> None:
+        # Called with the lock held
+        if key in self._refreshing or key in self._inflight:
+            return
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.refresh_workers,
+                thread_name_prefix="analytics-refresh",
+            )
+        self._refreshing.add(key)
+        self._executor.submit(self._refresh, key, version, compute)
+
+    def _refresh(
+        self, key: Hashable, version: int, compute: Callable[[Session], Any]
+    ) -> None:
+        db = self._session_factory()
+        try:
+            value = compute(db)
+            self._store(key, value, version)
+            with self._lock:
+                self.refreshes += 1
+        except Exception:
+            logger.exception("Analytics cache refresh failed for %s", key[0])
+            with self._lock:
+                self.refresh_failures += 1
+        finally:
+            db.close()
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def _store(self, key: Hashable, value: Any, version: int) -> None:
+        size = len(json.dumps(value, default=str))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous.size
+            self._entries[key] = _Entry(value, version, time.monotonic(), size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.size
+                self.evictions += 1
+
+
+analytics_cache = AnalyticsCache(
+    max_bytes=settings.ANALYTICS_CACHE_MAX_BYTES,
+    ttl_seconds=settings.ANALYTICS_CACHE_TTL_SECONDS,
+    max_stale_seconds=settings.ANALYTICS_CACHE_MAX_STALE_SECONDS,
+    refresh_workers=settings.ANALYTICS_CACHE_REFRESH_WORKERS,
+)
+
+
+def cached_response(
+    db: Session,
+    endpoint: str,
+    params: dict,
+    scope: Optional[int],
+    compute: Callable[[Session], Any],
+) -> Any:
+    """
+    Serve an analytics payload through the shared cache.
+
+    ``scope`` is the supervisor's location (None for admins); the version
+    is taken from it, or from a ``location_id`` param, or across all
+    locations otherwise.
+    """
+    if not settings.ANALYTICS_CACHE_ENABLED:
+        return compute(db)
+
+    version_location = scope if scope is not None else params.get("location_id")
+    return analytics_cache.get_or_compute(
+        analytics_cache.make_key(endpoint, params, scope),
+        attendance_version(db, version_location),
+        db,
+        compute,
+    )
+
+
+async def cached_response_async(
+    db: AsyncSession,
+    endpoint: str,
+    params: dict,
+    scope: Optional[int],
+    compute: Callable[[Session], Any],
+) -> Any:
+    """cached_response for routes on the async engine."""
+    if not settings.ANALYTICS_CACHE_ENABLED:
+        return await db.run_sync(compute)
+
+    version_location = scope if scope is not None else params.get("location_id")
+    version = await db.run_sync(
+        lambda session: attendance_version(session, version_location)
+    )
+    return await analytics_cache.get_or_compute_async(
+        analytics_cache.make_key(endpoint, params, scope), version, db, compute
+    )
@@ -0,0 +1,298 @@
+"""
+Grouped attendance aggregation.
+
+Compiles a set of dimensions and measures into a single ``GROUP BY`` (or
+``GROUPING SETS``) statement over active employees left-joined to their
+attendance, so a breakdown costs one round trip regardless of how many
+locations or departments it covers.
+"""
+
+from dataclasses import dataclass
+from datetime import date
+from decimal import Decimal
+from typing import List, Optional, Sequence
+
+from sqlalchemy import (
+    Date,
+    and_,
+    case,
+    cast,
+    distinct,
+    func,
+    literal_column,
+    select,
+    text,
+    tuple_,
+)
+from sqlalchemy.orm import Session, aliased
+
+from app.models.attendance import Attendance
+from app.models.department import Department
+from app.models.location import Location
+from app.models.user import User
+
+PRESENT_STATUSES = ("present", "checked_out")
+
+DIMENSIONS = ("location", "department", "city", "supervisor", "date")
+MEASURES = (
+    "headcount",
+    "present",
+    "late",
+    "checked_out",
+    "not_marked",
+    "avg_late_minutes",
+)
+
+
+class AnalyticsQueryError(ValueError):
+    """Raised for unknown dimensions or measures."""
+
+
+@dataclass
+class AggregationQuery:
+    start_date: date
+    end_date: date
+    dimensions: Sequence[str] = ()
+    measures: Sequence[str] = MEASURES
+    # Each inner list is one grouping set; None means GROUP BY dimensions
+    grouping_sets: Optional[List[List[str]]] = None
+    location_id: Optional[int] = None
+    department_id: Optional[int] = None
+    # Supervisors only see employees at their own location
+    scope_location_id: Optional[int] = None
+
+    def all_dimensions(self) -> List[str]:
+        dims = list(self.dimensions)
+        for grouping_set in self.grouping_sets or []:
+            dims.extend(d for d in grouping_set if d not in dims)
+        return dims
+
+
+def _validate(query: AggregationQuery) -> None:
+    for dim in query.all_dimensions():
+        if dim not in DIMENSIONS:
+            raise AnalyticsQueryError(f"Unknown dimension: {dim}")
+    for measure in query.measures:
+        if measure not in MEASURES:
+            raise AnalyticsQueryError(f"Unknown measure: {measure}")
+    if query.end_date < query.start_date:
+        raise AnalyticsQueryError("end_date must not be before start_date")
+
+
+def build_aggregation(query: AggregationQuery):
+    """Compile an AggregationQuery into a single SELECT statement."""
+    _validate(query)
+    dims = query.all_dimensions()
+    supervisor = aliased(User)
+
+    if "date" in dims:
+        days = (
+            func.generate_series(
+                query.start_date, query.end_date, literal_column("interval '1 day'")
+            )
+            .table_valued("day")
+            .render_derived()
+        )
+        day = cast(days.c.day, Date)
+        attendance_on = and_(Attendance.employee_id == User.id, Attendance.date == day)
+    else:
+        days = None
+        day = None
+        attendance_on = and_(
+            Attendance.employee_id == User.id,
+            Attendance.date >= query.start_date,
+            Attendance.date <= query.end_date,
+        )
+
+    dimension_columns = {
+        "location": [
+            User.location_id.label("location_id"),
+            Location.name.label("location_name"),
+        ],
+        "department": [
+            User.department_id.label("department_id"),
+            Department.name.label("department_name"),
+        ],
+        "city": [Location.city.label("city")],
+        "supervisor": [
+            User.supervisor_id.label("supervisor_id"),
+            supervisor.name.label("supervisor_name"),
+        ],
+        "date": [day.label("date")] if day is not None else [],
+    }
+
+    present = Attendance.status.in_(PRESENT_STATUSES)
+    measure_columns = {
+        "headcount": func.count(distinct(User.id)),
+        "present": func.count(Attendance.id).filter(present),
+        "late": func.count(Attendance.id).filter(
+            and_(present, Attendance.is_late.is_(True))
+        ),
+        "checked_out": func.count(Attendance.id).filter(
+            Attendance.status == "checked_out"
+        ),
+        "not_marked": func.count(Attendance.id).filter(
+            Attendance.status == "not_marked"
+        ),
+        "avg_late_minutes": func.avg(Attendance.late_by_minutes).filter(
+            and_(present, Attendance.is_late.is_(True))
+        ),
+    }
+
+    columns = []
+    for dim in dims:
+        columns.extend(dimension_columns[dim])
+    columns.extend(measure_columns[m].label(m) for m in query.measures)
+    if query.grouping_sets is not None and dims:
+        key_columns = [dimension_columns[dim][0] for dim in dims]
+        columns.append(func.grouping(*key_columns).label("_grouping"))
+
+    stmt = select(*columns).select_from(User)
+    if days is not None:
+        stmt = stmt.join(days, literal_column("true"))
+    stmt = stmt.outerjoin(Attendance, attendance_on)
+    if "location" in dims or "city" in dims:
+        stmt = stmt.outerjoin(Location, Location.id == User.location_id)
+    if "department" in dims:
+        stmt = stmt.outerjoin(Department, Department.id == User.department_id)
+    if "supervisor" in dims:
+        stmt = stmt.outerjoin(supervisor, supervisor.id == User.supervisor_id)
+
+    stmt = stmt.where(User.role == "Employee", User.status == "Active")
+    if query.scope_location_id is not None:
+        stmt = stmt.where(User.location_id == query.scope_location_id)
+    if query.location_id is not None:
+        stmt = stmt.where(User.location_id == query.location_id)
+    if query.department_id is not None:
+        stmt = stmt.where(User.department_id == query.department_id)
+
+    if query.grouping_sets is not None:
+        sets = []
+        for grouping_set in query.grouping_sets:
+            set_columns = [c for d in grouping_set for c in dimension_columns[d]]
+            sets.append(tuple_(*set_columns) if set_columns else text("()"))
+        stmt = stmt.group_by(func.grouping_sets(*sets))
+    elif dims:
+        stmt = stmt.group_by(*[c for d in dims for c in dimension_columns[d]])
+
+    return stmt
+
+
+def run_aggregation(db: Session, query: AggregationQuery) -> List[dict]:
+    """Execute an aggregation and return one dict per group."""
+    dims = query.all_dimensions()
+    results = []
+    for row in db.execute(build_aggregation(query)).mappings():
+        item = {}
+        for key, value in row.items():
+            if isinstance(value, Decimal):
+                value = round(float(value), 1)
+            elif isinstance(value, date):
+                value = value.isoformat()
+            item[key] = value
+        if "avg_late_minutes" in item and item["avg_late_minutes"] is None:
+            item["avg_late_minutes"] = 0.0
+
+        if query.grouping_sets is not None:
+            # GROUPING() sets bit (n - 1 - i) when dimension i is rolled up
+            mask = item.pop("_grouping", 0)
+            item["grouping_set"] = [
+                dim
+                for i, dim in enumerate(dims)
+                if not mask & (1 << (len(dims) - 1 - i))
+            ]
+        results.append(item)
+    return results
+
+
+TREND_BUCKETS = ("day", "week", "month")
+
+
+def build_trends(
+    start_date: date,
+    end_date: date,
+    today: date,
+    bucket: str = "day",
+    location_id: Optional[int] = None,
+):
+    """
+    Present/absent/late per day (or per week/month) in one statement.
+
+    Attendance is aggregated per day first and left-joined onto a
+    ``generate_series`` calendar, so days without any rows still appear.
+    Absent is the active headcount minus present; for today, employees who
+    have not marked yet are not counted as absent.
+    """
+    if bucket not in TREND_BUCKETS:
+        raise AnalyticsQueryError(f"Unknown bucket: {bucket}")
+
+    employee_filters = [User.role == "Employee", User.status == "Active"]
+    if location_id is not None:
+        employee_filters.append(User.location_id == location_id)
+
+    headcount = (
+        select(func.count(User.id)).where(*employee_filters).scalar_subquery()
+    )
+
+    present = Attendance.status.in_(PRESENT_STATUSES)
+    daily = (
+        select(
+            Attendance.date.label("date"),
+            func.count(Attendance.id).filter(present).label("present"),
+            func.count(Attendance.id)
+            .filter(and_(present, Attendance.is_late.is_(True)))
+            .label("late"),
+            func.count(Attendance.id)
+            .filter(Attendance.status == "not_marked")
+            .label("not_marked"),
+        )
+        .join(User, User.id == Attendance.employee_id)
+        .where(
+            Attendance.date >= start_date,
+            Attendance.date <= end_date,
+            *employee_filters,
+        )
+        .group_by(Attendance.date)
+        .subquery()
+    )
+
+    days = (
+        func.generate_series(start_date, end_date, literal_column("interval '1 day'"))
+        .table_valued("day")
+        .render_derived()
+    )
+    day = cast(days.c.day, Date)
+    day_present = func.coalesce(daily.c.present, 0)
+    pending = case(
+        (day == today, func.coalesce(daily.c.not_marked, 0)),
+        else_=0,
+    )
+    bucket_start = cast(func.date_trunc(bucket, days.c.day), Date)
+
+    return (
+        select(
+            bucket_start.label("date"),
+            func.sum(day_present).label("present"),
+            func.sum(func.greatest(headcount - day_present - pending, 0)).label(
+                "absent"
+            ),
+            func.sum(func.coalesce(daily.c.late, 0)).label("late"),
+        )
+        .select_from(days)
+        .outerjoin(daily, daily.c.date == day)
+        .group_by(bucket_start)
+        .order_by(bucket_start)
+    )
+
+
+def run_trends(db: Session, *args, **kwargs) -> List[dict]:
+    """Execute build_trends and return one dict per bucket."""
+    return [
+        {
+            "date": row.date.isoformat(),
+            "present": int(row.present),
+            "absent": int(row.absent),
+            "late": int(row.late),
+        }
+        for row in db.execute(build_trends(*args, **kwargs))
+    ]
@@ -1,27 +1,34 @@
+from collections import Counter, defaultdict
 from datetime import date, datetime, time, timedelta, timezone
-from typing import List, Optional, Tuple
-
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import (
+    Date,
+    Float,
+    Integer,
+    Row,
+    String,
+    false,
+    func,
+    literal,
+    literal_column,
+    select,
+    update,
+)
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.orm import Session
 
 from app.models.attendance import Attendance
-from app.models.location import Location
-from app.models.shift import ShiftConfig
 from app.models.user import User
-from app.services.geo import is_within_radius
-
-
-def check_already_checked_in(
-    employee_id: int, attendance_date: date, db: Session
-) -> bool:
-    """Check if employee has already checked in today."""
-    attendance = (
-        db.query(Attendance)
-        .filter(
-            Attendance.employee_id == employee_id, Attendance.date == attendance_date
-        )
-        .first()
-    )
-    return attendance is not None
+from app.services import rollup
+from app.services.analytics_cache import (
+    bump_all_attendance_versions,
+    bump_attendance_day_version,
+    bump_attendance_version,
+)
+from app.services.columnar import columnar_store
+from app.services.geofence import check_geofence
+from app.services.reference_data import LocationConfig, ShiftWindow, reference_data
 
 
 def check_already_checked_out(
@@ -74,6 +81,208 @@ def calculate_late(
     return False, 0
 
 
+# Columns a check-in writes over a not_marked placeholder
+CHECK_IN_COLUMNS = (
+    "location_id",
+    "check_in_time",
+    "check_in_latitude",
+    "check_in_longitude",
+    "distance_from_location_meters",
+    "is_late",
+    "late_by_minutes",
+    "status",
+)
+
+
+def check_in_upsert(values):
+    """
+    INSERT for one or more check-in rows that upgrades ``not_marked``
+    placeholders and skips days already checked in.
+
+    Returns every stored column plus ``created`` (true for new rows).
+    """
+    stmt = insert(Attendance).values(values)
+    return stmt.on_conflict_do_update(
+        index_elements=["employee_id", "date"],
+        set_={column: stmt.excluded[column] for column in CHECK_IN_COLUMNS},
+        where=Attendance.status == "not_marked",
+    ).returning(
+        *Attendance.__table__.columns,
+        # xmax is only zero for a freshly inserted tuple
+        literal_column("(xmax = 0)").label("created"),
+    )
+
+
+def record_check_in(
+    db: Session,
+    employee_id: int,
+    location_id: int,
+    department_id: Optional[int],
+    attendance_date: date,
+    check_in_time: datetime,
+    latitude: float,
+    longitude: float,
+    distance_meters: float,
+    is_late: bool,
+    late_by_minutes: int,
+    placeholder_location_id: Optional[int] = None,
+) -> Optional[Row]:
+    """
+    Atomically record a check-in in one round trip.
+
+    Inserts the day's row, or upgrades an existing ``not_marked`` placeholder.
+    Duplicate detection comes from the (employee_id, date) constraint, so
+    concurrent retries cannot create a second row. The daily rollup is
+    updated in the same transaction.
+
+    ``placeholder_location_id`` is where the day's placeholder was
+    materialized (the employee's assigned location) when the check-in is
+    at a different site, so the rollup moves the row between locations.
+
+    Returns:
+        The stored attendance row, or None if already checked in that day
+    """
+    stmt = check_in_upsert(
+        dict(
+            employee_id=employee_id,
+            location_id=location_id,
+            date=attendance_date,
+            check_in_time=check_in_time,
+            check_in_latitude=latitude,
+            check_in_longitude=longitude,
+            distance_from_location_meters=distance_meters,
+            is_late=is_late,
+            late_by_minutes=late_by_minutes,
+            status="present",
+        )
+    )
+
+    # A plain Row rather than an ORM instance, so commit does not expire it
+    attendance = db.execute(stmt).first()
+    if attendance is None:
+        db.rollback()
+        return None
+
+    apply_check_in_rollup(db, attendance, department_id, placeholder_location_id)
+    day_version = bump_attendance_day_version(db, attendance.date, 1)
+    db.commit()
+    columnar_store.apply_check_in(attendance, department_id, day_version)
+    return attendance
+
+
+def check_in_rollup_deltas(
+    attendance: Row,
+    department_id: Optional[int],
+    placeholder_location_id: Optional[int] = None,
+) -> List[Tuple[date, int, Optional[int], dict]]:
+    """
+    Rollup changes for a stored check-in row, as (date, location, department,
+    deltas) tuples.
+
+    ``attendance`` is a row returned by the check-in upsert (with its
+    ``created`` column).
+    """
+    changes = []
+    moved = (
+        not attendance.created
+        and placeholder_location_id is not None
+        and placeholder_location_id != attendance.location_id
+    )
+    if moved:
+        changes.append(
+            (
+                attendance.date,
+                placeholder_location_id,
+                department_id,
+                {"headcount": -1, "not_marked": -1},
+            )
+        )
+    changes.append(
+        (
+            attendance.date,
+            attendance.location_id,
+            department_id,
+            rollup.check_in_delta(
+                attendance.created or moved,
+                attendance.is_late,
+                attendance.late_by_minutes,
+            ),
+        )
+    )
+    return changes
+
+
+def apply_rollup_changes(
+    db: Session, changes: Iterable[Tuple[date, int, Optional[int], dict]]
+) -> None:
+    """
+    Apply (date, location, department, deltas) rollup changes and bump the
+    touched locations' versions.
+
+    Every attendance writer goes through here so rows are always locked in
+    the same order: rollup rows by (date, location, department), then
+    location versions by id. Writers that lock them in different orders
+    could otherwise deadlock each other.
+    """
+    merged: Dict[tuple, Counter] = defaultdict(Counter)
+    for day, location_id, department_id, deltas in changes:
+        merged[(day, location_id, department_id or 0)].update(deltas)
+    for (day, location_id, department_id), deltas in sorted(merged.items()):
+        rollup.apply_delta(db, day, location_id, department_id, **deltas)
+    for location_id in sorted({key[1] for key in merged}):
+        bump_attendance_version(db, location_id)
+
+
+def apply_check_in_rollup(
+    db: Session,
+    attendance: Row,
+    department_id: Optional[int],
+    placeholder_location_id: Optional[int] = None,
+) -> None:
+    """Update the rollup and data versions for a stored check-in row."""
+    apply_rollup_changes(
+        db,
+        check_in_rollup_deltas(attendance, department_id, placeholder_location_id),
+    )
+
+
+def record_check_out(
+    db: Session,
+    attendance_id: int,
+    department_id: Optional[int],
+    check_out_time: datetime,
+) -> Optional[Row]:
+    """
+    Atomically check out a checked-in attendance row.
+
+    The UPDATE only matches while the row is still ``present``, so of two
+    concurrent check-outs (a double tap, or one racing an offline sync)
+    exactly one gets the row back and updates the rollup.
+
+    Returns:
+        The stored attendance row, or None if it was not checked in
+    """
+    attendance = db.execute(
+        update(Attendance)
+        .where(Attendance.id == attendance_id, Attendance.status == "present")
+        .values(check_out_time=check_out_time, status="checked_out")
+        .returning(*Attendance.__table__.columns)
+        .execution_options(synchronize_session=False)
+    ).first()
+    if attendance is None:
+        db.rollback()
+        return None
+
+    apply_rollup_changes(
+        db,
+        [(attendance.date, attendance.location_id, department_id, {"checked_out": 1})],
+    )
+    day_version = bump_attendance_day_version(db, attendance.date, 1)
+    db.commit()
+    columnar_store.apply_check_out(attendance, department_id, day_version)
+    return attendance
+
+
 def get_todays_attendance(employee_id: int, db: Session) -> Optional[Attendance]:
     """Get today's attendance record for an employee."""
     today = datetime.now(timezone.utc).date()
@@ -101,79 +310,125 @@ def get_attendance_history(
 
 
 def validate_location(
-    employee_lat: float, employee_lon: float, location: Location, db: Session
+    employee_lat: float,
+    employee_lon: float,
+    location: LocationConfig,
+    db: Optional[Session] = None,
 ) -> Tuple[bool, float]:
     """
     Validate if employee is at the assigned location.
 
-    If location has no lat/lng set, skip validation and allow check-in.
-    If location has lat/lng, validate using geo service.
+    Locations with a polygon fence are checked against the polygon; otherwise
+    the circle around lat/lng is used. If location has neither, skip
+    validation and allow check-in.
 
     Args:
         employee_lat: Employee's latitude
         employee_lon: Employee's longitude
         location: The location to validate against
-        db: Database session
+        db: Unused; the location comes from the reference data cache
 
     Returns:
         Tuple of (is_valid, distance_meters)
     """
-    if location.latitude is None or location.longitude is None:
+    if location.polygon is None and (
+        location.latitude is None or location.longitude is None
+    ):
         return True, 0.0
 
-    is_within, distance = is_within_radius(
-        employee_lat,
-        employee_lon,
-        location.latitude,
-        location.longitude,
-        location.allowed_radius_meters,
-    )
+    return check_geofence(employee_lat, employee_lon, location)
 
-    return is_within, distance
 
+def resolve_site(
+    employee_lat: float, employee_lon: float, db: Session
+) -> Optional[Tuple[LocationConfig, float]]:
+    """
+    Find the active site whose geofence contains a GPS fix.
 
-def get_shift_config(location_id: int, db: Session) -> Optional[ShiftConfig]:
-    """Get shift configuration for a location."""
-    return db.query(ShiftConfig).filter(ShiftConfig.location_id == location_id).first()
+    Returns:
+        Tuple of (location, distance_meters) for the closest match, or None
+    """
+    matches = reference_data.site_index(db).containing(employee_lat, employee_lon)
+    return matches[0] if matches else None
 
 
-def ensure_daily_attendance(db: Session) -> None:
-    """Create attendance records for all active employees if not exists for today."""
-    today = date.today()
+def get_location_config(location_id: int, db: Session) -> Optional[LocationConfig]:
+    """Get cached geofence configuration for a location."""
+    return reference_data.get_location(location_id, db)
 
-    existing_ids = {
-        a.employee_id
-        for a in db.query(Attendance).filter(Attendance.date == today).all()
-    }
 
-    employees = (
-        db.query(User).filter(User.role == "Employee", User.status == "Active").all()
-    )
+def get_shift_config(location_id: int, db: Session) -> Optional[ShiftWindow]:
+    """Get cached shift configuration for a location."""
+    return reference_data.get_shift(location_id, db)
 
-    new_records = []
-    for employee in employees:
-        if employee.id in existing_ids:
-            continue
-        if not employee.location_id:
-            continue
-
-        new_records.append(
-            Attendance(
-                employee_id=employee.id,
-                location_id=employee.location_id,
-                check_in_time=None,
-                check_out_time=None,
-                check_in_latitude=0.0,
-                check_in_longitude=0.0,
-                distance_from_location_meters=None,
-                is_late=False,
-                late_by_minutes=0,
-                status="not_marked",
-                date=today,
-            )
-        )
 
-    if new_records:
-        db.bulk_save_objects(new_records)
-        db.commit()
-        print(f"Created {len(new_records)} attendance records for {today}")
+def materialize_daily_attendance(
+    db: Session, attendance_date: Optional[date] = None
+) -> int:
+    """
+    Create ``not_marked`` placeholder rows for every active employee.
+
+    Runs as a single set-based ``INSERT ... SELECT ... ON CONFLICT DO NOTHING``
+    against the (employee_id, date) constraint, so it is safe to run
+    repeatedly and concurrently. The inserted rows are added to the daily
+    rollup by the same statement.
+
+    Args:
+        db: Database session
+        attendance_date: Day to materialize (defaults to today, UTC)
+
+    Returns:
+        Number of rows inserted
+    """
+    if attendance_date is None:
+        attendance_date = datetime.now(timezone.utc).date()
+
+    employees = select(
+        User.id,
+        User.location_id,
+        literal(0.0, Float),
+        literal(0.0, Float),
+        false(),
+        literal(0, Integer),
+        literal("not_marked", String),
+        literal(attendance_date, Date),
+        func.now(),
+    ).where(
+        User.role == "Employee",
+        User.status == "Active",
+        User.location_id.isnot(None),
+    )
+    stmt = insert(Attendance).from_select(
+        [
+            "employee_id",
+            "location_id",
+            "check_in_latitude",
+            "check_in_longitude",
+            "is_late",
+            "late_by_minutes",
+            "status",
+            "date",
+            "created_at",
+        ],
+        employees,
+        include_defaults=False,
+    ).on_conflict_do_nothing(index_elements=["employee_id", "date"])
+
+    inserted = stmt.returning(
+        Attendance.employee_id,
+        Attendance.location_id,
+        Attendance.date,
+        Attendance.status,
+        Attendance.is_late,
+        Attendance.late_by_minutes,
+    ).cte("inserted")
+    rolled_up = rollup.accumulate_from(inserted).cte("rolled_up")
+
+    created = db.execute(
+        select(func.count()).select_from(inserted).add_cte(rolled_up)
+    ).scalar()
+    if created:
+        bump_all_attendance_versions(db)
+        bump_attendance_day_version(db, attendance_date, created)
+    db.commit()
+    return created
@@ -0,0 +1,518 @@
+"""
+Offline punch sync.
+
+Devices at sites with poor connectivity queue check-ins and check-outs and
+upload them in one batch when they reconnect. Each device is enrolled while
+online (``POST /attendance/devices``) and gets its own key, derived from
+ATTENDANCE_SYNC_SIGNING_KEY, the device and a rotation counter, so it can be
+rotated or revoked without touching other devices. Every event carries an
+idempotency key and an HMAC signature made with that key, and is validated
+against its own timestamp: geofence, lateness against the shift start, and
+ordering against the other punches of that day.
+
+The claimed time is stored next to the time the server received the punch.
+A check-in received more than ATTENDANCE_SYNC_TRUSTED_DELAY_SECONDS after
+its claimed time only counts as on time up to that delay, and is held for
+supervisor review, so back-dating a punch cannot avoid being marked late.
+
+A batch is applied in one transaction: one multi-row check-in upsert, one
+UPDATE ... FROM unnest(...) for check-outs, the rollup deltas, and the
+outcome of every event in ``attendance_sync_events``. Re-uploading a key
+returns the stored outcome instead of applying the punch again; rejected
+punches keep their rejection, so a device retries them under a new key.
+"""
+
+import hashlib
+import hmac
+from collections import Counter
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import ARRAY, DateTime, Integer, Row, cast, func, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.attendance import Attendance
+from app.models.attendance_sync import AttendanceDevice, AttendanceSyncEvent
+from app.models.user import User
+from app.services import attendance as attendance_service
+from app.services.analytics_cache import bump_attendance_day_version
+from app.services.columnar import columnar_store
+
+
+def sync_enabled() -> bool:
+    """Sync needs its own secret, never the JWT one."""
+    key = settings.ATTENDANCE_SYNC_SIGNING_KEY
+    return bool(key) and key != settings.JWT_SECRET_KEY
+
+
+def device_key(device: AttendanceDevice) -> str:
+    """The key an enrolled device signs punches with."""
+    return hmac.new(
+        settings.ATTENDANCE_SYNC_SIGNING_KEY.encode(),
+        (
+            f"attendance-device:{device.employee_id}:{device.device_id}"
+            f":{device.key_version}"
+        ).encode(),
+        hashlib.sha256,
+    ).hexdigest()
+
+
+def enroll_device(
+    db: Session, employee_id: int, device_id: str, name: Optional[str] = None
+) -> Tuple[Optional[AttendanceDevice], Optional[str]]:
+    """
+    Enroll a device, or rotate its key if it is already enrolled.
+
+    Returns:
+        Tuple of (device, error); revoked devices cannot be re-enrolled
+    """
+    device = db.scalar(
+        select(AttendanceDevice)
+        .where(
+            AttendanceDevice.employee_id == employee_id,
+            AttendanceDevice.device_id == device_id,
+        )
+        .with_for_update()
+    )
+    if device is None:
+        device = AttendanceDevice(
+            employee_id=employee_id, device_id=device_id, name=name, key_version=1
+        )
+        db.add(device)
+    elif device.status == "revoked":
+        return None, "Device has been revoked"
+    else:
+        device.key_version += 1
+        device.rotated_at = datetime.now(timezone.utc)
+        if name:
+            device.name = name
+    db.commit()
+    db.refresh(device)
+    return device, None
+
+
+def revoke_device(db: Session, device: AttendanceDevice, revoked_by: int) -> None:
+    device.status = "revoked"
+    device.revoked_at = datetime.now(timezone.utc)
+    device.revoked_by = revoked_by
+    db.commit()
+
+
+def get_active_device(
+    db: Session, employee_id: int, device_id: str
+) -> Tuple[Optional[AttendanceDevice], Optional[str]]:
+    device = db.scalar(
+        select(AttendanceDevice).where(
+            AttendanceDevice.employee_id == employee_id,
+            AttendanceDevice.device_id == device_id,
+        )
+    )
+    if device is None:
+        return None, "Device is not enrolled"
+    if device.status != "active":
+        return None, "Device has been revoked"
+    return device, None
+
+
+def _as_utc(value: datetime) -> datetime:
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def signing_payload(event) -> str:
+    epoch_ms = int(round(_as_utc(event.timestamp).timestamp() * 1000))
+    return (
+        f"{event.idempotency_key}|{event.type}|{epoch_ms}"
+        f"|{event.latitude:.6f}|{event.longitude:.6f}"
+    )
+
+
+def verify_signature(device: AttendanceDevice, event) -> bool:
+    expected = hmac.new(
+        device_key(device).encode(),
+        signing_payload(event).encode(),
+        hashlib.sha256,
+    ).hexdigest()
+    return hmac.compare_digest(expected, event.signature.lower())
+
+
+@dataclass
+class SyncOutcome:
+    idempotency_key: str
+    status: str = "rejected"
+    detail: Optional[str] = None
+    attendance_id: Optional[int] = None
+    review_status: Optional[str] = None
+    replayed: bool = False
+
+
+@dataclass
+class _Punch:
+    event: object
+    outcome: SyncOutcome
+    timestamp: datetime
+    # Received too long after its claimed time to trust for lateness
+    back_dated: bool = False
+
+
+def lateness_time(claimed: datetime, received_at: datetime) -> datetime:
+    """
+    The check-in time lateness is judged by.
+
+    A punch received within the trusted delay counts at its claimed time.
+    Later ones count no earlier than the trusted delay before receipt,
+    capped at the end of the claimed day.
+    """
+    trusted = received_at - timedelta(
+        seconds=settings.ATTENDANCE_SYNC_TRUSTED_DELAY_SECONDS
+    )
+    if claimed >= trusted:
+        return claimed
+    end_of_day = datetime.combine(claimed.date(), time.max, tzinfo=timezone.utc)
+    return min(trusted, end_of_day)
+
+
+def _plan_check_in(
+    db: Session,
+    punch: _Punch,
+    employee_id: int,
+    location_id: Optional[int],
+    received_at: datetime,
+) -> Tuple[Optional[dict], Optional[str]]:
+    """Validate a check-in at its own time; returns (row values, error)."""
+    event = punch.event
+    if not location_id:
+        return None, "Not assigned to any work location"
+    location = attendance_service.get_location_config(location_id, db)
+    if not location:
+        return None, "Assigned location not found"
+
+    is_valid, distance = attendance_service.validate_location(
+        event.latitude, event.longitude, location
+    )
+    if not is_valid and settings.CHECK_IN_ANY_SITE:
+        site = attendance_service.resolve_site(event.latitude, event.longitude, db)
+        if site is not None:
+            location, distance = site
+            is_valid = True
+    if not is_valid:
+        return None, f"Outside the work location geofence ({int(distance)}m)"
+
+    judged_at = lateness_time(punch.timestamp, received_at)
+    punch.back_dated = judged_at != punch.timestamp
+    is_late, late_by_minutes = False, 0
+    shift = attendance_service.get_shift_config(location.id, db)
+    if shift:
+        is_late, late_by_minutes = attendance_service.calculate_late(
+            judged_at, shift.start_time, shift.grace_period_minutes
+        )
+
+    return (
+        dict(
+            employee_id=employee_id,
+            location_id=location.id,
+            date=punch.timestamp.date(),
+            check_in_time=punch.timestamp,
+            check_in_latitude=event.latitude,
+            check_in_longitude=event.longitude,
+            distance_from_location_meters=distance,
+            is_late=is_late,
+            late_by_minutes=late_by_minutes,
+            status="present",
+        ),
+        None,
+    )
+
+
+def sync_punches(
+    db: Session,
+    device: AttendanceDevice,
+    location_id: Optional[int],
+    department_id: Optional[int],
+    events: Sequence,
+    now: Optional[datetime] = None,
+) -> Tuple[List[SyncOutcome], List[Tuple[str, Row]]]:
+    """
+    Validate and apply one employee's batch of offline punches, uploaded by
+    one of their active enrolled devices.
+
+    Returns:
+        Tuple of (outcome per event in input order, written (type, row)
+        pairs for live updates)
+    """
+    now = now or datetime.now(timezone.utc)
+    employee_id = device.employee_id
+    outcomes: Dict[str, SyncOutcome] = {}
+    punches: List[_Punch] = []
+    for event in events:
+        # A key repeated within the batch shares the first event's outcome
+        if event.idempotency_key not in outcomes:
+            outcome = SyncOutcome(event.idempotency_key)
+            outcomes[event.idempotency_key] = outcome
+            punches.append(_Punch(event, outcome, _as_utc(event.timestamp)))
+
+    for stored in db.scalars(
+        select(AttendanceSyncEvent).where(
+            AttendanceSyncEvent.employee_id == employee_id,
+            AttendanceSyncEvent.idempotency_key.in_(list(outcomes)),
+        )
+    ):
+        outcome = outcomes[stored.idempotency_key]
+        outcome.status = stored.status
+        outcome.detail = stored.detail
+        outcome.attendance_id = stored.attendance_id
+        outcome.review_status = stored.review_status
+        outcome.replayed = True
+    punches = sorted(
+        (punch for punch in punches if not punch.outcome.replayed),
+        key=lambda punch: punch.timestamp,
+    )
+
+    earliest = now - timedelta(hours=settings.ATTENDANCE_SYNC_MAX_AGE_HOURS)
+    latest = now + timedelta(seconds=settings.ATTENDANCE_SYNC_CLOCK_SKEW_SECONDS)
+    valid: List[_Punch] = []
+    for punch in punches:
+        if not verify_signature(device, punch.event):
+            punch.outcome.detail = "Invalid signature"
+        elif punch.timestamp > latest:
+            punch.outcome.detail = "Timestamp is in the future"
+        elif punch.timestamp < earliest:
+            punch.outcome.detail = "Punch is too old to sync"
+        else:
+            valid.append(punch)
+
+    # Replay each day's punches in time order over its stored state
+    days = {punch.timestamp.date() for punch in valid}
+    existing = {}
+    if days:
+        existing = {
+            row.date: row
+            for row in db.execute(
+                select(
+                    Attendance.id,
+                    Attendance.date,
+                    Attendance.status,
+                    Attendance.check_in_time,
+                ).where(
+                    Attendance.employee_id == employee_id,
+                    Attendance.date.in_(days),
+                )
+            )
+        }
+    state: Dict[date, Tuple[str, Optional[datetime]]] = {
+        day: (row.status, row.check_in_time) for day, row in existing.items()
+    }
+    check_ins: Dict[date, Tuple[_Punch, dict]] = {}
+    check_outs: Dict[date, _Punch] = {}
+    for punch in valid:
+        day = punch.timestamp.date()
+        status, checked_in_at = state.get(day, ("not_marked", None))
+        if punch.event.type == "check_in":
+            if status != "not_marked":
+                punch.outcome.detail = "Already checked in"
+                continue
+            values, error = _plan_check_in(
+                db, punch, employee_id, location_id, received_at=now
+            )
+            if error:
+                punch.outcome.detail = error
+                continue
+            check_ins[day] = (punch, values)
+            state[day] = ("present", punch.timestamp)
+        elif status == "not_marked":
+            punch.outcome.detail = "Not checked in"
+        elif status != "present":
+            punch.outcome.detail = "Already checked out"
+        elif checked_in_at is not None and punch.timestamp < checked_in_at:
+            punch.outcome.detail = "Check-out is before check-in"
+        else:
+            check_outs[day] = punch
+            state[day] = ("checked_out", checked_in_at)
+
+    written: List[Tuple[str, Row]] = []
+    changes: List[Tuple[date, int, Optional[int], dict]] = []
+    attendance_ids = {day: row.id for day, row in existing.items()}
+
+    if check_ins:
+        stored_rows = db.execute(
+            attendance_service.check_in_upsert(
+                [values for _, values in check_ins.values()]
+            )
+        ).all()
+        by_day = {row.date: row for row in stored_rows}
+        for day, (punch, _) in check_ins.items():
+            row = by_day.get(day)
+            if row is None:
+                # A concurrent check-in got there first
+                punch.outcome.detail = "Already checked in"
+                if day in check_outs:
+                    check_outs.pop(day).outcome.detail = (
+                        "Check-in conflicted with another request"
+                    )
+                continue
+            punch.outcome.status = "applied"
+            punch.outcome.attendance_id = row.id
+            if punch.back_dated:
+                punch.outcome.review_status = "pending"
+                punch.outcome.detail = (
+                    "Received late; lateness is pending supervisor review"
+                )
+            attendance_ids[day] = row.id
+            changes.extend(
+                attendance_service.check_in_rollup_deltas(
+                    row, department_id, placeholder_location_id=location_id
+                )
+            )
+            written.append(("check_in", row))
+
+    if check_outs:
+        punches_by_id = {
+            attendance_ids[day]: punch for day, punch in check_outs.items()
+        }
+        values = (
+            func.unnest(
+                cast(list(punches_by_id), ARRAY(Integer)),
+                cast(
+                    [punch.timestamp for punch in punches_by_id.values()],
+                    ARRAY(DateTime(timezone=True)),
+                ),
+            )
+            .table_valued("id", "check_out_time")
+            .render_derived(name="punches")
+        )
+        stored_rows = db.execute(
+            update(Attendance)
+            .where(Attendance.id == values.c.id, Attendance.status == "present")
+            .values(check_out_time=values.c.check_out_time, status="checked_out")
+            .returning(*Attendance.__table__.columns)
+            .execution_options(synchronize_session=False)
+        ).all()
+        for row in stored_rows:
+            punch = punches_by_id.pop(row.id)
+            punch.outcome.status = "applied"
+            punch.outcome.attendance_id = row.id
+            changes.append(
+                (row.date, row.location_id, department_id, {"checked_out": 1})
+            )
+            written.append(("check_out", row))
+        for punch in punches_by_id.values():
+            punch.outcome.detail = "Not checked in"
+
+    attendance_service.apply_rollup_changes(db, changes)
+
+    if punches:
+        db.execute(
+            insert(AttendanceSyncEvent)
+            .values(
+                [
+                    dict(
+                        employee_id=employee_id,
+                        idempotency_key=punch.outcome.idempotency_key,
+                        event_type=punch.event.type,
+                        event_time=punch.timestamp,
+                        received_at=now,
+                        device_id=device.device_id,
+                        status=punch.outcome.status,
+                        detail=punch.outcome.detail,
+                        attendance_id=punch.outcome.attendance_id,
+                        review_status=punch.outcome.review_status,
+                    )
+                    for punch in punches
+                ]
+            )
+            .on_conflict_do_nothing()
+        )
+    day_versions = {
+        day: bump_attendance_day_version(db, day, rows)
+        for day, rows in sorted(Counter(row.date for _, row in written).items())
+    }
+    db.execute(
+        update(AttendanceDevice)
+        .where(AttendanceDevice.id == device.id)
+        .values(last_sync_at=now)
+    )
+    db.commit()
+
+    columnar_store.apply_committed(
+        [(row, department_id) for _, row in written], day_versions
+    )
+
+    results = [outcomes[event.idempotency_key] for event in events]
+    return results, written
+
+
+def review_check_in(
+    db: Session, event: AttendanceSyncEvent, approve: bool, reviewer_id: int
+) -> Optional[Row]:
+    """
+    Settle a back-dated check-in held for review.
+
+    Approving re-judges lateness at the claimed time; rejecting keeps the
+    lateness it was recorded with.
+
+    Returns:
+        The updated attendance row when approval changed it
+    """
+    row = None
+    day_version = None
+    department_id = None
+    if approve and event.attendance_id is not None:
+        stored = db.execute(
+            select(Attendance, User.department_id)
+            .join(User, User.id == Attendance.employee_id)
+            .where(
+                Attendance.id == event.attendance_id,
+                Attendance.check_in_time == event.event_time,
+            )
+            .with_for_update(of=Attendance)
+        ).first()
+        if stored is not None:
+            attendance, department_id = stored
+            is_late, late_by_minutes = False, 0
+            shift = attendance_service.get_shift_config(attendance.location_id, db)
+            if shift:
+                is_late, late_by_minutes = attendance_service.calculate_late(
+                    attendance.check_in_time,
+                    shift.start_time,
+                    shift.grace_period_minutes,
+                )
+            old_minutes = attendance.late_by_minutes if attendance.is_late else 0
+            new_minutes = late_by_minutes if is_late else 0
+            if is_late != attendance.is_late or new_minutes != old_minutes:
+                attendance_service.apply_rollup_changes(
+                    db,
+                    [
+                        (
+                            attendance.date,
+                            attendance.location_id,
+                            department_id,
+                            {
+                                "late": int(is_late) - int(attendance.is_late),
+                                "late_minutes": new_minutes - old_minutes,
+                            },
+                        )
+                    ],
+                )
+                day_version = bump_attendance_day_version(db, attendance.date, 1)
+                row = db.execute(
+                    update(Attendance)
+                    .where(Attendance.id == attendance.id)
+                    .values(is_late=is_late, late_by_minutes=late_by_minutes)
+                    .returning(*Attendance.__table__.columns)
+                    .execution_options(synchronize_session=False)
+                ).first()
+
+    event.review_status = "approved" if approve else "rejected"
+    event.reviewed_by = reviewer_id
+    event.reviewed_at = datetime.now(timezone.utc)
+    db.commit()
+
+    if row is not None:
+        columnar_store.apply_committed(
+            [(row, department_id)], {row.date: day_version}
+        )
+    return row
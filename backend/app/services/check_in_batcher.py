@@ -0,0 +1,244 @@
+"""
+Group commit for check-ins.
+
+With ``CHECK_IN_GROUP_COMMIT`` enabled, validated check-ins are queued
+instead of each running its own transaction. One flusher task per process
+takes up to ``CHECK_IN_BATCH_MAX_SIZE`` of them, waiting at most
+``CHECK_IN_BATCH_MAX_DELAY_MS`` after the first, and writes the batch with a
+single multi-row upsert, merged rollup deltas and one commit. Every caller
+awaits the result for its own row, so responses are unchanged.
+
+The queue is bounded by ``CHECK_IN_QUEUE_SIZE``: past that, callers wait for
+room. On shutdown the queue is drained before the database engines close.
+A batch that fails is failed for every caller in it.
+"""
+
+import asyncio
+import logging
+import threading
+from collections import Counter
+from dataclasses import dataclass
+from datetime import date, datetime
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import Row
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.services import attendance as attendance_service
+from app.services.analytics_cache import bump_attendance_day_version
+from app.services.columnar import columnar_store
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _PendingCheckIn:
+    values: dict
+    department_id: Optional[int]
+    placeholder_location_id: Optional[int]
+    future: asyncio.Future
+
+
+class CheckInBatcher:
+    """Bounded queue of check-ins written in batches by one flusher task."""
+
+    def __init__(self, max_batch_size: int, max_delay_ms: float, queue_size: int):
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay_ms / 1000
+        self.queue_size = queue_size
+        self._queue: Optional[asyncio.Queue] = None
+        self._flusher: Optional[asyncio.Task] = None
+        self._closing = False
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.rows = 0
+        self.largest_batch = 0
+        self.failed_batches = 0
+
+    @property
+    def running(self) -> bool:
+        return self._flusher is not None and not self._closing
+
+    def start(self) -> None:
+        """Start the flusher; must be called from the event loop."""
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._closing = False
+        self._flusher = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop accepting check-ins and write everything still queued."""
+        if self._flusher is None:
+            return
+        self._closing = True
+        await self._queue.put(None)  # wakes a flusher blocked on an empty queue
+        await self._flusher
+        self._flusher = None
+
+        # Callers that were waiting for room when the flusher exited
+        leftover = []
+        while not self._queue.empty():
+            item = self._queue.get_nowait()
+            if item is not None:
+                leftover.append(item)
+        if leftover:
+            await self._flush(leftover)
+
+    async def submit(
+        self,
+        employee_id: int,
+        location_id: int,
+        department_id: Optional[int],
+        attendance_date: date,
+        check_in_time: datetime,
+        latitude: float,
+        longitude: float,
+        distance_meters: float,
+        is_late: bool,
+        late_by_minutes: int,
+        placeholder_location_id: Optional[int] = None,
+    ) -> Optional[Row]:
+        """
+        Queue a check-in and wait for its batch to commit.
+
+        Same arguments and result as ``attendance.record_check_in``.
+        """
+        if not self.running:
+            raise RuntimeError("Check-in batcher is not running")
+        pending = _PendingCheckIn(
+            values=dict(
+                employee_id=employee_id,
+                location_id=location_id,
+                date=attendance_date,
+                check_in_time=check_in_time,
+                check_in_latitude=latitude,
+                check_in_longitude=longitude,
+                distance_from_location_meters=distance_meters,
+                is_late=is_late,
+                late_by_minutes=late_by_minutes,
+                status="present",
+            ),
+            department_id=department_id,
+            placeholder_location_id=placeholder_location_id,
+            future=asyncio.get_running_loop().create_future(),
+        )
+        await self._queue.put(pending)
+        return await pending.future
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "enabled": self.running,
+                "queued": self._queue.qsize() if self._queue is not None else 0,
+                "queue_size": self.queue_size,
+                "max_batch_size": self.max_batch_size,
+                "max_delay_ms": self.max_delay * 1000,
+                "batches": self.batches,
+                "rows": self.rows,
+                "largest_batch": self.largest_batch,
+                "failed_batches": self.failed_batches,
+            }
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while not (self._closing and self._queue.empty()):
+            item = await self._queue.get()
+            batch = [item] if item is not None else []
+            deadline = loop.time() + self.max_delay
+            while len(batch) < self.max_batch_size:
+                try:
+                    if self._closing:
+                        item = self._queue.get_nowait()
+                    else:
+                        item = await asyncio.wait_for(
+                            self._queue.get(), max(deadline - loop.time(), 0)
+                        )
+                except (asyncio.QueueEmpty, asyncio.TimeoutError):
+                    break
+                if item is not None:
+                    batch.append(item)
+            if batch:
+                await self._flush(batch)
+
+    async def _flush(self, batch: List[_PendingCheckIn]) -> None:
+        try:
+            results = await run_in_threadpool(self._write, batch)
+        except Exception as exc:
+            logger.exception("Check-in batch of %d failed", len(batch))
+            with self._lock:
+                self.failed_batches += 1
+            for pending in batch:
+                if not pending.future.done():
+                    pending.future.set_exception(exc)
+            return
+
+        with self._lock:
+            self.batches += 1
+            self.rows += len(batch)
+            self.largest_batch = max(self.largest_batch, len(batch))
+        for pending, row in zip(batch, results):
+            if not pending.future.done():
+                pending.future.set_result(row)
+
+    @staticmethod
+    def _write(batch: List[_PendingCheckIn]) -> List[Optional[Row]]:
+        # One upsert cannot touch the same row twice, so only the first
+        # check-in per employee and day goes in; the rest are duplicates
+        first: Dict[Tuple[int, date], int] = {}
+        for index, pending in enumerate(batch):
+            key = (pending.values["employee_id"], pending.values["date"])
+            first.setdefault(key, index)
+
+        db = SessionLocal()
+        try:
+            stored = {
+                (row.employee_id, row.date): row
+                for row in db.execute(
+                    attendance_service.check_in_upsert(
+                        [batch[index].values for index in first.values()]
+                    )
+                )
+            }
+
+            results: List[Optional[Row]] = []
+            changes = []
+            for index, pending in enumerate(batch):
+                key = (pending.values["employee_id"], pending.values["date"])
+                row = stored.get(key) if first[key] == index else None
+                results.append(row)
+                if row is None:
+                    continue
+                changes.extend(
+                    attendance_service.check_in_rollup_deltas(
+                        row, pending.department_id, pending.placeholder_location_id
+                    )
+                )
+
+            attendance_service.apply_rollup_changes(db, changes)
+            day_versions = {
+                day: bump_attendance_day_version(db, day, rows)
+                for day, rows in sorted(
+                    Counter(row.date for row in results if row is not None).items()
+                )
+            }
+            db.commit()
+        finally:
+            db.close()
+
+        columnar_store.apply_committed(
+            [
+                (row, pending.department_id)
+                for pending, row in zip(batch, results)
+                if row is not None
+            ],
+            day_versions,
+        )
+        return results
+
+
+check_in_batcher = CheckInBatcher(
+    max_batch_size=settings.CHECK_IN_BATCH_MAX_SIZE,
+    max_delay_ms=settings.CHECK_IN_BATCH_MAX_DELAY_MS,
+    queue_size=settings.CHECK_IN_QUEUE_SIZE,
+)
@@ -0,0 +1,612 @@
+"""
+Columnar in-memory attendance store.
+
+Keeps a rolling window of attendance in NumPy arrays (one per column) so the
+dashboard aggregates are answered with boolean masks and ``bincount``
+instead of SQL. The store is optional: it needs NumPy and
+``ANALYTICS_COLUMNAR_ENABLED``, and every caller falls back to the SQL path
+while it is unavailable, still loading, or asked about days outside its
+window.
+
+Every attendance write bumps a per-day version (``attendance_day:<date>``)
+by the number of rows it changed. Writes committed in this process are
+applied to the arrays straight away along with the version they produced.
+When another worker moves a day's version past what this process has seen,
+queries touching that day use SQL while a background thread reloads just
+that day and patches the row index in place.
+
+Compare the store against the SQL path for a day with:
+
+    python -m app.services.columnar --date YYYY-MM-DD
+"""
+
+import argparse
+import logging
+import sys
+import threading
+from collections import Counter
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.attendance import Attendance
+from app.models.user import User
+from app.services.analytics_cache import attendance_day_versions
+from app.services.rollup import ROLLUP_MEASURES
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; the SQL path is used without it
+    np = None
+
+logger = logging.getLogger(__name__)
+
+STATUS_CODES = {"not_marked": 0, "present": 1, "checked_out": 2}
+OTHER_STATUS = 3
+PRESENT_CODES = (STATUS_CODES["present"], STATUS_CODES["checked_out"])
+# Day ordinal of a slot whose row was deleted; never matches a query
+REMOVED_DAY = -1
+
+COLUMNS = (
+    ("id", "int64"),
+    ("employee_id", "int64"),
+    ("location_id", "int64"),
+    ("department_id", "int64"),
+    ("day", "int64"),
+    ("status", "int8"),
+    ("is_late", "bool"),
+    ("late_by_minutes", "int64"),
+)
+
+
+def _to_record(row, department_id: Optional[int]) -> tuple:
+    return (
+        row.id,
+        row.employee_id,
+        row.location_id,
+        department_id or 0,
+        row.date.toordinal(),
+        STATUS_CODES.get(row.status, OTHER_STATUS),
+        bool(row.is_late),
+        row.late_by_minutes or 0,
+    )
+
+
+class ColumnarStore:
+    """Rolling window of attendance rows held as NumPy column arrays."""
+
+    def __init__(self, window_days: int, enabled: bool):
+        self.window_days = window_days
+        self.enabled = enabled
+        self._lock = threading.RLock()
+        self._columns: Optional[Dict[str, "np.ndarray"]] = None
+        self._size = 0
+        self._rows: Dict[int, int] = {}
+        self._first_day: Optional[int] = None
+        # Day ordinal -> last attendance_day version reflected in the arrays
+        self._day_versions: Dict[int, int] = {}
+        self._stale: Set[int] = set()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._reload: Optional[Future] = None
+        self.loads = 0
+        self.day_reloads = 0
+        self.deltas_applied = 0
+        self.compactions = 0
+
+    @property
+    def available(self) -> bool:
+        return self.enabled and np is not None
+
+    @property
+    def ready(self) -> bool:
+        return self.available and self._columns is not None
+
+    def serves(
+        self, db: Session, start_date: date, end_date: Optional[date] = None
+    ) -> bool:
+        """Whether queries over [start_date, end_date] can be answered from memory.
+
+        Days another worker has changed are answered by SQL until the
+        background reload catches up.
+        """
+        if not self.ready or start_date.toordinal() < self._first_day:
+            return False
+        first = start_date.toordinal()
+        last = (end_date or start_date).toordinal()
+        return not any(first <= day <= last for day in self.sync(db))
+
+    # Loading and deltas
+
+    def load(self, db: Session) -> int:
+        """Load the whole window from the database, replacing any state."""
+        if not self.available:
+            return 0
+        today = datetime.now(timezone.utc).date()
+        first_day = today - timedelta(days=self.window_days - 1)
+        # Read versions first so rows changed during the fetch count as stale
+        versions = attendance_day_versions(db, first_day)
+        records = self._fetch(db, first_day)
+
+        with self._lock:
+            self._columns = {
+                name: np.empty(max(len(records), 1024), dtype=dtype)
+                for name, dtype in COLUMNS
+            }
+            self._size = 0
+            self._rows = {}
+            self._append(records)
+            self._first_day = first_day.toordinal()
+            self._day_versions = {
+                day.toordinal(): version for day, version in versions.items()
+            }
+            self._stale = set()
+            self.loads += 1
+        logger.info("Loaded %d attendance rows into the columnar store", len(records))
+        return len(records)
+
+    def sync(self, db: Session) -> Set[int]:
+        """Find days changed by other workers and queue their reload.
+
+        Costs one small query; the reload itself runs on a background thread.
+
+        Returns:
+            Ordinals of the days that are currently stale
+        """
+        today = datetime.now(timezone.utc).date()
+        first_day = today - timedelta(days=self.window_days - 1)
+        versions = attendance_day_versions(db, first_day)
+        with self._lock:
+            self._first_day = max(self._first_day, first_day.toordinal())
+            self._stale = {
+                day.toordinal()
+                for day, version in versions.items()
+                if version > self._day_versions.get(day.toordinal(), 0)
+            }
+            stale = set(self._stale)
+            if stale and (self._reload is None or self._reload.done()):
+                self._reload = self._pool().submit(self._reload_stale_days)
+        return stale
+
+    def apply_check_in(
+        self, attendance, department_id: Optional[int], day_version: int
+    ) -> None:
+        """Apply a committed check-in row (new or over a placeholder)."""
+        self.apply_committed(
+            [(attendance, department_id)], {attendance.date: day_version}
+        )
+
+    def apply_check_out(
+        self, attendance, department_id: Optional[int], day_version: int
+    ) -> None:
+        """Apply a committed check-out."""
+        self.apply_committed(
+            [(attendance, department_id)], {attendance.date: day_version}
+        )
+
+    def apply_committed(
+        self,
+        rows: Iterable[Tuple[object, Optional[int]]],
+        day_versions: Dict[date, int],
+    ) -> None:
+        """
+        Apply rows committed by this process.
+
+        ``day_versions`` holds the attendance_day version each day reached in
+        the writing transaction, which bumped it once per row. When that is
+        exactly this store's version plus those rows, nothing else changed
+        the day in between and the store stays current; otherwise the day
+        is left stale for the reload to settle.
+        """
+        if not self.ready:
+            return
+        records = [_to_record(row, department_id) for row, department_id in rows]
+        counts = Counter(record[4] for record in records)
+        with self._lock:
+            current = set()
+            for day, version in day_versions.items():
+                ordinal = day.toordinal()
+                known = self._day_versions.get(ordinal, 0)
+                if version <= known:
+                    # A reload already picked these rows up
+                    continue
+                current.add(ordinal)
+                if version == known + counts[ordinal]:
+                    self._day_versions[ordinal] = version
+            self._upsert(
+                [
+                    record
+                    for record in records
+                    if record[4] in current and record[4] >= self._first_day
+                ]
+            )
+            self.deltas_applied += len(records)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "numpy": np is not None,
+                "ready": self.ready,
+                "rows": len(self._rows),
+                "slots": self._size,
+                "window_days": self.window_days,
+                "stale_days": len(self._stale),
+                "loads": self.loads,
+                "day_reloads": self.day_reloads,
+                "deltas_applied": self.deltas_applied,
+                "compactions": self.compactions,
+            }
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _pool(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix="columnar-reload"
+            )
+        return self._executor
+
+    def _reload_stale_days(self) -> None:
+        db = SessionLocal()
+        try:
+            with self._lock:
+                first_day = date.fromordinal(self._first_day)
+            versions = attendance_day_versions(db, first_day)
+            for day, version in sorted(versions.items()):
+                with self._lock:
+                    if version <= self._day_versions.get(day.toordinal(), 0):
+                        continue
+                records = self._fetch(db, day, day)
+                self._replace_day(day.toordinal(), records, version)
+            db.rollback()
+            self._compact_if_needed()
+        except Exception:
+            logger.exception("Reloading columnar attendance days failed")
+        finally:
+            db.close()
+
+    def _replace_day(self, ordinal: int, records: List[tuple], version: int) -> None:
+        """Make one day's slots match freshly fetched rows, in place."""
+        with self._lock:
+            fetched = {record[0] for record in records}
+            days = self._columns["day"]
+            ids = self._columns["id"]
+            for index in np.flatnonzero(self._view("day") == ordinal):
+                row_id = int(ids[index])
+                if row_id not in fetched:
+                    days[index] = REMOVED_DAY
+                    del self._rows[row_id]
+            self._upsert(records)
+            self._day_versions[ordinal] = max(
+                version, self._day_versions.get(ordinal, 0)
+            )
+            self._stale.discard(ordinal)
+            self.day_reloads += 1
+
+    def _compact_if_needed(self) -> None:
+        # Drops deleted rows and days that slid out of the window once they
+        # make up half the arrays
+        with self._lock:
+            keep = self._view("day") >= self._first_day
+            kept = int(keep.sum())
+            if (self._size - kept) * 2 <= self._size:
+                return
+            for name, _ in COLUMNS:
+                self._columns[name][:kept] = self._view(name)[keep]
+            self._size = kept
+            self._rows = dict(zip(self._view("id").tolist(), range(kept)))
+            self._day_versions = {
+                day: version
+                for day, version in self._day_versions.items()
+                if day >= self._first_day
+            }
+            self.compactions += 1
+
+    def _fetch(
+        self, db: Session, first_day: date, last_day: Optional[date] = None
+    ) -> List[tuple]:
+        stmt = (
+            select(Attendance, User.department_id)
+            .join(User, User.id == Attendance.employee_id)
+            .where(Attendance.date >= first_day)
+        )
+        if last_day is not None:
+            stmt = stmt.where(Attendance.date <= last_day)
+        return [
+            _to_record(attendance, department_id)
+            for attendance, department_id in db.execute(stmt)
+        ]
+
+    def _upsert(self, records: List[tuple]) -> None:
+        # Called with the lock held
+        if not records:
+            return
+        indexes = np.fromiter(
+            (self._rows.get(record[0], -1) for record in records),
+            dtype="int64",
+            count=len(records),
+        )
+        existing = indexes >= 0
+        if existing.any():
+            for position, (name, dtype) in enumerate(COLUMNS):
+                values = np.fromiter(
+                    (record[position] for record in records),
+                    dtype=dtype,
+                    count=len(records),
+                )
+                self._columns[name][indexes[existing]] = values[existing]
+        self._append(
+            [record for record, found in zip(records, existing) if not found]
+        )
+
+    def _append(self, records: List[tuple]) -> None:
+        # Called with the lock held
+        if not records:
+            return
+        needed = self._size + len(records)
+        capacity = len(self._columns["id"])
+        if needed > capacity:
+            capacity = max(needed, capacity * 2)
+            for name, dtype in COLUMNS:
+                grown = np.empty(capacity, dtype=dtype)
+                grown[: self._size] = self._view(name)
+                self._columns[name] = grown
+
+        for position, (name, dtype) in enumerate(COLUMNS):
+            values = np.fromiter(
+                (record[position] for record in records),
+                dtype=dtype,
+                count=len(records),
+            )
+            self._columns[name][self._size : needed] = values
+        for offset, record in enumerate(records):
+            self._rows[record[0]] = self._size + offset
+        self._size = needed
+
+    def _view(self, name: str) -> "np.ndarray":
+        return self._columns[name][: self._size]
+
+    def _snapshot(self) -> Dict[str, "np.ndarray"]:
+        with self._lock:
+            return {name: self._view(name).copy() for name, _ in COLUMNS}
+
+    # Queries
+
+    def day_counters(
+        self,
+        attendance_date: date,
+        group_by: Optional[str] = None,
+        location_id: Optional[int] = None,
+    ) -> Dict[Optional[int], dict]:
+        """Same shape as rollup.read_rollup, computed from the arrays."""
+        cols = self._snapshot()
+        mask = cols["day"] == attendance_date.toordinal()
+        if location_id is not None:
+            mask &= cols["location_id"] == location_id
+
+        present = np.isin(cols["status"], PRESENT_CODES)
+        late = present & cols["is_late"]
+        measures = {
+            "headcount": mask,
+            "present": mask & present,
+            "late": mask & late,
+            "checked_out": mask & (cols["status"] == STATUS_CODES["checked_out"]),
+            "not_marked": mask & (cols["status"] == STATUS_CODES["not_marked"]),
+        }
+        late_minutes = np.where(mask & cols["is_late"], cols["late_by_minutes"], 0)
+
+        if group_by is None:
+            counters = {name: int(values.sum()) for name, values in measures.items()}
+            counters["late_minutes"] = int(late_minutes.sum())
+            return {None: counters}
+
+        keys = cols[f"{group_by}_id"]
+        groups = np.unique(keys[mask])
+        if len(groups) == 0:
+            return {}
+        size = int(groups.max()) + 1
+        sums = {
+            name: np.bincount(keys, weights=values, minlength=size)
+            for name, values in measures.items()
+        }
+        sums["late_minutes"] = np.bincount(keys, weights=late_minutes, minlength=size)
+        return {
+            int(key): {name: int(sums[name][key]) for name in ROLLUP_MEASURES}
+            for key in groups
+        }
+
+    def late_frequency(
+        self,
+        db: Session,
+        start_date: date,
+        end_date: date,
+        location_id: Optional[int] = None,
+    ) -> List[dict]:
+        """Per-employee day and late counts for active users."""
+        names = dict(
+            db.query(User.id, User.name).filter(User.status == "Active").all()
+        )
+        cols = self._snapshot()
+        mask = (cols["day"] >= start_date.toordinal()) & (
+            cols["day"] <= end_date.toordinal()
+        )
+        if location_id is not None:
+            mask &= cols["location_id"] == location_id
+        mask &= np.isin(cols["employee_id"], np.fromiter(names, dtype="int64"))
+
+        employees, inverse = np.unique(cols["employee_id"][mask], return_inverse=True)
+        total_days = np.bincount(inverse, minlength=len(employees))
+        late_days = np.bincount(
+            inverse, weights=cols["is_late"][mask], minlength=len(employees)
+        )
+
+        results = []
+        for employee_id, total, late in zip(employees, total_days, late_days):
+            total, late = int(total), int(late)
+            results.append(
+                {
+                    "employee_id": int(employee_id),
+                    "employee_name": names[int(employee_id)],
+                    "total_days": total,
+                    "late_days": late,
+                    "late_percentage": round(late / total * 100, 1) if total > 0 else 0,
+                }
+            )
+        return results
+
+    def trends(
+        self,
+        db: Session,
+        start_date: date,
+        end_date: date,
+        today: date,
+        bucket: str = "day",
+        location_id: Optional[int] = None,
+    ) -> List[dict]:
+        """Same result as analytics_engine.run_trends."""
+        employees = db.query(User.id).filter(
+            User.role == "Employee", User.status == "Active"
+        )
+        if location_id is not None:
+            employees = employees.filter(User.location_id == location_id)
+        employee_ids = np.fromiter((row.id for row in employees), dtype="int64")
+        headcount = len(employee_ids)
+
+        cols = self._snapshot()
+        first, last = start_date.toordinal(), end_date.toordinal()
+        mask = (cols["day"] >= first) & (cols["day"] <= last)
+        mask &= np.isin(cols["employee_id"], employee_ids)
+
+        offsets = cols["day"][mask] - first
+        status = cols["status"][mask]
+        present_rows = np.isin(status, PRESENT_CODES)
+        length = last - first + 1
+        present = np.bincount(offsets, weights=present_rows, minlength=length)
+        late = np.bincount(
+            offsets, weights=present_rows & cols["is_late"][mask], minlength=length
+        )
+        not_marked = np.bincount(
+            offsets, weights=status == STATUS_CODES["not_marked"], minlength=length
+        )
+
+        buckets: Dict[date, List[int]] = {}
+        for offset in range(length):
+            day = date.fromordinal(first + offset)
+            if bucket == "week":
+                key = day - timedelta(days=day.weekday())
+            elif bucket == "month":
+                key = day.replace(day=1)
+            else:
+                key = day
+            pending = int(not_marked[offset]) if day == today else 0
+            totals = buckets.setdefault(key, [0, 0, 0])
+            totals[0] += int(present[offset])
+            totals[1] += max(headcount - int(present[offset]) - pending, 0)
+            totals[2] += int(late[offset])
+
+        return [
+            {"date": key.isoformat(), "present": p, "absent": a, "late": lt}
+            for key, (p, a, lt) in sorted(buckets.items())
+        ]
+
+
+columnar_store = ColumnarStore(
+    window_days=settings.ANALYTICS_COLUMNAR_WINDOW_DAYS,
+    enabled=settings.ANALYTICS_COLUMNAR_ENABLED,
+)
+
+
+def load_columnar_store() -> None:
+    """Populate the shared store in a fresh session (startup hook)."""
+    db = SessionLocal()
+    try:
+        columnar_store.load(db)
+    except Exception:
+        logger.exception("Loading the columnar attendance store failed")
+    finally:
+        db.close()
+
+
+def compare_with_sql(
+    store: ColumnarStore, db: Session, on_date: date, today: date
+) -> Dict[str, tuple]:
+    """Answer each analytics query from the store and from SQL.
+
+    Returns:
+        ``(columnar, sql)`` result pairs keyed by endpoint
+    """
+    from app.routers.analytics import compute_late_frequency
+    from app.services.analytics_engine import run_trends
+    from app.services.rollup import read_rollup
+
+    start_date = on_date - timedelta(days=6)
+    return {
+        "summary": (
+            store.day_counters(on_date),
+            read_rollup(db, on_date),
+        ),
+        "by-location": (
+            store.day_counters(on_date, group_by="location"),
+            read_rollup(db, on_date, group_by="location"),
+        ),
+        "by-department": (
+            store.day_counters(on_date, group_by="department"),
+            read_rollup(db, on_date, group_by="department"),
+        ),
+        "late-frequency": (
+            store.late_frequency(db, start_date, on_date),
+            sorted(
+                compute_late_frequency(db, start_date, on_date, None, None),
+                key=lambda row: row["employee_id"],
+            ),
+        ),
+        "absent-trends": (
+            store.trends(db, start_date, on_date, today),
+            run_trends(db, start_date, on_date, today=today),
+        ),
+    }
+
+
+def main(argv: Optional[list] = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Compare the columnar store with the SQL analytics path."
+    )
+    parser.add_argument(
+        "--date",
+        type=date.fromisoformat,
+        default=None,
+        help="Day to compare (YYYY-MM-DD, defaults to today UTC)",
+    )
+    args = parser.parse_args(argv)
+
+    if np is None:
+        sys.exit("NumPy is not installed")
+
+    today = datetime.now(timezone.utc).date()
+    store = ColumnarStore(
+        window_days=settings.ANALYTICS_COLUMNAR_WINDOW_DAYS, enabled=True
+    )
+
+    db = SessionLocal()
+    try:
+        store.load(db)
+        checks = compare_with_sql(store, db, args.date or today, today)
+    finally:
+        db.close()
+
+    mismatched = [name for name, (columnar, sql) in checks.items() if columnar != sql]
+    for name in checks:
+        print(f"{name}: {'MISMATCH' if name in mismatched else 'ok'}")
+    if mismatched:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Batched dashboard evaluation.
+
+Runs several analytics widgets in parallel sessions that all share one
+exported REPEATABLE READ snapshot, so every number in the payload comes
+from the same point in time.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict
+
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.database import SessionLocal, begin_snapshot, join_snapshot
+
+WidgetFn = Callable[[Session], Any]
+
+_executor = ThreadPoolExecutor(
+    max_workers=settings.DASHBOARD_WORKERS, thread_name_prefix="dashboard"
+)
+
+
+def _run_in_snapshot(snapshot_id: str, widget: WidgetFn) -> Any:
+    db = SessionLocal()
+    try:
+        join_snapshot(db, snapshot_id)
+        return widget(db)
+    finally:
+        db.rollback()
+        db.close()
+
+
+def evaluate_widgets(widgets: Dict[str, WidgetFn]) -> Dict[str, Any]:
+    """
+    Evaluate widgets concurrently against one snapshot.
+
+    The first widget runs in the session that owns the snapshot; the rest
+    run on the worker pool in sessions joined to it. The owning
+    transaction is held open until every widget has finished, so a request
+    holds its own connection plus up to ``DASHBOARD_WORKERS`` pooled ones
+    (see ``database.sync_connection_demand``).
+
+    Widgets must read only through the session they are given; in-memory
+    caches are not part of the snapshot.
+    """
+    keys = list(widgets)
+    db = SessionLocal()
+    try:
+        snapshot_id = begin_snapshot(db)
+        futures = {
+            key: _executor.submit(_run_in_snapshot, snapshot_id, widgets[key])
+            for key in keys[1:]
+        }
+        results = {keys[0]: widgets[keys[0]](db)}
+        for key, future in futures.items():
+            results[key] = future.result()
+        return {key: results[key] for key in keys}
+    finally:
+        db.rollback()
+        db.close()
+
+
+def shutdown() -> None:
+    _executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,254 @@
+import csv
+import io
+import json
+import tempfile
+from dataclasses import dataclass
+from datetime import date
+from typing import BinaryIO, Iterable, Iterator, List, Optional
+
+import xlsxwriter
+from sqlalchemy import func, or_, select
+from sqlalchemy.sql import Select
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.attendance import Attendance
+from app.models.cache_version import CacheVersion
+from app.models.location import Location
+from app.models.user import User
+from app.services.analytics_cache import (
+    USERS_VERSION_NAME,
+    attendance_day_version_name,
+)
+from app.services.reference_data import REFERENCE_VERSION_NAME
+
+EXPORT_HEADERS = [
+    "Date",
+    "Employee",
+    "Location",
+    "Check In",
+    "Check Out",
+    "Status",
+    "Late (mins)",
+]
+
+# Keys used for NDJSON records, in EXPORT_HEADERS order
+EXPORT_FIELDS = [
+    "date",
+    "employee",
+    "location",
+    "check_in",
+    "check_out",
+    "status",
+    "late_minutes",
+]
+
+# Rows per reportlab table when rendering a PDF
+PDF_TABLE_ROWS = 500
+
+# Flush streamed text formats to the client in chunks of roughly this size
+CHUNK_SIZE = 64 * 1024
+
+
+@dataclass(frozen=True)
+class ExportFilters:
+    start_date: date
+    end_date: date
+    location_id: Optional[int] = None
+    department_id: Optional[int] = None
+
+
+def _apply_filters(stmt: Select, filters: ExportFilters) -> Select:
+    stmt = stmt.where(
+        Attendance.date >= filters.start_date,
+        Attendance.date <= filters.end_date,
+    )
+    if filters.location_id:
+        stmt = stmt.where(Attendance.location_id == filters.location_id)
+    if filters.department_id:
+        stmt = stmt.where(User.department_id == filters.department_id)
+    return stmt
+
+
+def build_export_query(filters: ExportFilters) -> Select:
+    """Select only the columns an export needs, newest first."""
+    stmt = (
+        select(
+            Attendance.date,
+            User.name.label("employee_name"),
+            Location.name.label("location_name"),
+            Attendance.check_in_time,
+            Attendance.check_out_time,
+            Attendance.status,
+            Attendance.is_late,
+            Attendance.late_by_minutes,
+        )
+        .outerjoin(User, User.id == Attendance.employee_id)
+        .outerjoin(Location, Location.id == Attendance.location_id)
+        .order_by(Attendance.date.desc(), Attendance.check_in_time.desc())
+    )
+    return _apply_filters(stmt, filters)
+
+
+def build_count_query(filters: ExportFilters) -> Select:
+    """Count the rows an export would read."""
+    stmt = select(func.count(Attendance.id)).outerjoin(
+        User, User.id == Attendance.employee_id
+    )
+    return _apply_filters(stmt, filters)
+
+
+def build_version_query(filters: ExportFilters) -> Select:
+    """
+    Data versions an export's content depends on.
+
+    Every attendance write bumps the ``attendance_day:<date>`` version of
+    the days it touched, location changes bump ``reference`` and user edits
+    bump ``users``, so these rows change whenever the export's rows or the
+    names it shows can. Versions only increase, and a day gaining its
+    first version adds a row, so the list works as the export's data
+    version.
+    """
+    return (
+        select(CacheVersion.name, CacheVersion.version)
+        .where(
+            or_(
+                # ISO dates sort chronologically
+                CacheVersion.name.between(
+                    attendance_day_version_name(filters.start_date),
+                    attendance_day_version_name(filters.end_date),
+                ),
+                CacheVersion.name.in_([REFERENCE_VERSION_NAME, USERS_VERSION_NAME]),
+            )
+        )
+        .order_by(CacheVersion.name)
+    )
+
+
+def iter_export_rows(
+    filters: ExportFilters, time_format: str = "%H:%M:%S", empty: str = ""
+) -> Iterator[List]:
+    """
+    Yield formatted export rows from a server-side cursor.
+
+    Opens its own session because streaming responses outlive the request's
+    dependency-managed session.
+    """
+    db = SessionLocal()
+    try:
+        result = db.execute(
+            build_export_query(filters).execution_options(
+                yield_per=settings.EXPORT_BATCH_SIZE
+            )
+        )
+        for row in result:
+            yield [
+                str(row.date),
+                row.employee_name or "Unknown",
+                row.location_name or "Unknown",
+                row.check_in_time.strftime(time_format) if row.check_in_time else empty,
+                row.check_out_time.strftime(time_format)
+                if row.check_out_time
+                else empty,
+                row.status,
+                row.late_by_minutes if row.is_late else 0,
+            ]
+    finally:
+        db.close()
+
+
+def stream_csv(rows: Iterable[list]) -> Iterator[bytes]:
+    """Stream attendance rows as CSV, one chunk at a time."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_HEADERS)
+    for row in rows:
+        writer.writerow(row)
+        if buffer.tell() >= CHUNK_SIZE:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode("utf-8")
+
+
+def stream_ndjson(rows: Iterable[list]) -> Iterator[bytes]:
+    """Stream attendance rows as newline-delimited JSON objects."""
+    chunk: List[str] = []
+    size = 0
+    for row in rows:
+        line = json.dumps(dict(zip(EXPORT_FIELDS, row))) + "\n"
+        chunk.append(line)
+        size += len(line)
+        if size >= CHUNK_SIZE:
+            yield "".join(chunk).encode("utf-8")
+            chunk, size = [], 0
+    yield "".join(chunk).encode("utf-8")
+
+
+def stream_excel(rows: Iterable[list]) -> Iterator[bytes]:
+    """
+    Stream attendance rows as an .xlsx workbook.
+
+    xlsxwriter's constant_memory mode flushes each row to disk as it is
+    written. An xlsx file is a zip, so it can only be sent once the workbook
+    is closed; it is then read back from a temp file in fixed-size chunks.
+    """
+    with tempfile.TemporaryFile() as output:
+        workbook = xlsxwriter.Workbook(output, {"constant_memory": True})
+        worksheet = workbook.add_worksheet()
+        worksheet.write_row(0, 0, EXPORT_HEADERS)
+        for row_number, row in enumerate(rows, start=1):
+            worksheet.write_row(row_number, 0, row)
+        workbook.close()
+
+        output.seek(0)
+        while chunk := output.read(CHUNK_SIZE):
+            yield chunk
+
+
+def write_pdf(
+    rows: Iterable[list], start_date: date, end_date: date, output: BinaryIO
+) -> None:
+    """
+    Render attendance rows as a PDF report.
+
+    Rows are laid out in fixed-size tables rather than one giant table, which
+    keeps reportlab's layout cost linear in the number of rows.
+    """
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import letter, landscape
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.platypus import Paragraph, SimpleDocTemplate, Table, TableStyle
+
+    style = TableStyle(
+        [
+            ("BACKGROUND", (0, 0), (-1, 0), colors.grey),
+            ("TEXTCOLOR", (0, 0), (-1, 0), colors.whitesmoke),
+            ("ALIGN", (0, 0), (-1, -1), "CENTER"),
+            ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
+            ("FONTSIZE", (0, 0), (-1, 0), 10),
+            ("BOTTOMPADDING", (0, 0), (-1, 0), 12),
+            ("BACKGROUND", (0, 1), (-1, -1), colors.beige),
+            ("GRID", (0, 0), (-1, -1), 1, colors.black),
+        ]
+    )
+
+    def table(chunk: List[list]) -> Table:
+        result = Table([EXPORT_HEADERS] + chunk, repeatRows=1)
+        result.setStyle(style)
+        return result
+
+    styles = getSampleStyleSheet()
+    elements = [
+        Paragraph(f"Attendance Report: {start_date} to {end_date}", styles["Title"])
+    ]
+    chunk: List[list] = []
+    for row in rows:
+        chunk.append([str(value) for value in row])
+        if len(chunk) >= PDF_TABLE_ROWS:
+            elements.append(table(chunk))
+            chunk = []
+    if chunk or len(elements) == 1:
+        elements.append(table(chunk))
+
+    SimpleDocTemplate(output, pagesize=landscape(letter)).build(elements)
@@ -0,0 +1,392 @@
+"""
+Background attendance export jobs.
+
+Exports run in a process pool and are written to EXPORT_ARTIFACTS_DIR. A job
+id is the hash of (format, filters, data version), so an identical export
+over unchanged data resolves to the same file and is served from disk.
+Job state lives entirely in that directory, so any worker can answer a poll:
+
+    <id>.json      job metadata and the submitting process, written on submit
+    <id>.progress  rows written, worker pid and heartbeat, updated by the worker
+    <id>.<ext>     the finished artifact
+    <id>.error     failure message
+
+A job whose worker stops heartbeating, whose process is gone, or that never
+starts is reported as failed, so the next identical request resubmits it.
+Artifacts and sidecar files expire after EXPORT_ARTIFACT_TTL_SECONDS.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import re
+import socket
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import asdict, dataclass
+from datetime import date, datetime, timezone
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, Optional
+
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.services import export as export_service
+from app.services.export import ExportFilters, iter_export_rows
+
+logger = logging.getLogger(__name__)
+
+EXPORT_EXTENSIONS = {"excel": "xlsx", "csv": "csv", "ndjson": "ndjson", "pdf": "pdf"}
+JOB_ID_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+
+# How often (in rows) a worker rewrites its progress file
+PROGRESS_EVERY = 1000
+
+HOSTNAME = socket.gethostname()
+
+
+@dataclass
+class ExportJobStatus:
+    job_id: str
+    format: str
+    status: str
+    rows_written: int = 0
+    total_rows: int = 0
+    error: Optional[str] = None
+
+    @property
+    def progress(self) -> float:
+        if self.status == "completed":
+            return 1.0
+        if not self.total_rows:
+            return 0.0
+        return round(min(self.rows_written / self.total_rows, 1.0), 4)
+
+
+def _write_json(path: Path, data: dict) -> None:
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    tmp.write_text(json.dumps(data))
+    os.replace(tmp, path)
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class _Heartbeat:
+    """Keeps a job's progress file fresh while the worker is alive.
+
+    A thread rewrites the file every EXPORT_JOB_HEARTBEAT_SECONDS, so steps
+    that consume no rows (building a PDF) still count as progress.
+    """
+
+    def __init__(self, path: Path, total: int):
+        self.path = path
+        self.total = total
+        self.rows = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def __enter__(self) -> "_Heartbeat":
+        self.beat()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._stop.set()
+        self._thread.join()
+        self.beat()
+
+    def beat(self) -> None:
+        _write_json(
+            self.path,
+            {
+                "rows": self.rows,
+                "total": self.total,
+                "host": HOSTNAME,
+                "pid": os.getpid(),
+                "updated_at": time.time(),
+            },
+        )
+
+    def track(self, rows: Iterable[list]) -> Iterator[list]:
+        for row in rows:
+            yield row
+            self.rows += 1
+            if self.rows % PROGRESS_EVERY == 0:
+                self.beat()
+
+    def _run(self) -> None:
+        while not self._stop.wait(settings.EXPORT_JOB_HEARTBEAT_SECONDS):
+            self.beat()
+
+
+def run_export_job(
+    artifacts_dir: str, job_id: str, format: str, filters: dict, total: int
+) -> None:
+    """Process-pool entry point: write one export artifact to disk."""
+    base = Path(artifacts_dir)
+    artifact = base / f"{job_id}.{EXPORT_EXTENSIONS[format]}"
+    tmp = artifact.with_suffix(artifact.suffix + ".tmp")
+    progress_path = base / f"{job_id}.progress"
+
+    export_filters = ExportFilters(
+        start_date=date.fromisoformat(filters["start_date"]),
+        end_date=date.fromisoformat(filters["end_date"]),
+        location_id=filters["location_id"],
+        department_id=filters["department_id"],
+    )
+    try:
+        with _Heartbeat(progress_path, total) as heartbeat:
+            if format == "pdf":
+                rows = iter_export_rows(
+                    export_filters, time_format="%H:%M", empty="-"
+                )
+            else:
+                rows = iter_export_rows(export_filters)
+            rows = heartbeat.track(rows)
+
+            with open(tmp, "wb") as output:
+                if format == "pdf":
+                    export_service.write_pdf(
+                        rows, export_filters.start_date, export_filters.end_date, output
+                    )
+                else:
+                    streams = {
+                        "excel": export_service.stream_excel,
+                        "csv": export_service.stream_csv,
+                        "ndjson": export_service.stream_ndjson,
+                    }
+                    for chunk in streams[format](rows):
+                        output.write(chunk)
+            os.replace(tmp, artifact)
+    except Exception as exc:
+        tmp.unlink(missing_ok=True)
+        (base / f"{job_id}.error").write_text(str(exc) or exc.__class__.__name__)
+        raise
+
+
+class ExportJobManager:
+    """Submits export jobs to a process pool and reports their state."""
+
+    def __init__(self, artifacts_dir: str, workers: int):
+        self.artifacts_dir = Path(artifacts_dir)
+        self.workers = workers
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._futures: Dict[str, Future] = {}
+        # Reentrant: submit() resolves existing jobs while holding it
+        self._lock = threading.RLock()
+
+    def submit(
+        self, format: str, filters: ExportFilters, db: Session
+    ) -> ExportJobStatus:
+        """Start an export, or return the existing job for identical data."""
+        count = db.execute(export_service.build_count_query(filters)).scalar_one()
+        version = [
+            list(row)
+            for row in db.execute(export_service.build_version_query(filters))
+        ]
+        filters_data = {
+            key: value.isoformat() if isinstance(value, date) else value
+            for key, value in asdict(filters).items()
+        }
+        job_id = hashlib.sha256(
+            json.dumps(
+                {"format": format, "filters": filters_data, "version": version},
+                sort_keys=True,
+            ).encode("utf-8")
+        ).hexdigest()
+
+        self.artifacts_dir.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            existing = self.get(job_id)
+            if existing is not None and existing.status != "failed":
+                return existing
+
+            for suffix in ("error", "progress"):
+                (self.artifacts_dir / f"{job_id}.{suffix}").unlink(missing_ok=True)
+            _write_json(
+                self.artifacts_dir / f"{job_id}.json",
+                {
+                    "format": format,
+                    "filters": filters_data,
+                    "total": count,
+                    "submitted_at": datetime.now(timezone.utc).isoformat(),
+                    "host": HOSTNAME,
+                    "pid": os.getpid(),
+                },
+            )
+            future = self._pool().submit(
+                run_export_job,
+                str(self.artifacts_dir),
+                job_id,
+                format,
+                filters_data,
+                count,
+            )
+            self._futures[job_id] = future
+            future.add_done_callback(lambda f: self._on_done(job_id, f))
+
+        return ExportJobStatus(
+            job_id=job_id, format=format, status="queued", total_rows=count
+        )
+
+    def get(self, job_id: str) -> Optional[ExportJobStatus]:
+        """Resolve a job's state from the artifacts directory."""
+        if not JOB_ID_PATTERN.match(job_id):
+            return None
+        meta_path = self.artifacts_dir / f"{job_id}.json"
+        if not meta_path.exists():
+            return None
+
+        meta = json.loads(meta_path.read_text())
+        job = ExportJobStatus(
+            job_id=job_id,
+            format=meta["format"],
+            status="queued",
+            total_rows=meta["total"],
+        )
+
+        error_path = self.artifacts_dir / f"{job_id}.error"
+        if error_path.exists():
+            job.status = "failed"
+            job.error = error_path.read_text()
+        elif self.artifact_path(job_id, job.format).exists():
+            job.status = "completed"
+            job.rows_written = job.total_rows
+        else:
+            progress_path = self.artifacts_dir / f"{job_id}.progress"
+            progress = (
+                json.loads(progress_path.read_text())
+                if progress_path.exists()
+                else None
+            )
+            if progress is not None:
+                job.status = "running"
+                job.rows_written = progress["rows"]
+            job.error = self._stale_reason(job_id, meta, progress)
+            if job.error is not None:
+                job.status = "failed"
+        return job
+
+    def cleanup(self, max_age_seconds: Optional[int] = None) -> int:
+        """Delete expired jobs and stray temp files; returns files removed."""
+        if max_age_seconds is None:
+            max_age_seconds = settings.EXPORT_ARTIFACT_TTL_SECONDS
+        if not self.artifacts_dir.is_dir():
+            return 0
+
+        now = time.time()
+        groups: Dict[str, list] = {}
+        for path in self.artifacts_dir.iterdir():
+            groups.setdefault(path.name.split(".", 1)[0], []).append(path)
+
+        removed = 0
+        for job_id, paths in groups.items():
+            with self._lock:
+                if job_id in self._futures:
+                    continue
+            try:
+                newest = max(path.stat().st_mtime for path in paths)
+            except FileNotFoundError:
+                continue
+            if now - newest < max_age_seconds:
+                continue
+            for path in paths:
+                path.unlink(missing_ok=True)
+                removed += 1
+        return removed
+
+    def artifact_path(self, job_id: str, format: str) -> Path:
+        return self.artifacts_dir / f"{job_id}.{EXPORT_EXTENSIONS[format]}"
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _pool(self) -> ProcessPoolExecutor:
+        # Spawned workers build their own engine instead of inheriting the
+        # parent's pooled connections.
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._executor
+
+    def _stale_reason(
+        self, job_id: str, meta: dict, progress: Optional[dict]
+    ) -> Optional[str]:
+        """Why an unfinished job can no longer finish, or None if it still can."""
+        now = time.time()
+        if progress is not None:
+            if progress.get("host") == HOSTNAME and not _pid_alive(progress["pid"]):
+                return "Export worker exited before finishing"
+            if now - progress["updated_at"] > settings.EXPORT_JOB_STALE_SECONDS:
+                return "Export worker stopped reporting progress"
+            return None
+
+        if meta.get("host") == HOSTNAME:
+            if meta.get("pid") == os.getpid():
+                with self._lock:
+                    if job_id not in self._futures:
+                        return "Export job was dropped before it started"
+            elif meta.get("pid") and not _pid_alive(meta["pid"]):
+                return "Export job was dropped before it started"
+        submitted_at = datetime.fromisoformat(meta["submitted_at"]).timestamp()
+        if now - submitted_at > settings.EXPORT_JOB_QUEUE_TIMEOUT_SECONDS:
+            return "Export job did not start in time"
+        return None
+
+    def _on_done(self, job_id: str, future: Future) -> None:
+        with self._lock:
+            self._futures.pop(job_id, None)
+        if future.cancelled():
+            message = "Export job was cancelled"
+        else:
+            exc = future.exception()
+            if exc is None:
+                return
+            logger.error("Export job %s failed: %s", job_id, exc)
+            message = str(exc) or exc.__class__.__name__
+            if isinstance(exc, BrokenProcessPool):
+                # A killed child breaks the whole pool; start a new one
+                with self._lock:
+                    broken, self._executor = self._executor, None
+                if broken is not None:
+                    broken.shutdown(wait=False, cancel_futures=True)
+        # Covers jobs that never ran and workers that died without writing
+        # their own error file
+        error_path = self.artifacts_dir / f"{job_id}.error"
+        if not error_path.exists():
+            error_path.write_text(message)
+
+
+export_jobs = ExportJobManager(
+    artifacts_dir=settings.EXPORT_ARTIFACTS_DIR,
+    workers=settings.EXPORT_JOB_WORKERS,
+)
+
+
+async def run_export_cleanup() -> None:
+    """Expire old export artifacts periodically."""
+    while True:
+        try:
+            removed = await run_in_threadpool(export_jobs.cleanup)
+            if removed:
+                logger.info("Removed %d expired export files", removed)
+        except Exception:
+            logger.exception("Export artifact cleanup failed")
+        await asyncio.sleep(settings.EXPORT_CLEANUP_INTERVAL_SECONDS)
@@ -1,6 +1,8 @@
 import math
 from typing import Tuple
 
+EARTH_RADIUS_METERS = 6371000
+
 
 def calculate_distance_meters(
     lat1: float, lon1: float, lat2: float, lon2: float
@@ -17,8 +19,6 @@ def calculate_distance_meters(
     Returns:
         Distance in meters
     """
-    R = 6371000
-
     phi1 = math.radians(lat1)
     phi2 = math.radians(lat2)
     delta_phi = math.radians(lat2 - lat1)
@@ -30,7 +30,7 @@ def calculate_distance_meters(
     )
     c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
 
-    distance = R * c
+    distance = EARTH_RADIUS_METERS * c
     return distance
 
 
@@ -0,0 +1,126 @@
+"""
+Vectorized geofence distances.
+
+``app.services.geo`` measures one GPS fix at a time. The functions here take
+NumPy arrays of fixes and measure them against ``Fence`` objects whose
+radians and cosine are computed once per location, so a chunk of attendance
+rows spread over many locations is a handful of array operations. Polygon
+fences are tested edge by edge, each edge against the whole array.
+
+NumPy is optional; callers check ``available()`` first.
+"""
+
+import math
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from app.services.geo import EARTH_RADIUS_METERS
+from app.services.geofence import (
+    BOUNDARY_TOLERANCE_METERS,
+    PreparedPolygon,
+    compile_polygon,
+)
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; batch auditing needs it
+    np = None
+
+
+def available() -> bool:
+    return np is not None
+
+
+@dataclass(frozen=True)
+class Fence:
+    """A location's geofence with its trigonometry precomputed."""
+
+    location_id: int
+    radius_meters: float
+    lat_rad: float
+    lon_rad: float
+    cos_lat: float
+    polygon: Optional[PreparedPolygon] = None
+
+    @classmethod
+    def from_location(cls, location) -> Optional["Fence"]:
+        """Build from a Location row; None if it has no geometry at all."""
+        polygon = compile_polygon(location.geofence_polygon)
+        if location.latitude is None or location.longitude is None:
+            if polygon is None:
+                return None
+            # Polygon-only fence: the circle terms are never used
+            return cls(location.id, 0.0, math.nan, math.nan, math.nan, polygon)
+        lat_rad = math.radians(location.latitude)
+        return cls(
+            location_id=location.id,
+            radius_meters=float(location.allowed_radius_meters),
+            lat_rad=lat_rad,
+            lon_rad=math.radians(location.longitude),
+            cos_lat=math.cos(lat_rad),
+            polygon=polygon,
+        )
+
+
+def haversine_meters(latitudes, longitudes, lat_rad, lon_rad, cos_lat):
+    """
+    Haversine distance from each fix to a centre, in meters.
+
+    The centre arguments are scalars for a single fence, or arrays aligned
+    with the fixes when every row has its own fence.
+    """
+    phi = np.radians(latitudes)
+    delta_phi = phi - lat_rad
+    delta_lambda = np.radians(longitudes) - lon_rad
+    a = (
+        np.sin(delta_phi / 2) ** 2
+        + cos_lat * np.cos(phi) * np.sin(delta_lambda / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_METERS * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def measure(latitudes, longitudes, location_ids, fences: Dict[int, Fence]):
+    """
+    Distance of each fix from its own location's fence.
+
+    Every location id must have a fence. Returns ``(distances, outside)``
+    arrays aligned with the input; for polygon fences the distance is how
+    far outside the polygon the fix is, as at check-in.
+    """
+    unique_ids, inverse = np.unique(location_ids, return_inverse=True)
+    selected = [fences[int(location_id)] for location_id in unique_ids]
+    lat_rad = np.array([fence.lat_rad for fence in selected])[inverse]
+    lon_rad = np.array([fence.lon_rad for fence in selected])[inverse]
+    cos_lat = np.array([fence.cos_lat for fence in selected])[inverse]
+    radius = np.array([fence.radius_meters for fence in selected])[inverse]
+
+    distances = haversine_meters(latitudes, longitudes, lat_rad, lon_rad, cos_lat)
+    outside = distances > radius
+
+    for index, fence in enumerate(selected):
+        if fence.polygon is not None:
+            rows = inverse == index
+            distances[rows] = polygon_distances(
+                latitudes[rows], longitudes[rows], fence.polygon
+            )
+            outside[rows] = distances[rows] > 0
+    return distances, outside
+
+
+def polygon_distances(latitudes, longitudes, polygon: PreparedPolygon):
+    """Distance of each fix outside a polygon, 0 for fixes inside or on it."""
+    x, y = polygon.project(latitudes, longitudes)
+    inside = np.zeros(len(x), dtype=bool)
+    nearest = np.full(len(x), np.inf)
+    for x1, y1, x2, y2 in polygon.edges:
+        dx, dy = x2 - x1, y2 - y1
+        crosses = (y1 > y) != (y2 > y)
+        if dy:
+            inside ^= crosses & (x < x1 + (y - y1) * dx / dy)
+        length_squared = dx * dx + dy * dy
+        if length_squared:
+            t = np.clip(((x - x1) * dx + (y - y1) * dy) / length_squared, 0.0, 1.0)
+        else:
+            t = 0.0
+        nearest = np.minimum(nearest, np.hypot(x - (x1 + t * dx), y - (y1 + t * dy)))
+    return np.where(inside | (nearest <= BOUNDARY_TOLERANCE_METERS), 0.0, nearest)
@@ -0,0 +1,201 @@
+"""
+Polygon geofences.
+
+A location may have a polygon fence in addition to (or instead of) its
+circle. Polygons are stored in ``locations.geofence_polygon`` as an encoded
+polyline (the Google polyline algorithm at 1e-6 degree precision, a few
+bytes per vertex) and compiled once, when the reference data cache
+reloads, into a ``PreparedPolygon``: vertices projected to local metres,
+a bounding box for the quick reject, and edges bucketed into horizontal
+bands so a point test only looks at the edges that can cross its latitude.
+
+For polygon fences the reported distance is how far the fix is outside
+the polygon (0 inside or on the boundary); circle fences keep the
+distance to the centre.
+"""
+
+import math
+from typing import List, Optional, Sequence, Tuple
+
+from app.services.geo import (
+    EARTH_RADIUS_METERS,
+    calculate_distance_meters,
+    is_within_radius,
+)
+
+Point = Tuple[float, float]
+
+POLYLINE_PRECISION = 1e6
+MAX_BANDS = 64
+
+# Fixes this close to an edge count as on it. The crossing test is
+# ambiguous exactly on an edge, and projection leaves ~1e-14 m of rounding.
+BOUNDARY_TOLERANCE_METERS = 1e-6
+
+
+def encode_polygon(points: Sequence[Point]) -> str:
+    """Encode (lat, lon) vertices as a polyline string."""
+    chunks = []
+    previous = (0, 0)
+    for latitude, longitude in points:
+        current = (
+            int(round(latitude * POLYLINE_PRECISION)),
+            int(round(longitude * POLYLINE_PRECISION)),
+        )
+        for value, last in zip(current, previous):
+            delta = value - last
+            delta = ~(delta << 1) if delta < 0 else delta << 1
+            while delta >= 0x20:
+                chunks.append(chr((0x20 | (delta & 0x1F)) + 63))
+                delta >>= 5
+            chunks.append(chr(delta + 63))
+        previous = current
+    return "".join(chunks)
+
+
+def decode_polygon(encoded: str) -> List[Point]:
+    """Decode a polyline string back into (lat, lon) vertices."""
+    points = []
+    values = [0, 0]
+    index = 0
+    while index < len(encoded):
+        for axis in range(2):
+            shift = result = 0
+            while True:
+                byte = ord(encoded[index]) - 63
+                index += 1
+                result |= (byte & 0x1F) << shift
+                shift += 5
+                if byte < 0x20:
+                    break
+            values[axis] += ~(result >> 1) if result & 1 else result >> 1
+        points.append(
+            (values[0] / POLYLINE_PRECISION, values[1] / POLYLINE_PRECISION)
+        )
+    return points
+
+
+class PreparedPolygon:
+    """A polygon compiled for fast point-in-polygon tests."""
+
+    def __init__(self, points: Sequence[Point]):
+        points = list(points)
+        if len(points) > 1 and points[0] == points[-1]:
+            points.pop()
+        if len(points) < 3:
+            raise ValueError("A geofence polygon needs at least 3 vertices")
+        self.points = tuple(points)
+
+        latitudes = [lat for lat, _ in points]
+        longitudes = [lon for _, lon in points]
+        self.min_lat, self.max_lat = min(latitudes), max(latitudes)
+        self.min_lon, self.max_lon = min(longitudes), max(longitudes)
+        self.center = (
+            (self.min_lat + self.max_lat) / 2,
+            (self.min_lon + self.max_lon) / 2,
+        )
+        self._kx = EARTH_RADIUS_METERS * math.radians(1) * math.cos(
+            math.radians(self.center[0])
+        )
+        self._ky = EARTH_RADIUS_METERS * math.radians(1)
+
+        projected = [self.project(lat, lon) for lat, lon in points]
+        self.edges = [
+            (*projected[i], *projected[(i + 1) % len(projected)])
+            for i in range(len(projected))
+        ]
+
+        _, self._min_y = self.project(self.min_lat, self.center[1])
+        _, max_y = self.project(self.max_lat, self.center[1])
+        self._band_count = max(1, min(MAX_BANDS, len(self.edges) // 2))
+        self._band_height = (max_y - self._min_y) / self._band_count or 1.0
+        self._bands: List[List[tuple]] = [[] for _ in range(self._band_count)]
+        for edge in self.edges:
+            _, y1, _, y2 = edge
+            first, last = self._band(min(y1, y2)), self._band(max(y1, y2))
+            for band in range(first, last + 1):
+                self._bands[band].append(edge)
+
+    def project(self, latitude, longitude):
+        """Local planar metres; also works elementwise on NumPy arrays."""
+        return (
+            (longitude - self.center[1]) * self._kx,
+            (latitude - self.center[0]) * self._ky,
+        )
+
+    def _band(self, y: float) -> int:
+        band = int((y - self._min_y) / self._band_height)
+        return min(max(band, 0), self._band_count - 1)
+
+    def contains(self, latitude: float, longitude: float) -> bool:
+        if not (
+            self.min_lat <= latitude <= self.max_lat
+            and self.min_lon <= longitude <= self.max_lon
+        ):
+            return False
+        x, y = self.project(latitude, longitude)
+        inside = False
+        for x1, y1, x2, y2 in self._bands[self._band(y)]:
+            if (y1 > y) != (y2 > y) and x < x1 + (y - y1) * (x2 - x1) / (y2 - y1):
+                inside = not inside
+        return inside
+
+    def distance_meters(self, latitude: float, longitude: float) -> float:
+        """Distance from the fix to the polygon (0 inside or on an edge)."""
+        if self.contains(latitude, longitude):
+            return 0.0
+        x, y = self.project(latitude, longitude)
+        distance = min(_segment_distance(x, y, *edge) for edge in self.edges)
+        return 0.0 if distance <= BOUNDARY_TOLERANCE_METERS else distance
+
+    def reach_meters(self, latitude: float, longitude: float) -> float:
+        """Distance from a point to the polygon's farthest vertex."""
+        return max(
+            calculate_distance_meters(latitude, longitude, lat, lon)
+            for lat, lon in self.points
+        )
+
+
+def _segment_distance(
+    x: float, y: float, x1: float, y1: float, x2: float, y2: float
+) -> float:
+    dx, dy = x2 - x1, y2 - y1
+    length_squared = dx * dx + dy * dy
+    if length_squared == 0:
+        t = 0.0
+    else:
+        t = min(max(((x - x1) * dx + (y - y1) * dy) / length_squared, 0.0), 1.0)
+    return math.hypot(x - (x1 + t * dx), y - (y1 + t * dy))
+
+
+def compile_polygon(encoded: Optional[str]) -> Optional[PreparedPolygon]:
+    """Prepare a stored polygon, or None for circle-only locations."""
+    if not encoded:
+        return None
+    return PreparedPolygon(decode_polygon(encoded))
+
+
+def check_geofence(
+    employee_lat: float, employee_lon: float, location
+) -> Tuple[bool, float]:
+    """
+    Check a fix against a location's polygon, falling back to its circle.
+
+    Args:
+        employee_lat: Employee's latitude
+        employee_lon: Employee's longitude
+        location: A ``LocationConfig`` (``polygon`` may be None)
+
+    Returns:
+        Tuple of (is_inside, distance_meters)
+    """
+    if location.polygon is not None:
+        distance = location.polygon.distance_meters(employee_lat, employee_lon)
+        return distance == 0.0, distance
+    return is_within_radius(
+        employee_lat,
+        employee_lon,
+        location.latitude,
+        location.longitude,
+        location.allowed_radius_meters,
+    )
@@ -0,0 +1,241 @@
+"""
+Geofence audit.
+
+Re-measures historical check-ins against their location's current fence
+after its coordinates or ``allowed_radius_meters`` change. Attendance is
+read in id-ordered chunks, distances are recomputed with the vectorized
+haversine in ``app.services.geo_batch``, and only rows whose distance or
+``outside_geofence`` flag actually changed are written back with one
+set-based UPDATE per chunk, which also bumps the data version of the days
+it touched. Each chunk commits on its own, so an interrupted audit can
+simply be re-run.
+
+    python -m app.services.geofence_audit [--location-id N] [--start-date YYYY-MM-DD]
+"""
+
+import argparse
+import logging
+import sys
+import time
+from collections import Counter
+from dataclasses import dataclass
+from datetime import date
+from typing import Dict, Iterable, Optional
+
+from sqlalchemy import (
+    ARRAY,
+    Boolean,
+    Float,
+    Integer,
+    cast,
+    func,
+    select,
+    update,
+)
+from sqlalchemy.orm import Session
+
+from app.core.database import SessionLocal
+from app.models.attendance import Attendance
+from app.models.location import Location
+from app.services import geo_batch
+from app.services.analytics_cache import bump_attendance_day_version
+from app.services.geo_batch import Fence
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; the audit refuses to run without it
+    np = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 50000
+
+# Recomputed distances closer than this to the stored value are left alone
+DISTANCE_TOLERANCE_METERS = 0.01
+
+
+@dataclass
+class AuditResult:
+    scanned: int = 0
+    updated: int = 0
+    outside: int = 0
+    seconds: float = 0.0
+
+
+def load_fences(
+    db: Session, location_ids: Optional[Iterable[int]] = None
+) -> Dict[int, Fence]:
+    """Current fences for locations with a circle or polygon, active or not."""
+    query = db.query(Location)
+    if location_ids is not None:
+        query = query.filter(Location.id.in_(list(location_ids)))
+    fences = {}
+    for location in query:
+        fence = Fence.from_location(location)
+        if fence is not None:
+            fences[location.id] = fence
+    return fences
+
+
+def _write_chunk(db: Session, ids, distances, outside) -> None:
+    values = (
+        func.unnest(
+            cast(ids.tolist(), ARRAY(Integer)),
+            cast(distances.tolist(), ARRAY(Float)),
+            cast(outside.tolist(), ARRAY(Boolean)),
+        )
+        .table_valued("id", "distance", "outside")
+        .render_derived(name="audited")
+    )
+    db.execute(
+        update(Attendance)
+        .where(Attendance.id == values.c.id)
+        .values(
+            distance_from_location_meters=values.c.distance,
+            outside_geofence=values.c.outside,
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+
+def audit_geofences(
+    db: Session,
+    location_ids: Optional[Iterable[int]] = None,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> AuditResult:
+    """
+    Recompute distances and fence flags for checked-in attendance.
+
+    Rows at locations with neither coordinates nor a polygon are skipped, as
+    check-in does not validate those either.
+    """
+    if not geo_batch.available():
+        raise RuntimeError("The geofence audit requires NumPy")
+
+    started = time.perf_counter()
+    fences = load_fences(db, location_ids)
+    result = AuditResult()
+    if not fences:
+        return result
+
+    stmt = select(
+        Attendance.id,
+        Attendance.date,
+        Attendance.location_id,
+        Attendance.check_in_latitude,
+        Attendance.check_in_longitude,
+        Attendance.distance_from_location_meters,
+        Attendance.outside_geofence,
+    ).where(
+        Attendance.location_id.in_(list(fences)),
+        Attendance.check_in_time.isnot(None),
+    )
+    if start_date is not None:
+        stmt = stmt.where(Attendance.date >= start_date)
+    if end_date is not None:
+        stmt = stmt.where(Attendance.date <= end_date)
+
+    last_id = 0
+    while True:
+        rows = db.execute(
+            stmt.where(Attendance.id > last_id)
+            .order_by(Attendance.id)
+            .limit(chunk_size)
+        ).all()
+        if not rows:
+            break
+        last_id = rows[-1][0]
+
+        ids, days, location_col, latitudes, longitudes, stored, flagged = zip(*rows)
+        ids = np.array(ids, dtype=np.int64)
+        stored = np.array(stored, dtype=np.float64)  # None becomes NaN
+        flagged = np.array(flagged, dtype=bool)
+        distances, outside = geo_batch.measure(
+            np.array(latitudes, dtype=np.float64),
+            np.array(longitudes, dtype=np.float64),
+            np.array(location_col, dtype=np.int64),
+            fences,
+        )
+
+        changed = (
+            (outside != flagged)
+            | np.isnan(stored)
+            | (np.abs(distances - stored) > DISTANCE_TOLERANCE_METERS)
+        )
+        if changed.any():
+            _write_chunk(db, ids[changed], distances[changed], outside[changed])
+            touched = Counter(day for day, hit in zip(days, changed) if hit)
+            for day, count in sorted(touched.items()):
+                bump_attendance_day_version(db, day, count)
+            db.commit()
+        else:
+            db.rollback()
+
+        result.scanned += len(rows)
+        result.updated += int(changed.sum())
+        result.outside += int(outside.sum())
+        logger.info(
+            "Geofence audit: %d rows scanned, %d updated",
+            result.scanned,
+            result.updated,
+        )
+
+    result.seconds = time.perf_counter() - started
+    return result
+
+
+def main(argv: Optional[list] = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Re-check attendance against current location geofences."
+    )
+    parser.add_argument(
+        "--location-id",
+        type=int,
+        action="append",
+        default=None,
+        help="Location to audit (repeatable, defaults to all)",
+    )
+    parser.add_argument(
+        "--start-date",
+        type=date.fromisoformat,
+        default=None,
+        help="First day to audit (YYYY-MM-DD)",
+    )
+    parser.add_argument(
+        "--end-date",
+        type=date.fromisoformat,
+        default=None,
+        help="Last day to audit (YYYY-MM-DD)",
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=DEFAULT_CHUNK_SIZE,
+        help="Rows read and written per transaction",
+    )
+    args = parser.parse_args(argv)
+
+    if not geo_batch.available():
+        sys.exit("NumPy is not installed")
+
+    db = SessionLocal()
+    try:
+        result = audit_geofences(
+            db,
+            location_ids=args.location_id,
+            start_date=args.start_date,
+            end_date=args.end_date,
+            chunk_size=args.chunk_size,
+        )
+    finally:
+        db.close()
+    print(
+        f"Scanned {result.scanned} check-ins in {result.seconds:.1f}s: "
+        f"{result.updated} updated, {result.outside} outside their geofence"
+    )
+
+
+if __name__ == "__main__":
+    main()
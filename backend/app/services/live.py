@@ -0,0 +1,122 @@
+"""
+In-process pub/sub for live dashboard updates.
+
+Check-in and check-out publish an event plus counter deltas for their
+location. Each subscriber (one per open SSE stream) has a bounded buffer:
+counter deltas are merged into a single pending update per location, and
+when a slow consumer lets the event buffer fill up the oldest events are
+dropped and the client is told to resync.
+
+Publishing is thread-safe (sync routes run in the threadpool); consumers
+wait on the event loop they subscribed from.
+"""
+
+import asyncio
+import threading
+from collections import deque
+from typing import Dict, List, Optional
+
+from app.core.config import settings
+
+
+class Subscription:
+    """One consumer's bounded buffer of pending events."""
+
+    def __init__(self, scope: Optional[int], buffer_size: int):
+        self.scope = scope
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._lock = threading.Lock()
+        self._events: deque = deque(maxlen=buffer_size)
+        self._counters: Dict[int, Dict[str, int]] = {}
+        self.dropped = 0
+
+    def wants(self, location_id: int) -> bool:
+        return self.scope is None or self.scope == location_id
+
+    def offer(self, location_id: int, event: Optional[dict], deltas: dict) -> None:
+        """Queue an event and merge its deltas; safe from any thread."""
+        with self._lock:
+            if event is not None:
+                if len(self._events) == self._events.maxlen:
+                    self.dropped += 1
+                self._events.append(event)
+            if deltas:
+                pending = self._counters.setdefault(location_id, {})
+                for name, value in deltas.items():
+                    pending[name] = pending.get(name, 0) + value
+        self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    async def next_batch(self, timeout: float) -> List[dict]:
+        """
+        Wait up to timeout for pending events and return them all.
+
+        Returns an empty list on timeout so the caller can send a keepalive.
+        """
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout)
+        except asyncio.TimeoutError:
+            return []
+        self._wakeup.clear()
+
+        with self._lock:
+            events = list(self._events)
+            self._events.clear()
+            counters, self._counters = self._counters, {}
+            dropped, self.dropped = self.dropped, 0
+
+        batch = []
+        if dropped:
+            batch.append({"type": "resync", "dropped": dropped})
+        batch.extend(events)
+        batch.extend(
+            {"type": "counters", "location_id": location_id, "deltas": deltas}
+            for location_id, deltas in sorted(counters.items())
+        )
+        return batch
+
+
+class LiveEventBroker:
+    """Fan-out of attendance events to subscribed dashboard streams."""
+
+    def __init__(self, buffer_size: int):
+        self.buffer_size = buffer_size
+        self._lock = threading.Lock()
+        self._subscriptions: set = set()
+        self.published = 0
+
+    def subscribe(self, scope: Optional[int]) -> Subscription:
+        """Register a consumer; must be called from the event loop."""
+        subscription = Subscription(scope, self.buffer_size)
+        with self._lock:
+            self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+    def publish(
+        self, location_id: int, event: Optional[dict] = None, **deltas: int
+    ) -> None:
+        """Send an event and counter deltas to every subscriber in scope."""
+        with self._lock:
+            self.published += 1
+            subscriptions = [s for s in self._subscriptions if s.wants(location_id)]
+        for subscription in subscriptions:
+            try:
+                subscription.offer(location_id, event, deltas)
+            except RuntimeError:
+                # The subscriber's event loop has already closed
+                self.unsubscribe(subscription)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "subscribers": len(self._subscriptions),
+                "published": self.published,
+                "buffer_size": self.buffer_size,
+            }
+
+
+live_events = LiveEventBroker(buffer_size=settings.LIVE_EVENTS_BUFFER_SIZE)
@@ -0,0 +1,100 @@
+"""
+Daily attendance materializer.
+
+Creates the day's ``not_marked`` placeholder rows once per day instead of on
+every request. Runs in-process from the app lifespan, or on demand:
+
+    python -m app.services.materializer [--date YYYY-MM-DD]
+"""
+
+import argparse
+import asyncio
+import logging
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Optional
+
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.services import attendance as attendance_service
+
+logger = logging.getLogger(__name__)
+
+
+def run_once(attendance_date: Optional[date] = None) -> int:
+    """Materialize one day's attendance rows in a fresh session."""
+    db = SessionLocal()
+    try:
+        created = attendance_service.materialize_daily_attendance(db, attendance_date)
+        logger.info("Materialized %d attendance records", created)
+        return created
+    finally:
+        db.close()
+
+
+def seconds_until_next_run(now: datetime) -> float:
+    """Seconds from now until the next UTC day boundary plus the run offset."""
+    next_day = datetime.combine(
+        now.date() + timedelta(days=1), time.min, tzinfo=timezone.utc
+    )
+    next_run = next_day + timedelta(
+        seconds=settings.ATTENDANCE_MATERIALIZER_OFFSET_SECONDS
+    )
+    return max((next_run - now).total_seconds(), 1.0)
+
+
+async def materialize_with_retry(attendance_date: date) -> int:
+    """
+    Materialize one day, retrying failures until it succeeds.
+
+    The delay starts at ``ATTENDANCE_MATERIALIZER_RETRY_SECONDS`` and doubles
+    up to ``ATTENDANCE_MATERIALIZER_RETRY_MAX_SECONDS``. Until a run
+    succeeds the day has no placeholders, so the rollup's headcount and
+    absent figures would be wrong all day.
+    """
+    delay = settings.ATTENDANCE_MATERIALIZER_RETRY_SECONDS
+    while True:
+        try:
+            return await run_in_threadpool(run_once, attendance_date)
+        except Exception:
+            logger.exception(
+                "Attendance materialization for %s failed; retrying in %.0f s",
+                attendance_date,
+                delay,
+            )
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, settings.ATTENDANCE_MATERIALIZER_RETRY_MAX_SECONDS)
+
+
+async def run_daily_materializer() -> None:
+    """Materialize today on startup, then once after every UTC midnight."""
+    while True:
+        attendance_date = datetime.now(timezone.utc).date()
+        await materialize_with_retry(attendance_date)
+        now = datetime.now(timezone.utc)
+        if now.date() > attendance_date:
+            # Retries ran past midnight; the new day is already due
+            continue
+        await asyncio.sleep(seconds_until_next_run(now))
+
+
+def main(argv: Optional[list] = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Create not_marked attendance rows for all active employees."
+    )
+    parser.add_argument(
+        "--date",
+        type=date.fromisoformat,
+        default=None,
+        help="Day to materialize (YYYY-MM-DD, defaults to today UTC)",
+    )
+    args = parser.parse_args(argv)
+
+    attendance_date = args.date or datetime.now(timezone.utc).date()
+    created = run_once(attendance_date)
+    print(f"Created {created} attendance records for {attendance_date}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import time as dt_time
+from typing import Dict, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.cache_version import CacheVersion
+from app.models.location import Location
+from app.models.shift import ShiftConfig
+from app.services.geofence import PreparedPolygon, compile_polygon
+from app.services.spatial import SiteIndex
+
+REFERENCE_VERSION_NAME = "reference"
+
+
+@dataclass(frozen=True)
+class LocationConfig:
+    """Geofence parameters for a location."""
+
+    id: int
+    name: str
+    city: Optional[str]
+    latitude: Optional[float]
+    longitude: Optional[float]
+    allowed_radius_meters: int
+    is_active: bool
+    polygon: Optional[PreparedPolygon] = field(default=None, compare=False)
+
+
+@dataclass(frozen=True)
+class ShiftWindow:
+    """Shift timing for a location."""
+
+    location_id: int
+    shift_name: str
+    start_time: dt_time
+    end_time: dt_time
+    grace_period_minutes: int
+
+
+class ReferenceDataCache:
+    """
+    In-memory copy of locations and shift windows.
+
+    The shared version row in ``cache_versions`` is bumped in the same
+    transaction as any location or shift change. Each process re-reads that
+    version at most once per check interval and reloads everything when it
+    moves, so steady-state check-ins need no configuration reads. A spatial
+    index over the active locations is rebuilt on every reload.
+    """
+
+    def __init__(self, check_interval_seconds: float):
+        self.check_interval_seconds = check_interval_seconds
+        self._lock = threading.Lock()
+        self._locations: Dict[int, LocationConfig] = {}
+        self._shifts: Dict[int, ShiftWindow] = {}
+        self._site_index = SiteIndex(())
+        self._version: Optional[int] = None
+        self._checked_at = 0.0
+        self.reloads = 0
+        self.version_checks = 0
+
+    def get_location(self, location_id: int, db: Session) -> Optional[LocationConfig]:
+        self._ensure_fresh(db)
+        return self._locations.get(location_id)
+
+    def active_locations(self, db: Session) -> List[LocationConfig]:
+        self._ensure_fresh(db)
+        return [loc for loc in self._locations.values() if loc.is_active]
+
+    def site_index(self, db: Session) -> SiteIndex:
+        """Spatial index of the active locations that have coordinates."""
+        self._ensure_fresh(db)
+        return self._site_index
+
+    def get_shift(self, location_id: int, db: Session) -> Optional[ShiftWindow]:
+        self._ensure_fresh(db)
+        return self._shifts.get(location_id)
+
+    def mark_changed(self, db: Session) -> None:
+        """
+        Bump the shared version; call before committing a config change.
+
+        The local copy is dropped once the session commits, so this process
+        never reloads the pre-change rows.
+        """
+        db.query(CacheVersion).filter(
+            CacheVersion.name == REFERENCE_VERSION_NAME
+        ).update({"version": CacheVersion.version + 1}, synchronize_session=False)
+        event.listen(db, "after_commit", lambda session: self.invalidate(), once=True)
+
+    def invalidate(self) -> None:
+        """Force a version check and reload on next access."""
+        with self._lock:
+            self._version = None
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "version": self._version,
+                "locations": len(self._locations),
+                "shifts": len(self._shifts),
+                "indexed_sites": len(self._site_index),
+                "reloads": self.reloads,
+                "version_checks": self.version_checks,
+            }
+
+    def _ensure_fresh(self, db: Session) -> None:
+        now = time.monotonic()
+        with self._lock:
+            if (
+                self._version is not None
+                and now - self._checked_at < self.check_interval_seconds
+            ):
+                return
+
+        version = (
+            db.query(CacheVersion.version)
+            .filter(CacheVersion.name == REFERENCE_VERSION_NAME)
+            .scalar()
+        ) or 0
+
+        with self._lock:
+            self.version_checks += 1
+            self._checked_at = now
+            if version == self._version:
+                return
+
+        locations = {
+            loc.id: LocationConfig(
+                id=loc.id,
+                name=loc.name,
+                city=loc.city,
+                latitude=loc.latitude,
+                longitude=loc.longitude,
+                allowed_radius_meters=loc.allowed_radius_meters,
+                is_active=loc.is_active,
+                polygon=compile_polygon(loc.geofence_polygon),
+            )
+            for loc in db.query(Location).all()
+        }
+        shifts = {
+            shift.location_id: ShiftWindow(
+                location_id=shift.location_id,
+                shift_name=shift.shift_name,
+                start_time=shift.start_time,
+                end_time=shift.end_time,
+                grace_period_minutes=shift.grace_period_minutes,
+            )
+            for shift in db.query(ShiftConfig).all()
+        }
+
+        site_index = SiteIndex(loc for loc in locations.values() if loc.is_active)
+
+        with self._lock:
+            self._locations = locations
+            self._shifts = shifts
+            self._site_index = site_index
+            self._version = version
+            self.reloads += 1
+
+
+reference_data = ReferenceDataCache(
+    check_interval_seconds=settings.REFERENCE_CACHE_CHECK_SECONDS
+)
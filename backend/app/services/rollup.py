@@ -0,0 +1,216 @@
+"""
+Daily attendance rollup.
+
+Keeps per-(date, location, department) counters in
+``attendance_daily_rollup`` so the dashboard summary and breakdowns read a
+handful of pre-aggregated rows instead of scanning attendance. Check-in,
+check-out and the daily materializer apply deltas in the same transaction
+as their attendance writes; ``rebuild`` recomputes a date range from
+scratch after backfills or manual edits:
+
+    python -m app.services.rollup --start-date YYYY-MM-DD [--end-date YYYY-MM-DD]
+"""
+
+import argparse
+from datetime import date, datetime, timezone
+from typing import Dict, Optional
+
+from sqlalchemy import and_, func, literal_column, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from app.core.database import SessionLocal
+from app.models.attendance import Attendance
+from app.models.attendance_rollup import AttendanceDailyRollup
+from app.models.user import User
+
+PRESENT_STATUSES = ("present", "checked_out")
+
+ROLLUP_KEY = ("date", "location_id", "department_id")
+ROLLUP_MEASURES = (
+    "headcount",
+    "present",
+    "late",
+    "checked_out",
+    "not_marked",
+    "late_minutes",
+)
+
+GROUP_COLUMNS = {
+    "location": AttendanceDailyRollup.location_id,
+    "department": AttendanceDailyRollup.department_id,
+}
+
+
+def _accumulate(stmt):
+    """ON CONFLICT clause that adds the incoming counters to the stored ones."""
+    table = AttendanceDailyRollup.__table__
+    return stmt.on_conflict_do_update(
+        index_elements=list(ROLLUP_KEY),
+        set_={
+            measure: table.c[measure] + stmt.excluded[measure]
+            for measure in ROLLUP_MEASURES
+        },
+    )
+
+
+def apply_delta(
+    db: Session,
+    attendance_date: date,
+    location_id: int,
+    department_id: Optional[int],
+    **deltas: int,
+) -> None:
+    """
+    Add counter deltas to one rollup row, creating it if needed.
+
+    Does not commit; callers run it inside their own attendance transaction.
+    """
+    values = {measure: deltas.get(measure, 0) for measure in ROLLUP_MEASURES}
+    stmt = insert(AttendanceDailyRollup).values(
+        date=attendance_date,
+        location_id=location_id,
+        department_id=department_id or 0,
+        **values,
+    )
+    db.execute(_accumulate(stmt))
+
+
+def check_in_delta(created: bool, is_late: bool, late_by_minutes: int) -> dict:
+    """Counter changes for a check-in, either new or over a placeholder."""
+    return {
+        "headcount": 1 if created else 0,
+        "not_marked": 0 if created else -1,
+        "present": 1,
+        "late": 1 if is_late else 0,
+        "late_minutes": late_by_minutes if is_late else 0,
+    }
+
+
+def aggregate_attendance(rows):
+    """
+    Grouped rollup counters for a selectable of attendance rows.
+
+    ``rows`` needs date, location_id, employee_id, status, is_late and
+    late_by_minutes columns; the department comes from the employee.
+    """
+    present = rows.c.status.in_(PRESENT_STATUSES)
+    department_id = func.coalesce(User.department_id, literal_column("0"))
+    return (
+        select(
+            rows.c.date,
+            rows.c.location_id,
+            department_id.label("department_id"),
+            func.count().label("headcount"),
+            func.count().filter(present).label("present"),
+            func.count().filter(and_(present, rows.c.is_late)).label("late"),
+            func.count().filter(rows.c.status == "checked_out").label("checked_out"),
+            func.count().filter(rows.c.status == "not_marked").label("not_marked"),
+            func.coalesce(
+                func.sum(rows.c.late_by_minutes).filter(rows.c.is_late), 0
+            ).label("late_minutes"),
+        )
+        .join(User, User.id == rows.c.employee_id)
+        .group_by(rows.c.date, rows.c.location_id, department_id)
+    )
+
+
+def accumulate_from(rows):
+    """INSERT that adds the counters of ``rows`` into the rollup."""
+    stmt = insert(AttendanceDailyRollup).from_select(
+        list(ROLLUP_KEY) + list(ROLLUP_MEASURES), aggregate_attendance(rows)
+    )
+    return _accumulate(stmt)
+
+
+def rebuild(db: Session, start_date: date, end_date: date) -> int:
+    """
+    Recompute the rollup for a date range from the attendance table.
+
+    Returns:
+        Number of rollup rows written
+    """
+    db.query(AttendanceDailyRollup).filter(
+        AttendanceDailyRollup.date >= start_date,
+        AttendanceDailyRollup.date <= end_date,
+    ).delete(synchronize_session=False)
+
+    source = (
+        select(Attendance)
+        .where(Attendance.date >= start_date, Attendance.date <= end_date)
+        .subquery()
+    )
+    result = db.execute(
+        insert(AttendanceDailyRollup).from_select(
+            list(ROLLUP_KEY) + list(ROLLUP_MEASURES), aggregate_attendance(source)
+        )
+    )
+    db.commit()
+    return result.rowcount
+
+
+def read_rollup(
+    db: Session,
+    attendance_date: date,
+    group_by: Optional[str] = None,
+    location_id: Optional[int] = None,
+) -> Dict[Optional[int], dict]:
+    """
+    Sum the rollup for one day, optionally per location or department.
+
+    Returns:
+        Counters keyed by location/department id, or by None when ungrouped
+    """
+    measures = [
+        func.coalesce(func.sum(getattr(AttendanceDailyRollup, measure)), 0).label(
+            measure
+        )
+        for measure in ROLLUP_MEASURES
+    ]
+    key = GROUP_COLUMNS[group_by] if group_by else None
+    columns = [key.label("key")] if key is not None else []
+
+    stmt = select(*columns, *measures).where(
+        AttendanceDailyRollup.date == attendance_date
+    )
+    if location_id is not None:
+        stmt = stmt.where(AttendanceDailyRollup.location_id == location_id)
+    if key is not None:
+        stmt = stmt.group_by(key)
+
+    results = {}
+    for row in db.execute(stmt):
+        counters = {measure: int(getattr(row, measure)) for measure in ROLLUP_MEASURES}
+        results[row.key if key is not None else None] = counters
+    return results
+
+
+def main(argv: Optional[list] = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Rebuild attendance_daily_rollup from the attendance table."
+    )
+    parser.add_argument(
+        "--start-date",
+        type=date.fromisoformat,
+        required=True,
+        help="First day to rebuild (YYYY-MM-DD)",
+    )
+    parser.add_argument(
+        "--end-date",
+        type=date.fromisoformat,
+        default=None,
+        help="Last day to rebuild (YYYY-MM-DD, defaults to today UTC)",
+    )
+    args = parser.parse_args(argv)
+
+    end_date = args.end_date or datetime.now(timezone.utc).date()
+    db = SessionLocal()
+    try:
+        written = rebuild(db, args.start_date, end_date)
+    finally:
+        db.close()
+    print(f"Rebuilt {written} rollup rows for {args.start_date}..{end_date}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+"""
+Spatial index over active sites.
+
+Locations are placed on the unit sphere as 3D vectors and kept in a static
+KD-tree. Straight-line (chord) distance between unit vectors grows with
+great-circle distance, so nearest-neighbour and radius searches on the tree
+give the same answers as haversine would, anywhere on the globe, while
+only visiting O(log n) sites. Final distances are still reported with the
+haversine from ``app.services.geo``. Sites with a polygon fence are placed
+at their centre point (or the polygon's bounding-box centre when they have
+none) and searched out to their farthest vertex.
+
+The index is immutable; ``ReferenceDataCache`` builds a new one whenever it
+reloads locations.
+"""
+
+import heapq
+import math
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+from app.services.geo import EARTH_RADIUS_METERS, calculate_distance_meters
+from app.services.geofence import check_geofence
+
+Vector = Tuple[float, float, float]
+
+
+def _unit_vector(latitude: float, longitude: float) -> Vector:
+    phi = math.radians(latitude)
+    lam = math.radians(longitude)
+    return (
+        math.cos(phi) * math.cos(lam),
+        math.cos(phi) * math.sin(lam),
+        math.sin(phi),
+    )
+
+
+def _chord_squared(meters: float) -> float:
+    """Squared chord length between points ``meters`` apart on the surface."""
+    angle = min(meters / EARTH_RADIUS_METERS, math.pi)
+    return (2 * math.sin(angle / 2)) ** 2
+
+
+def _distance_squared(a: Vector, b: Vector) -> float:
+    return (a[0] - b[0]) ** 2 + (a[1] - b[1]) ** 2 + (a[2] - b[2]) ** 2
+
+
+class _Node:
+    __slots__ = ("point", "entry", "axis", "left", "right")
+
+    def __init__(self, point: Vector, entry, axis: int, left, right):
+        self.point = point
+        self.entry = entry
+        self.axis = axis
+        self.left = left
+        self.right = right
+
+
+def _build(items: List[Tuple[Vector, object]], depth: int = 0) -> Optional[_Node]:
+    if not items:
+        return None
+    axis = depth % 3
+    items.sort(key=lambda item: item[0][axis])
+    middle = len(items) // 2
+    point, entry = items[middle]
+    return _Node(
+        point,
+        entry,
+        axis,
+        _build(items[:middle], depth + 1),
+        _build(items[middle + 1 :], depth + 1),
+    )
+
+
+def _anchor(site) -> Optional[Tuple[float, float]]:
+    """The point a site is indexed at, or None if it has no geometry."""
+    if site.latitude is not None and site.longitude is not None:
+        return site.latitude, site.longitude
+    if site.polygon is not None:
+        return site.polygon.center
+    return None
+
+
+def _reach(site, anchor: Tuple[float, float]) -> float:
+    """How far from its anchor a site's fence extends."""
+    if site.polygon is not None:
+        return site.polygon.reach_meters(*anchor)
+    return site.allowed_radius_meters
+
+
+class SiteIndex:
+    """KD-tree of sites (``LocationConfig``) that have a location or polygon."""
+
+    def __init__(self, sites: Iterable):
+        items = []
+        self.max_radius_meters = 0.0
+        for site in sites:
+            anchor = _anchor(site)
+            if anchor is None:
+                continue
+            items.append((_unit_vector(*anchor), (site, anchor)))
+            self.max_radius_meters = max(
+                self.max_radius_meters, _reach(site, anchor)
+            )
+        self._size = len(items)
+        self._root = _build(items)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def nearest(self, latitude: float, longitude: float, k: int) -> List[Tuple]:
+        """
+        The k closest sites as ``(site, distance_meters)``, closest first.
+
+        Distances are to each site's anchor point.
+        """
+        if k <= 0 or self._root is None:
+            return []
+        target = _unit_vector(latitude, longitude)
+        # Max-heap (negated distances) of the best k found so far
+        best: List[Tuple[float, int, object]] = []
+
+        def visit(node: Optional[_Node]) -> None:
+            if node is None:
+                return
+            distance = _distance_squared(target, node.point)
+            if len(best) < k:
+                heapq.heappush(best, (-distance, node.entry[0].id, node.entry))
+            elif distance < -best[0][0]:
+                heapq.heapreplace(best, (-distance, node.entry[0].id, node.entry))
+
+            offset = target[node.axis] - node.point[node.axis]
+            if offset < 0:
+                near, far = node.left, node.right
+            else:
+                near, far = node.right, node.left
+            visit(near)
+            if len(best) < k or offset * offset < -best[0][0]:
+                visit(far)
+
+        visit(self._root)
+        return self._with_distances(
+            latitude, longitude, [entry for _, _, entry in best]
+        )
+
+    def within(self, latitude: float, longitude: float, meters: float) -> List[Tuple]:
+        """Sites whose anchor point is within ``meters``, closest first."""
+        if self._root is None:
+            return []
+        target = _unit_vector(latitude, longitude)
+        limit = _chord_squared(meters)
+        found = []
+
+        stack = [self._root]
+        while stack:
+            node = stack.pop()
+            if node is None:
+                continue
+            if _distance_squared(target, node.point) <= limit:
+                found.append(node.entry)
+            offset = target[node.axis] - node.point[node.axis]
+            if offset < 0 or offset * offset <= limit:
+                stack.append(node.left)
+            if offset >= 0 or offset * offset <= limit:
+                stack.append(node.right)
+
+        return self._with_distances(latitude, longitude, found)
+
+    def containing(self, latitude: float, longitude: float) -> List[Tuple]:
+        """
+        Sites whose geofence (polygon or circle) contains the fix.
+
+        Returns ``(site, distance_meters)`` pairs, closest first, with the
+        distance as the geofence check reports it.
+        """
+        # A metre of slack so chord rounding never drops a boundary fix
+        candidates = self.within(latitude, longitude, self.max_radius_meters + 1)
+        matches = []
+        for site, _ in candidates:
+            inside, distance = check_geofence(latitude, longitude, site)
+            if inside:
+                matches.append((site, distance))
+        return matches
+
+    @staticmethod
+    def _with_distances(
+        latitude: float, longitude: float, entries: Sequence
+    ) -> List[Tuple]:
+        measured = [
+            (site, calculate_distance_meters(latitude, longitude, *anchor))
+            for site, anchor in entries
+        ]
+        measured.sort(key=lambda pair: pair[1])
+        return measured
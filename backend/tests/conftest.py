@@ -0,0 +1,6 @@
+import os
+
+# The parity tests need a scratch Postgres database; point the app at it
+# before any app module builds its engine
+if os.environ.get("TEST_DATABASE_URL"):
+    os.environ["DATABASE_URL"] = os.environ["TEST_DATABASE_URL"]
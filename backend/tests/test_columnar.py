@@ -0,0 +1,170 @@
+"""Incremental maintenance of the columnar store, without a database."""
+
+from datetime import date, datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+
+from app.services import columnar
+
+pytestmark = pytest.mark.skipif(columnar.np is None, reason="needs NumPy")
+
+TODAY = datetime.now(timezone.utc).date()
+YESTERDAY = TODAY - timedelta(days=1)
+
+
+def make_row(row_id, employee_id, day, status="present", is_late=False, late=0):
+    return SimpleNamespace(
+        id=row_id,
+        employee_id=employee_id,
+        location_id=1 + employee_id % 2,
+        date=day,
+        status=status,
+        is_late=is_late,
+        late_by_minutes=late,
+    )
+
+
+class FakeDatabase:
+    """Stands in for the attendance table and the per-day versions."""
+
+    def __init__(self, rows, versions):
+        self.rows = {row.id: row for row in rows}
+        self.versions = dict(versions)
+
+    def fetch(self, db, first_day, last_day=None):
+        return [
+            columnar._to_record(row, None)
+            for row in self.rows.values()
+            if row.date >= first_day and (last_day is None or row.date <= last_day)
+        ]
+
+    def day_versions(self, db, first_day):
+        return {day: v for day, v in self.versions.items() if day >= first_day}
+
+
+@pytest.fixture
+def database(monkeypatch):
+    database = FakeDatabase(
+        [
+            make_row(1, 1, YESTERDAY),
+            make_row(2, 2, YESTERDAY, is_late=True, late=10),
+            make_row(3, 1, TODAY, status="not_marked"),
+            make_row(4, 2, TODAY, status="not_marked"),
+        ],
+        {YESTERDAY: 2, TODAY: 2},
+    )
+    monkeypatch.setattr(columnar, "attendance_day_versions", database.day_versions)
+    monkeypatch.setattr(columnar, "SessionLocal", lambda: SimpleNamespace(
+        rollback=lambda: None, close=lambda: None
+    ))
+    return database
+
+
+@pytest.fixture
+def store(database):
+    store = columnar.ColumnarStore(window_days=7, enabled=True)
+    store._fetch = database.fetch
+    store.load(None)
+    yield store
+    store.shutdown()
+
+
+def expected_counters(database, day):
+    rows = [row for row in database.rows.values() if row.date == day]
+    present = [row for row in rows if row.status in ("present", "checked_out")]
+    return {
+        "headcount": len(rows),
+        "present": len(present),
+        "late": sum(row.is_late for row in present),
+        "checked_out": sum(row.status == "checked_out" for row in rows),
+        "not_marked": sum(row.status == "not_marked" for row in rows),
+        "late_minutes": sum(row.late_by_minutes for row in rows if row.is_late),
+    }
+
+
+def wait_for_reload(store):
+    if store._reload is not None:
+        store._reload.result(timeout=5)
+
+
+def test_local_write_keeps_day_current(store, database):
+    row = make_row(3, 1, TODAY, is_late=True, late=5)
+    database.rows[3] = row
+    database.versions[TODAY] = 3
+
+    store.apply_check_in(row, None, day_version=3)
+
+    assert store.serves(None, TODAY)
+    assert store.day_counters(TODAY)[None] == expected_counters(database, TODAY)
+    assert store.stats()["day_reloads"] == 0
+
+
+def test_foreign_write_reloads_only_that_day(store, database):
+    # Another worker back-dates a check-out, deletes a row and adds one
+    database.rows[1] = make_row(1, 1, YESTERDAY, status="checked_out")
+    del database.rows[2]
+    database.rows[5] = make_row(5, 3, YESTERDAY, is_late=True, late=7)
+    database.versions[YESTERDAY] = 5
+
+    assert not store.serves(None, YESTERDAY)
+    assert store.serves(None, TODAY)
+    wait_for_reload(store)
+
+    assert store.serves(None, YESTERDAY, TODAY)
+    assert store.day_counters(YESTERDAY)[None] == expected_counters(
+        database, YESTERDAY
+    )
+    assert store.day_counters(TODAY)[None] == expected_counters(database, TODAY)
+    assert set(store._rows) == set(database.rows)
+    assert store.stats()["day_reloads"] == 1
+
+
+def test_interleaved_foreign_write_leaves_day_stale(store, database):
+    row = make_row(3, 1, TODAY)
+    database.rows[3] = row
+    database.rows[4] = make_row(4, 2, TODAY)
+    # Our bump landed on top of another worker's
+    database.versions[TODAY] = 4
+
+    store.apply_check_in(row, None, day_version=4)
+
+    assert not store.serves(None, TODAY)
+    wait_for_reload(store)
+    assert store.serves(None, TODAY)
+    assert store.day_counters(TODAY)[None] == expected_counters(database, TODAY)
+
+
+def test_write_already_covered_by_reload_is_not_reapplied(store, database):
+    database.rows[3] = make_row(3, 1, TODAY, status="checked_out")
+    database.versions[TODAY] = 4
+    store.serves(None, TODAY)
+    wait_for_reload(store)
+
+    # A check-in committed before the reload, applied after it
+    store.apply_check_in(make_row(3, 1, TODAY), None, day_version=3)
+
+    assert store.day_counters(TODAY)[None] == expected_counters(database, TODAY)
+
+
+def test_removed_rows_are_compacted(store, database):
+    for row_id in (1, 2, 3):
+        del database.rows[row_id]
+    database.versions[YESTERDAY] = 3
+    database.versions[TODAY] = 3
+
+    store.serves(None, YESTERDAY)
+    wait_for_reload(store)
+
+    stats = store.stats()
+    assert stats["compactions"] == 1
+    assert stats["rows"] == stats["slots"] == 1
+    assert store.day_counters(TODAY)[None] == expected_counters(database, TODAY)
+    assert store.day_counters(YESTERDAY) == {
+        None: dict.fromkeys(expected_counters(database, YESTERDAY), 0)
+    }
+
+
+def test_days_outside_window_use_sql(store):
+    assert not store.serves(None, TODAY - timedelta(days=7))
+    assert store.serves(None, TODAY - timedelta(days=6), TODAY)
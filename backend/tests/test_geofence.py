@@ -0,0 +1,148 @@
+"""Polyline codec and polygon geofence checks."""
+
+import pytest
+
+from app.services import geo_batch
+from app.services.geofence import (
+    PreparedPolygon,
+    check_geofence,
+    compile_polygon,
+    decode_polygon,
+    encode_polygon,
+)
+from app.services.reference_data import LocationConfig
+from app.services.spatial import SiteIndex
+
+# Roughly 1.1 km square, plus a concave L-shaped site next to it
+SQUARE = [(12.0, 77.0), (12.0, 77.01), (12.01, 77.01), (12.01, 77.0)]
+L_SHAPE = [
+    (12.02, 77.0),
+    (12.02, 77.02),
+    (12.025, 77.02),
+    (12.025, 77.005),
+    (12.03, 77.005),
+    (12.03, 77.0),
+]
+
+
+def make_site(site_id, points=None, latitude=None, longitude=None, radius=100):
+    return LocationConfig(
+        id=site_id,
+        name=f"Site {site_id}",
+        city=None,
+        latitude=latitude,
+        longitude=longitude,
+        allowed_radius_meters=radius,
+        is_active=True,
+        polygon=PreparedPolygon(points) if points is not None else None,
+    )
+
+
+@pytest.mark.parametrize(
+    "points",
+    [
+        SQUARE,
+        L_SHAPE,
+        [(-33.868812, 151.209295), (-33.87, -179.999999), (0.0, 0.0)],
+        [(89.999999, 179.999999), (-89.999999, -179.999999), (0.000001, -0.000001)],
+    ],
+)
+def test_polyline_round_trip(points):
+    assert decode_polygon(encode_polygon(points)) == pytest.approx(points, abs=1e-9)
+
+
+def test_polyline_known_encoding():
+    # Google's reference example, at 1e-6 rather than 1e-5 precision
+    points = [(38.5, -120.2), (40.7, -120.95), (43.252, -126.453)]
+    encoded = encode_polygon(points)
+    assert encoded == "_izlhA~rlgdF_{geC~ywl@_kwzCn`{nI"
+    assert compile_polygon(encoded).points == tuple(points)
+
+
+def test_polygon_needs_three_vertices():
+    with pytest.raises(ValueError):
+        PreparedPolygon(SQUARE[:2])
+    # A closing vertex equal to the first does not count
+    with pytest.raises(ValueError):
+        PreparedPolygon([SQUARE[0], SQUARE[1], SQUARE[0]])
+
+
+@pytest.mark.parametrize(
+    "latitude, longitude",
+    [
+        (12.005, 77.005),  # centre
+        (12.0001, 77.0099),  # near a corner
+        (12.028, 77.002),  # inside the L's upright
+        (12.022, 77.018),  # inside the L's foot
+    ],
+)
+def test_inside(latitude, longitude):
+    site = make_site(1, SQUARE if latitude < 12.015 else L_SHAPE)
+    assert check_geofence(latitude, longitude, site) == (True, 0.0)
+
+
+@pytest.mark.parametrize(
+    "latitude, longitude, points, distance",
+    [
+        (12.005, 77.011, SQUARE, 108.8),  # east of the square
+        (11.999, 77.005, SQUARE, 111.2),  # south of the square
+        (12.028, 77.015, L_SHAPE, 333.6),  # in the L's notch
+        (13.0, 78.0, SQUARE, None),  # far away, outside the bounding box
+    ],
+)
+def test_outside(latitude, longitude, points, distance):
+    inside, measured = check_geofence(latitude, longitude, make_site(1, points))
+    assert not inside
+    if distance is not None:
+        assert measured == pytest.approx(distance, rel=0.01)
+
+
+@pytest.mark.parametrize(
+    "latitude, longitude",
+    [
+        (12.0, 77.005),  # south edge
+        (12.01, 77.005),  # north edge
+        (12.005, 77.0),  # west edge
+        (12.005, 77.01),  # east edge
+        (12.0037, 77.01),  # east edge, off the vertex grid
+        (12.0, 77.0),  # vertex
+        (12.01, 77.01),  # opposite vertex
+    ],
+)
+def test_on_boundary_counts_as_inside(latitude, longitude):
+    assert check_geofence(latitude, longitude, make_site(1, SQUARE)) == (True, 0.0)
+
+
+@pytest.mark.skipif(not geo_batch.available(), reason="needs NumPy")
+def test_batch_distances_match_single_checks():
+    np = geo_batch.np
+    polygon = PreparedPolygon(L_SHAPE)
+    fixes = [
+        (12.028, 77.002),
+        (12.028, 77.015),
+        (12.02, 77.01),
+        (12.025, 77.01),
+        (12.0, 77.0),
+        (12.031, 77.021),
+    ]
+    latitudes, longitudes = (np.array(axis) for axis in zip(*fixes))
+    batch = geo_batch.polygon_distances(latitudes, longitudes, polygon)
+    single = [polygon.distance_meters(lat, lon) for lat, lon in fixes]
+    assert batch.tolist() == pytest.approx(single)
+
+
+def test_polygon_only_site_is_indexed_and_matched():
+    polygon_only = make_site(1, L_SHAPE)
+    circle = make_site(2, latitude=12.005, longitude=77.005, radius=200)
+    index = SiteIndex([polygon_only, circle])
+    assert len(index) == 2
+
+    # Inside the polygon, far from its bounding-box centre
+    matches = index.containing(12.022, 77.019)
+    assert [(site.id, distance) for site, distance in matches] == [(1, 0.0)]
+    # In the notch: inside the bounding box but outside the polygon
+    assert index.containing(12.028, 77.015) == []
+    # On the polygon's edge
+    assert [site.id for site, _ in index.containing(12.02, 77.01)] == [1]
+    # Inside the circle only
+    assert [site.id for site, _ in index.containing(12.005, 77.005)] == [2]
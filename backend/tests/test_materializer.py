@@ -0,0 +1,35 @@
+"""Retry behaviour of the daily materializer, without a database."""
+
+import asyncio
+from datetime import date
+
+from app.core.config import settings
+from app.services import materializer
+
+DAY = date(2026, 3, 1)
+
+
+def test_failed_runs_are_retried_with_capped_backoff(monkeypatch):
+    calls = []
+    sleeps = []
+
+    def run_once(attendance_date=None):
+        calls.append(attendance_date)
+        if len(calls) < 5:
+            raise ConnectionError("database unavailable")
+        return 42
+
+    async def sleep(seconds):
+        sleeps.append(seconds)
+
+    monkeypatch.setattr(materializer, "run_once", run_once)
+    monkeypatch.setattr(materializer.asyncio, "sleep", sleep)
+    monkeypatch.setattr(settings, "ATTENDANCE_MATERIALIZER_RETRY_SECONDS", 5)
+    monkeypatch.setattr(settings, "ATTENDANCE_MATERIALIZER_RETRY_MAX_SECONDS", 15)
+
+    created = asyncio.run(materializer.materialize_with_retry(DAY))
+
+    assert created == 42
+    # Every attempt is for the same day, even if retries cross midnight
+    assert calls == [DAY] * 5
+    assert sleeps == [5, 10, 15, 15]
@@ -0,0 +1,103 @@
+"""KD-tree site index against a brute-force haversine scan."""
+
+import random
+
+import pytest
+
+from app.services.geo import calculate_distance_meters
+from app.services.reference_data import LocationConfig
+from app.services.spatial import SiteIndex
+
+
+def make_site(site_id, latitude, longitude, radius=100):
+    return LocationConfig(
+        id=site_id,
+        name=f"Site {site_id}",
+        city=None,
+        latitude=latitude,
+        longitude=longitude,
+        allowed_radius_meters=radius,
+        is_active=True,
+    )
+
+
+def scattered_sites(rng, count):
+    """Sites clustered around a few cities plus some spread over the globe."""
+    centres = [(12.97, 77.59), (51.5, -0.12), (-33.87, 151.21), (64.1, -179.9)]
+    sites = []
+    for site_id in range(1, count + 1):
+        if site_id % 5 == 0:
+            latitude, longitude = rng.uniform(-89, 89), rng.uniform(-180, 180)
+        else:
+            lat, lon = rng.choice(centres)
+            latitude, longitude = lat + rng.gauss(0, 0.2), lon + rng.gauss(0, 0.2)
+            longitude = (longitude + 180) % 360 - 180
+        sites.append(make_site(site_id, latitude, longitude))
+    return sites
+
+
+def brute_force(sites, latitude, longitude):
+    return sorted(
+        (calculate_distance_meters(latitude, longitude, s.latitude, s.longitude), s.id)
+        for s in sites
+    )
+
+
+@pytest.fixture(scope="module")
+def sites():
+    return scattered_sites(random.Random(7), 400)
+
+
+@pytest.fixture(scope="module")
+def index(sites):
+    return SiteIndex(sites)
+
+
+def fixes(rng, sites, count):
+    """Query points next to sites and anywhere else."""
+    points = []
+    for _ in range(count):
+        site = rng.choice(sites)
+        points.append(
+            (site.latitude + rng.gauss(0, 0.05), site.longitude + rng.gauss(0, 0.05))
+        )
+        points.append((rng.uniform(-90, 90), rng.uniform(-180, 180)))
+    # Across the antimeridian from the sites near longitude -179.9
+    points.append((64.1, 179.95))
+    return points
+
+
+def test_nearest_matches_brute_force(sites, index):
+    rng = random.Random(11)
+    for latitude, longitude in fixes(rng, sites, 50):
+        expected = brute_force(sites, latitude, longitude)
+        for k in (1, 5, 25):
+            found = index.nearest(latitude, longitude, k)
+            assert [site.id for site, _ in found] == [
+                site_id for _, site_id in expected[:k]
+            ]
+            for (_, distance), (expected_distance, _) in zip(found, expected):
+                assert distance == pytest.approx(expected_distance)
+
+
+def test_within_matches_brute_force(sites, index):
+    rng = random.Random(13)
+    for latitude, longitude in fixes(rng, sites, 50):
+        expected = brute_force(sites, latitude, longitude)
+        for meters in (500, 20_000, 2_000_000):
+            found = index.within(latitude, longitude, meters)
+            assert [site.id for site, _ in found] == [
+                site_id for distance, site_id in expected if distance <= meters
+            ]
+
+
+def test_nearest_with_more_than_available(sites, index):
+    found = index.nearest(0.0, 0.0, len(sites) + 10)
+    assert len(found) == len(sites)
+
+
+def test_empty_index():
+    index = SiteIndex([make_site(1, None, None)])
+    assert len(index) == 0
+    assert index.nearest(12.97, 77.59, 3) == []
+    assert index.within(12.97, 77.59, 1000) == []